@@ -0,0 +1,104 @@
+"""
+Whole-page vs token-budgeted chunked translation of long Markdown pages (headings,
+paragraphs, lists and tables) against a fake Ollama whose stub model "translates"
+by uppercasing. Replies are cut off once prompt and reply fill --num-ctx tokens,
+like a translation model whose context window is too small for a dense page.
+
+Reports the latency of one page at a time, the throughput with --concurrency pages
+in flight, model calls per page and how many pages came back complete with every
+heading, list item and table row in place.
+
+Run from the project root:
+    python -m backend.benchmarks.bench_chunked_translation --pages 6 --sections 6 --token-latency 0.002 --parallel 4
+"""
+import argparse
+import asyncio
+import random
+import time
+
+from backend.benchmarks.fake_ollama import config, serve_in_thread
+from backend.config import settings
+from backend.services.markdown_chunker import chunk_markdown, estimate_tokens
+from backend.services.ollama_client import ollama_client
+from backend.services.translation_memory import translation_memory
+
+WORDS = ("the invoice total is due within thirty days of receipt and payments made after that date "
+         "accrue interest at the contractual rate unless the customer disputes the amount in writing").split()
+
+def sentence(rng: random.Random) -> str:
+    return " ".join(rng.choices(WORDS, k=rng.randint(6, 18))).capitalize() + "."
+
+def page(index: int, sections: int) -> str:
+    """A dense report page, like PdfTranslatorService sends it (with its page header)."""
+    rng = random.Random(index)
+    out = [f"### [Image Page {index + 1}]\n\n# Quarterly Report {index + 1}\n\n"]
+    for s in range(sections):
+        out.append(f"## Section {s + 1}\n\n")
+        out.append(" ".join(sentence(rng) for _ in range(8)) + "\n\n")
+        out.append("".join(f"- {sentence(rng)}\n  {sentence(rng)}\n" for _ in range(4)) + "\n")
+        out.append("| Item | Note | Amount |\n|---|---|---|\n")
+        out.append("".join(f"| Item {i + 1} | {sentence(rng)} | {rng.uniform(1, 999):.2f} |\n" for i in range(8)) + "\n")
+    return "".join(out)
+
+async def run(pages: list[str], budget: int, concurrency: int) -> dict:
+    settings.TRANSLATION_CHUNK_TOKENS = budget
+    sem = asyncio.Semaphore(concurrency)
+    latencies, complete = [], 0
+
+    async def one(text: str):
+        nonlocal complete
+        async with sem:
+            started = time.perf_counter()
+            translated, _ = await ollama_client.translate_markdown(text, "Spanish")
+            latencies.append(time.perf_counter() - started)
+            complete += translated == text.upper()
+
+    calls = ollama_client.requests
+    started = time.perf_counter()
+    await asyncio.gather(*(one(text) for text in pages))
+    return {
+        "wall": time.perf_counter() - started,
+        "latency": sum(latencies) / len(latencies),
+        "calls": (ollama_client.requests - calls) / len(pages),
+        "complete": complete,
+    }
+
+async def main(args) -> None:
+    base_url, server = serve_in_thread()
+    config.update(latency=args.latency, token_latency=args.token_latency, prompt_token_latency=args.prompt_token_latency,
+                  parallel=args.parallel, num_ctx=args.num_ctx)
+    settings.OLLAMA_MAX_CONCURRENCY = max(settings.OLLAMA_MAX_CONCURRENCY, args.parallel)
+    # Segment-level translation memory is the other path, this is about whole texts
+    translation_memory.enabled = False
+    ollama_client.base_url = base_url
+    await ollama_client.start()
+    try:
+        pages = [page(i, args.sections) for i in range(args.pages)]
+        tokens = sum(estimate_tokens(text) for text in pages) // len(pages)
+        print(f"{args.pages} pages of ~{tokens} tokens (estimated); model: {args.latency}s + {args.prompt_token_latency}s/prompt token "
+              f"to first token, {args.token_latency}s/token, {args.parallel} parallel, num_ctx {args.num_ctx or 'unlimited'}")
+        print(f"{'mode':<22} {'latency':>9} {'pages/s':>8} {'calls':>6} {'complete':>9}")
+        for label, budget in (("whole page", 10**9), (f"chunked ({args.chunk_tokens} tokens)", args.chunk_tokens)):
+            await run(pages[:1], budget, 1)  # warm up
+            single = await run(pages[:args.repeat], budget, 1)
+            loaded = await run(pages, budget, args.concurrency)
+            print(f"{label:<22} {single['latency']:8.2f}s {args.pages / loaded['wall']:8.2f} {single['calls']:6.1f} "
+                  f"{loaded['complete']:>5}/{args.pages:<3}")
+        print(f"chunks per page: {len(chunk_markdown(pages[0], args.chunk_tokens))}")
+    finally:
+        await ollama_client.close()
+        server.should_exit = True
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=6)
+    parser.add_argument("--sections", type=int, default=6, help="heading + paragraph + list + table blocks per page")
+    parser.add_argument("--chunk-tokens", type=int, default=settings.TRANSLATION_CHUNK_TOKENS)
+    parser.add_argument("--latency", type=float, default=0.1, help="seconds to first token per call")
+    parser.add_argument("--prompt-token-latency", type=float, default=0.0002, help="seconds per prompt token")
+    parser.add_argument("--token-latency", type=float, default=0.002, help="seconds per generated token")
+    parser.add_argument("--parallel", type=int, default=4, help="requests the model generates at once")
+    parser.add_argument("--num-ctx", type=int, default=4096, help="context window shared by prompt and reply, 0 = unlimited")
+    parser.add_argument("--repeat", type=int, default=3, help="pages translated one at a time for the latency")
+    parser.add_argument("--concurrency", type=int, default=2, help="pages in flight in the throughput run")
+    asyncio.run(main(parser.parse_args()))
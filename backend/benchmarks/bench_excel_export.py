@@ -0,0 +1,85 @@
+"""
+Excel export of a 1M-cell table: the previous writer (pd.ExcelWriter with openpyxl,
+then a Python loop over every cell for the column widths) vs dataframes_to_excel
+(openpyxl write-only, rows streamed in chunks, widths from a sample).
+Each run happens in a fresh process so peak RSS is comparable.
+
+Run from the project root:
+    python -m backend.benchmarks.bench_excel_export --cells 1000000
+"""
+import argparse
+import multiprocessing
+import os
+import resource
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+from openpyxl.utils import get_column_letter
+
+from backend.services.excel_service import dataframes_to_excel
+
+COLUMNS = 10
+
+def make_frame(cells: int, seed: int = 3) -> pd.DataFrame:
+    rows = cells // COLUMNS
+    rng = np.random.default_rng(seed)
+    data = {}
+    for i in range(COLUMNS):
+        if i % 3 == 0:
+            data[f"Text {i}"] = pd.Series(rng.integers(0, 10**6, rows)).map(lambda n: f"Item {n}")
+        elif i % 3 == 1:
+            values = rng.uniform(-1000, 1000, rows).round(2)
+            values[rng.random(rows) < 0.05] = np.nan
+            data[f"Amount {i}"] = values
+        else:
+            data[f"Count {i}"] = rng.integers(0, 10**5, rows)
+    return pd.DataFrame(data)
+
+def old_export(df: pd.DataFrame, output: str) -> None:
+    with pd.ExcelWriter(output, engine="openpyxl") as writer:
+        df.to_excel(writer, sheet_name="Table 1", index=False)
+        worksheet = writer.sheets["Table 1"]
+        for idx, col in enumerate(worksheet.columns):
+            max_length = 0
+            for cell in col:
+                if len(str(cell.value)) > max_length:
+                    max_length = len(str(cell.value))
+            worksheet.column_dimensions[get_column_letter(idx + 1)].width = max_length + 2
+
+def new_export(df: pd.DataFrame, output: str) -> None:
+    dataframes_to_excel([df], output)
+
+def _run(name: str, cells: int, output: str, queue) -> None:
+    df = make_frame(cells)
+    before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    (old_export if name == "old" else new_export)(df, output)
+    elapsed = time.perf_counter() - start
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    queue.put((elapsed, (peak - before) / 1024, os.path.getsize(output)))
+
+def measure(label: str, name: str, cells: int) -> None:
+    ctx = multiprocessing.get_context("spawn")
+    queue = ctx.Queue()
+    with tempfile.TemporaryDirectory() as tmp:
+        proc = ctx.Process(target=_run, args=(name, cells, os.path.join(tmp, "out.xlsx"), queue))
+        proc.start()
+        elapsed, growth, size = queue.get()
+        proc.join()
+    print(f"{label:<30} {elapsed:7.2f} s   peak RSS growth {growth:7.1f} MB   file {size / 1024 / 1024:5.1f} MB")
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cells", type=int, default=1_000_000)
+    parser.add_argument("--skip-old", action="store_true", help="the old writer takes a while on 1M cells")
+    args = parser.parse_args()
+
+    print(f"{args.cells // COLUMNS} rows x {COLUMNS} columns")
+    if not args.skip_old:
+        measure("old: ExcelWriter + cell loop", "old", args.cells)
+    measure("new: write-only stream", "new", args.cells)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+Cost of turning a rendered page into an /api/chat request body: the old path
+(JPEG into a BytesIO, getvalue, base64 to str, json.dumps, encode) vs
+encode_image + build_chat_body, plus payload sizes per format and color mode.
+Peak allocation is traced per call, so it counts the copies made along the way.
+
+Run from the project root:
+    python -m backend.benchmarks.bench_image_encoding --runs 20
+"""
+import argparse
+import base64
+import io
+import json
+import time
+import tracemalloc
+
+from PIL import Image
+
+from backend.benchmarks.bench_pdf_render_memory import make_pdf
+from backend.services.image_service import encode_image
+from backend.services.ollama_client import build_chat_body
+from backend.services.pdf_service import iter_pdf_pages
+
+PROMPT = "Extract the text from this image."
+
+def old_body(img: Image.Image) -> bytes:
+    buffered = io.BytesIO()
+    img.save(buffered, format="JPEG", quality=95)
+    image_b64 = base64.b64encode(buffered.getvalue()).decode("utf-8")
+    payload = {"model": "bench", "messages": [{"role": "user", "content": PROMPT, "images": [image_b64]}], "stream": False}
+    return json.dumps(payload).encode("utf-8")
+
+def new_body(img: Image.Image, **options) -> list[bytes]:
+    messages = [{"role": "user", "content": PROMPT, "images": [encode_image(img, **options)]}]
+    return build_chat_body("bench", messages, False)
+
+def measure(label: str, fn, img: Image.Image, runs: int) -> None:
+    fn(img)  # warm up the reusable buffer
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        body = fn(img)
+        samples.append(time.perf_counter() - start)
+    tracemalloc.start()
+    body = fn(img)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    size = len(body) if isinstance(body, bytes) else sum(len(chunk) for chunk in body)
+    samples.sort()
+    print(f"{label:<26} p50 {samples[len(samples) // 2] * 1000:7.1f} ms   body {size / 1024:8.1f} KB   "
+          f"peak alloc {peak / 1024 / 1024:6.2f} MB")
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=20)
+    args = parser.parse_args()
+
+    img = next(iter_pdf_pages(make_pdf(1), [0]))[1].convert("RGB")
+    print(f"page {img.size[0]}x{img.size[1]} {img.mode}, {args.runs} runs")
+
+    # Same JSON either way, the new path just never materializes it as one str
+    assert json.loads(old_body(img)) == json.loads(b"".join(new_body(img)))
+
+    measure("old: BytesIO + json.dumps", old_body, img, args.runs)
+    measure("new: JPEG q95", new_body, img, args.runs)
+    measure("new: JPEG q85 gray", lambda i: new_body(i, quality=85, color="gray"), img, args.runs)
+    measure("new: PNG bilevel", lambda i: new_body(i, format="PNG", color="bilevel"), img, args.runs)
+    measure("new: WEBP q85", lambda i: new_body(i, format="WEBP", quality=85), img, args.runs)
+
+if __name__ == "__main__":
+    main()
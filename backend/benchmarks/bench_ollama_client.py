@@ -0,0 +1,95 @@
+"""
+Per-call overhead of OllamaClient against a local fake server:
+a fresh httpx.AsyncClient per call (old behaviour) vs the shared pooled client.
+
+Run from the project root:
+    python -m backend.benchmarks.bench_ollama_client --calls 500
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+import httpx
+
+from backend.benchmarks.fake_ollama import serve_in_thread
+from backend.services.ollama_client import OllamaClient
+
+MESSAGES = [{"role": "user", "content": "Extract the text from this image.", "images": ["aGVsbG8="]}]
+
+def summarize(label: str, samples: list[float]) -> None:
+    samples = sorted(samples)
+    p95 = samples[int(len(samples) * 0.95) - 1]
+    print(f"{label:<28} mean {statistics.mean(samples) * 1000:7.3f} ms   "
+          f"p50 {statistics.median(samples) * 1000:7.3f} ms   p95 {p95 * 1000:7.3f} ms")
+
+async def per_call_client(base_url: str, calls: int) -> list[float]:
+    payload = {"model": "bench", "messages": MESSAGES, "stream": False}
+    samples = []
+    for _ in range(calls):
+        start = time.perf_counter()
+        async with httpx.AsyncClient(timeout=300.0) as client:
+            response = await client.post(f"{base_url}/api/chat", json=payload)
+            response.raise_for_status()
+            response.json()["message"]["content"]
+        samples.append(time.perf_counter() - start)
+    return samples
+
+async def pooled_client(base_url: str, calls: int) -> list[float]:
+    client = OllamaClient()
+    client.base_url = base_url
+    await client.start()
+    samples = []
+    try:
+        for _ in range(calls):
+            start = time.perf_counter()
+            await client._chat_request("bench", MESSAGES)
+            samples.append(time.perf_counter() - start)
+    finally:
+        await client.close()
+    return samples
+
+async def concurrent_wall(base_url: str, calls: int, concurrency: int, pooled: bool) -> float:
+    sem = asyncio.Semaphore(concurrency)
+    client = OllamaClient()
+    client.base_url = base_url
+
+    async def one():
+        async with sem:
+            if pooled:
+                await client._chat_request("bench", MESSAGES)
+            else:
+                async with httpx.AsyncClient(timeout=300.0) as c:
+                    (await c.post(f"{base_url}/api/chat", json={"model": "bench", "messages": MESSAGES, "stream": False})).json()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(calls)))
+    elapsed = time.perf_counter() - start
+    await client.close()
+    return elapsed
+
+async def main(calls: int, concurrency: int) -> None:
+    base_url, server = serve_in_thread()
+    try:
+        # Warm up both paths so imports and the server are hot
+        await per_call_client(base_url, 20)
+        await pooled_client(base_url, 20)
+
+        print(f"Sequential, {calls} calls")
+        summarize("per-call AsyncClient", await per_call_client(base_url, calls))
+        summarize("shared pooled client", await pooled_client(base_url, calls))
+
+        print(f"\nConcurrent ({concurrency} in flight), {calls} calls")
+        for pooled in (False, True):
+            elapsed = await concurrent_wall(base_url, calls, concurrency, pooled)
+            label = "shared pooled client" if pooled else "per-call AsyncClient"
+            print(f"{label:<28} {calls / elapsed:8.1f} calls/s")
+    finally:
+        server.should_exit = True
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=10)
+    args = parser.parse_args()
+    asyncio.run(main(args.calls, args.concurrency))
@@ -0,0 +1,117 @@
+"""
+Peak memory of eager (render_pdf_to_images) vs streaming (aiter_pdf_pages) rendering
+on a synthetic multi-hundred-page PDF. Each mode runs in its own subprocess so
+peak RSS is measured independently.
+
+Run from the project root:
+    python -m backend.benchmarks.bench_pdf_render_memory --pages 300 --dpi 100
+"""
+import argparse
+import asyncio
+import io
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+from reportlab.lib.pagesizes import letter
+from reportlab.pdfgen import canvas
+
+def make_pdf(pages: int) -> bytes:
+    buffer = io.BytesIO()
+    c = canvas.Canvas(buffer, pagesize=letter)
+    width, height = letter
+    for page in range(pages):
+        c.setFont("Helvetica-Bold", 18)
+        c.drawString(72, height - 72, f"Synthetic statement page {page + 1}")
+        c.setFont("Helvetica", 10)
+        for row in range(40):
+            y = height - 110 - row * 15
+            c.drawString(72, y, f"{row + 1:>3}  Item {page * 40 + row:<8} {(page + 1) * (row + 3) * 1.07:>12.2f}")
+            c.line(72, y - 3, width - 72, y - 3)
+        c.showPage()
+    c.save()
+    return buffer.getvalue()
+
+def peak_rss_mb(who: int = resource.RUSAGE_SELF) -> float:
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    peak = resource.getrusage(who).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+def child(mode: str, path: str, dpi: int, concurrency: int) -> None:
+    from backend.config import settings
+    settings.PDF_DPI = dpi
+    from backend.services.pdf_service import render_pdf_to_images, aiter_pdf_pages
+    from backend.services.render_pool import render_pool
+
+    with open(path, "rb") as f:
+        pdf_bytes = f.read()
+    baseline = peak_rss_mb()
+    start = time.perf_counter()
+
+    if mode == "eager":
+        images = render_pdf_to_images(pdf_bytes)
+        for img in images:
+            img.tobytes()[:1]
+    else:
+        async def consume():
+            sem = asyncio.Semaphore(concurrency)
+
+            async def work(img):
+                try:
+                    # Stand-in for encode + model latency
+                    img.tobytes()[:1]
+                    await asyncio.sleep(0.005)
+                finally:
+                    sem.release()
+
+            tasks = []
+            async for _, img in aiter_pdf_pages(pdf_bytes):
+                await sem.acquire()
+                tasks.append(asyncio.create_task(work(img)))
+            await asyncio.gather(*tasks)
+
+        async def run():
+            try:
+                await consume()
+            finally:
+                render_pool.shutdown()
+
+        asyncio.run(run())
+
+    elapsed = time.perf_counter() - start
+    # Streaming renders in the render pool, so its largest worker counts too
+    workers = peak_rss_mb(resource.RUSAGE_CHILDREN)
+    print(f"{mode:<10} {elapsed:8.2f} s   peak RSS {peak_rss_mb():9.1f} MB   "
+          f"largest render worker {workers:7.1f} MB   (baseline {baseline:.1f} MB)")
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=300)
+    parser.add_argument("--dpi", type=int, default=100, help="300 DPI matches production but needs ~25 MB per page in eager mode")
+    parser.add_argument("--concurrency", type=int, default=5)
+    parser.add_argument("--child", nargs=2, metavar=("MODE", "PATH"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.child[0], args.child[1], args.dpi, args.concurrency)
+        return
+
+    with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as f:
+        f.write(make_pdf(args.pages))
+        path = f.name
+    try:
+        print(f"{args.pages} pages at {args.dpi} DPI, streaming concurrency {args.concurrency}")
+        for mode in ("eager", "streaming"):
+            subprocess.run(
+                [sys.executable, "-m", "backend.benchmarks.bench_pdf_render_memory",
+                 "--dpi", str(args.dpi), "--concurrency", str(args.concurrency), "--child", mode, path],
+                check=True,
+            )
+    finally:
+        os.remove(path)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""
+Rasterization throughput (pages/sec) of the render pool against worker count,
+compared with rendering serially in-process.
+
+Run from the project root:
+    python -m backend.benchmarks.bench_render_pool --pages 60 --dpi 150
+"""
+import argparse
+import asyncio
+import os
+import time
+from contextlib import aclosing
+
+from backend.benchmarks.bench_pdf_render_memory import make_pdf
+from backend.config import settings
+from backend.services.pdf_service import aiter_pdf_pages, iter_pdf_pages
+from backend.services.render_pool import render_pool
+
+async def run_jobs(pdf_bytes: bytes, jobs: int, parallelism: int) -> int:
+    async def one_job() -> int:
+        rendered = 0
+        async with aclosing(aiter_pdf_pages(pdf_bytes, lookahead=parallelism, parallelism=parallelism)) as pages:
+            async for _, _image in pages:
+                rendered += 1
+        return rendered
+
+    return sum(await asyncio.gather(*(one_job() for _ in range(jobs))))
+
+async def main(pages: int, dpi: int, jobs: int, max_workers: int) -> None:
+    settings.PDF_DPI = dpi
+    pdf_bytes = make_pdf(pages)
+
+    start = time.perf_counter()
+    for _ in range(jobs):
+        for _ in iter_pdf_pages(pdf_bytes):
+            pass
+    serial = jobs * pages / (time.perf_counter() - start)
+    print(f"{pages} pages at {dpi} DPI, {jobs} concurrent job(s), {os.cpu_count()} CPU cores")
+    print(f"{'in-process serial':<22} {serial:8.1f} pages/s")
+
+    workers = 1
+    while workers <= max_workers:
+        render_pool.shutdown()
+        render_pool.workers = workers
+        render_pool.start()
+        # Warm-up: spawn every worker and import pdfium before timing
+        await run_jobs(make_pdf(workers), 1, workers)
+
+        start = time.perf_counter()
+        rendered = await run_jobs(pdf_bytes, jobs, workers)
+        rate = rendered / (time.perf_counter() - start)
+        print(f"{f'pool, {workers} worker(s)':<22} {rate:8.1f} pages/s   x{rate / serial:.2f}")
+        workers *= 2
+    render_pool.shutdown()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=60)
+    parser.add_argument("--dpi", type=int, default=150)
+    parser.add_argument("--jobs", type=int, default=1)
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+    asyncio.run(main(args.pages, args.dpi, args.jobs, args.max_workers))
@@ -0,0 +1,73 @@
+"""
+Render + preprocess cost per page: rendering at PDF_DPI and LANCZOS-downscaling
+to the OCR budget (old behaviour) vs rendering straight at the target size,
+in color and in grayscale. Each mode runs in its own subprocess, so the peak RSS
+growth over the baseline is the working set of one page.
+
+Run from the project root:
+    python -m backend.benchmarks.bench_render_profiles --pages 20
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from backend.benchmarks.bench_pdf_render_memory import make_pdf, peak_rss_mb
+
+MODES = ("render-then-downscale", "target-rgb", "target-gray")
+
+def child(mode: str, path: str, max_px: int) -> None:
+    import pypdfium2 as pdfium
+    from backend.config import settings
+    from backend.services.image_service import preprocess_image
+    from backend.services.render_pool import RenderProfile, render_page
+
+    max_scale = settings.PDF_DPI / 72.0
+    profile = {
+        "render-then-downscale": RenderProfile(max_px=0, max_scale=max_scale, grayscale=False),
+        "target-rgb": RenderProfile(max_px=max_px, max_scale=max_scale, grayscale=False),
+        "target-gray": RenderProfile(max_px=max_px, max_scale=max_scale, grayscale=True),
+    }[mode]
+
+    pdf = pdfium.PdfDocument(path)
+    baseline = peak_rss_mb()
+    samples = []
+    for index in range(len(pdf)):
+        start = time.perf_counter()
+        image = preprocess_image(render_page(pdf, index, profile), max_dim=max_px)
+        samples.append(time.perf_counter() - start)
+    pdf.close()
+
+    samples.sort()
+    print(f"{mode:<22} {sum(samples) / len(samples) * 1000:8.1f} ms/page   p50 {samples[len(samples) // 2] * 1000:8.1f} ms   "
+          f"output {image.size[0]}x{image.size[1]} {image.mode:<3}  peak RSS growth {peak_rss_mb() - baseline:7.1f} MB")
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=20)
+    parser.add_argument("--max-px", type=int, default=2048, help="OCR pixel budget (longest side)")
+    parser.add_argument("--child", nargs=2, metavar=("MODE", "PATH"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.child[0], args.child[1], args.max_px)
+        return
+
+    with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as f:
+        f.write(make_pdf(args.pages))
+        path = f.name
+    try:
+        print(f"{args.pages} letter pages, PDF_DPI ceiling, {args.max_px} px budget")
+        for mode in MODES:
+            subprocess.run(
+                [sys.executable, "-m", "backend.benchmarks.bench_render_profiles",
+                 "--max-px", str(args.max_px), "--child", mode, path],
+                check=True,
+            )
+    finally:
+        os.remove(path)
+
+if __name__ == "__main__":
+    main()
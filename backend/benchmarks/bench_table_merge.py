@@ -0,0 +1,86 @@
+"""
+Merging the per-page tables of a long statement: the previous merger (pd.concat
+into the running table for every page, any same-width table merged) vs
+merge_tables_with_report (grouped by header fingerprint and column types,
+one concat per group). Every 10th page lost its header, every 25th repeats the
+header inside the body and every 50th ends with a same-width summary table.
+
+Run from the project root:
+    python -m backend.benchmarks.bench_table_merge --pages 500
+"""
+import argparse
+import time
+
+import pandas as pd
+
+from backend.services.table_merger import merge_tables_with_report
+from backend.services.table_parser import parse_markdown_tables
+
+HEADER = "| Date | Description | Debit | Credit | Balance |\n|---|---|---|---|---|\n"
+
+def make_pages(pages: int, rows: int) -> tuple[list[pd.DataFrame], list[int]]:
+    tables, page_numbers = [], []
+    n = 0
+    for page in range(1, pages + 1):
+        lines = []
+        for _ in range(rows):
+            n += 1
+            lines.append(f"| 2024-{n % 12 + 1:02d}-{n % 28 + 1:02d} | Transfer {n} | {n % 500}.25 | {n % 300}.50 | {n * 3}.75 |")
+        if page % 25 == 0:
+            lines.insert(rows // 2, "| DATE | description | Debit | Credit | Balance |")
+        body = "\n".join(lines) + "\n"
+        markdown = body if page % 10 == 0 else HEADER + body
+        if page % 50 == 0:
+            markdown += "\n| Summary | Opening | In | Out | Closing |\n|---|---|---|---|---|\n| Page | 1.00 | 2.00 | 3.00 | 4.00 |\n"
+        found = parse_markdown_tables(markdown)
+        tables.extend(found)
+        page_numbers.extend([page] * len(found))
+    return tables, page_numbers
+
+def old_merge(tables: list[pd.DataFrame]) -> list[pd.DataFrame]:
+    merged_tables = []
+    current_master = tables[0]
+    for next_table in tables[1:]:
+        if list(current_master.columns) == list(next_table.columns):
+            current_master = pd.concat([current_master, next_table], ignore_index=True)
+        elif len(current_master.columns) == len(next_table.columns):
+            next_table.columns = current_master.columns
+            current_master = pd.concat([current_master, next_table], ignore_index=True)
+        else:
+            merged_tables.append(current_master)
+            current_master = next_table
+    merged_tables.append(current_master)
+    return merged_tables
+
+def measure(label: str, fn, runs: int) -> list[pd.DataFrame]:
+    samples, result = [], None
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = fn()
+        samples.append(time.perf_counter() - start)
+    samples.sort()
+    sizes = ", ".join(str(len(t)) for t in result[:4]) + (", ..." if len(result) > 4 else "")
+    print(f"{label:<34} p50 {samples[len(samples) // 2] * 1000:8.1f} ms   {len(result)} table(s): {sizes} rows")
+    return result
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=500)
+    parser.add_argument("--rows", type=int, default=40, help="rows per page")
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    tables, page_numbers = make_pages(args.pages, args.rows)
+    print(f"{args.pages} pages, {len(tables)} tables, {args.pages * args.rows} transaction rows")
+
+    # The old merger renames columns of its inputs, give it copies
+    measure("old: concat per page", lambda: old_merge([t.copy() for t in tables]), args.runs)
+    merged = measure("new: fingerprint groups", lambda: merge_tables_with_report(tables, page_numbers)[0], args.runs)
+    _, decisions = merge_tables_with_report(tables, page_numbers)
+    actions = pd.Series([d["action"] for d in decisions]).value_counts().to_dict()
+    print(f"{'new: decisions':<34} {actions}, repeated header rows dropped: "
+          f"{sum(d['repeated_header_rows'] for d in decisions)}")
+    print(f"{'new: main table dtypes':<34} {merged[0].dtypes.astype(str).tolist()}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+Markdown table parsing on synthetic model output: the previous parser (joined
+lines through pd.read_csv(engine="python") plus a per-cell strip via df.map)
+vs the single-pass column tokenizer, on plain, escaped/ragged and streamed input.
+
+Run from the project root:
+    python -m backend.benchmarks.bench_table_parser --rows 10000
+"""
+import argparse
+import io
+import random
+import re
+import time
+
+import pandas as pd
+
+from backend.services.table_parser import MarkdownTableParser, parse_markdown_tables
+
+COLUMNS = ["Date", "Account", "Description", "Reference", "Debit", "Credit", "Balance", "Status"]
+
+def make_table(rows: int, messy: bool = False, seed: int = 7) -> str:
+    rnd = random.Random(seed)
+    lines = ["| " + " | ".join(COLUMNS) + " |", "|" + "|".join(["---"] * len(COLUMNS)) + "|"]
+    for i in range(rows):
+        description = f"Payment {rnd.randint(1, 99999)} to vendor {rnd.choice('ABCDEFG')}"
+        if messy and i % 7 == 0:
+            description = f"Split \\| fee `a|b` {i}"
+        cells = [
+            f"2024-{rnd.randint(1, 12):02d}-{rnd.randint(1, 28):02d}",
+            str(rnd.randint(10000, 99999)),
+            description,
+            f"REF-{i:06d}",
+            f"{rnd.uniform(0, 5000):.2f}",
+            f"{rnd.uniform(0, 5000):,.2f}" if messy else f"{rnd.uniform(0, 5000):.2f}",
+            f"{rnd.uniform(-1000, 100000):.2f}",
+            rnd.choice(["cleared", "pending", "void"]),
+        ]
+        if messy and i % 11 == 0:
+            cells = cells[:6]  # ragged: the model dropped the last cells
+        lines.append("| " + " | ".join(cells) + " |")
+    return "\n".join(lines) + "\n"
+
+# --- Previous implementation, kept for comparison (separator regex fixed so it runs) ---
+
+def old_parse(md_text: str) -> list[pd.DataFrame]:
+    tables, current, in_table = [], [], False
+    for line in md_text.split("\n"):
+        stripped = line.strip()
+        if stripped.startswith("|") and stripped.endswith("|"):
+            if re.match(r"^\|[\s:-]+(\|[\s:-]+)+\|$", stripped):
+                continue
+            in_table = True
+            current.append(stripped)
+        elif in_table:
+            tables.append(_old_to_df(current))
+            current, in_table = [], False
+    if in_table and current:
+        tables.append(_old_to_df(current))
+    return [t for t in tables if not t.empty]
+
+def _old_to_df(lines: list[str]) -> pd.DataFrame:
+    data = "\n".join(line.strip("|") for line in lines)
+    df = pd.read_csv(io.StringIO(data), sep="|", engine="python")
+    df.columns = df.columns.str.strip()
+    df = df.map(lambda x: x.strip() if isinstance(x, str) else x)
+    return df.dropna(axis=1, how="all")
+
+def streamed(md_text: str, chunk: int = 12) -> list[pd.DataFrame]:
+    parser = MarkdownTableParser()
+    tables = []
+    for i in range(0, len(md_text), chunk):
+        tables.extend(parser.feed(md_text[i:i + chunk]))
+    return tables + parser.close()
+
+def measure(label: str, fn, text: str, runs: int) -> list[pd.DataFrame] | None:
+    samples, result = [], None
+    for _ in range(runs):
+        start = time.perf_counter()
+        try:
+            result = fn(text)
+        except Exception as e:
+            print(f"{label:<34} failed: {type(e).__name__}: {e}")
+            return None
+        samples.append(time.perf_counter() - start)
+    samples.sort()
+    shape = f"{len(result)} table(s), {result[0].shape[0]}x{result[0].shape[1]}" if result else "no tables"
+    print(f"{label:<34} p50 {samples[len(samples) // 2] * 1000:8.1f} ms   {shape}")
+    return result
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    clean = make_table(args.rows)
+    messy = make_table(args.rows, messy=True)
+
+    print(f"clean table, {args.rows} rows x {len(COLUMNS)} columns ({len(clean) / 1024:.0f} KB)")
+    old = measure("old: read_csv + df.map", old_parse, clean, args.runs)
+    new = measure("new: column tokenizer", parse_markdown_tables, clean, args.runs)
+    measure("new: streamed in 12-char chunks", streamed, clean, args.runs)
+    if old and new:
+        print(f"{'numeric columns old/new':<34} {sum(pd.api.types.is_numeric_dtype(t) for t in old[0].dtypes)}"
+              f" / {sum(pd.api.types.is_numeric_dtype(t) for t in new[0].dtypes)}")
+
+    print("\nescaped pipes, inline code, thousands separators, ragged rows")
+    old = measure("old: read_csv + df.map", old_parse, messy, args.runs)
+    new = measure("new: column tokenizer", parse_markdown_tables, messy, args.runs)
+    if new:
+        print(f"{'new: Credit column dtype':<34} {new[0]['Credit'].dtype}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+"""
+Single-shot vs tiled OCR of a tall page (a long receipt) against a fake Ollama
+whose stub model actually "reads" the image: every receipt line is a bar whose
+length encodes the line number. Lines squashed too small are misread, bars cut
+at a band edge come back garbled, and replies stop at --max-tokens like an
+overflowing context window (num_ctx).
+
+Reports the latency of one page at a time, the throughput with --concurrency
+pages in flight, model calls and generated tokens per page, and how many
+receipt lines came back right.
+
+Run from the project root:
+    python -m backend.benchmarks.bench_tiled_ocr --lines 180 --token-latency 0.002 --image-latency 0.2 --parallel 4
+"""
+import argparse
+import asyncio
+import time
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+from backend.benchmarks.fake_ollama import _TOKEN, config, serve_in_thread
+from backend.config import settings
+from backend.services.conversion_service import ConversionService
+from backend.services.ocr_cache import ocr_cache
+from backend.services.ollama_client import ollama_client
+from backend.services.tiled_ocr import band_boxes, fit_page
+
+WIDTH = 1000
+MARGIN = 40
+PITCH = 36  # px from one receipt line to the next
+BAR = 14    # bar height
+BAR_MIN = 60
+
+def line_text(k: int) -> str:
+    return f"{k + 1:03d} Widget {k + 1:03d}, blue, size M ........ {(k + 1) * 1.75:8.2f}"
+
+def receipt(lines: int) -> Image.Image:
+    step = (WIDTH - BAR_MIN - 60) / lines
+    img = Image.new("L", (WIDTH, 2 * MARGIN + lines * PITCH), 255)
+    draw = ImageDraw.Draw(img)
+    for k in range(lines):
+        top = MARGIN + k * PITCH
+        draw.rectangle((0, top, BAR_MIN + round(k * step), top + BAR - 1), fill=0)
+    return img
+
+def stub_reader(lines: int):
+    """The stub model: one text line per bar, read off the bar's length."""
+    step = (WIDTH - BAR_MIN - 60) / lines
+
+    def read(image: Image.Image) -> str:
+        dark = np.asarray(image.convert("L")) < 128
+        scale = image.width / WIDTH
+        rows = dark.any(axis=1)
+        edges = np.flatnonzero(np.diff(np.concatenate(([0], rows.astype(np.int8), [0]))))
+        out = []
+        for top, bottom in zip(edges[::2], edges[1::2]):
+            if top == 0 or bottom == len(rows) or bottom - top < BAR * scale * 0.7:
+                out.append("~~ W1dg~ b1u~")  # a line cut by the image edge
+                continue
+            length = dark[(top + bottom) // 2].sum() / scale
+            k = round((length - BAR_MIN) / step)
+            out.append(line_text(k) if 0 <= k < lines else "???")
+        return "\n".join(out)
+
+    return read
+
+def score(text: str, lines: int) -> tuple[int, int]:
+    """(receipt lines read right, lines that shouldn't be there)."""
+    expected = [line_text(k) for k in range(lines)]
+    got = [line for line in text.splitlines() if line.strip()]
+    right = len(set(got) & set(expected))
+    return right, len(got) - right
+
+async def run(mode: str, page: Image.Image, pages: int, concurrency: int, lines: int) -> dict:
+    ocr = ConversionService.ocr_page_text if mode == "tiled" else ConversionService.ocr_image_text
+    sem = asyncio.Semaphore(concurrency)
+    latencies, texts = [], []
+
+    async def one():
+        async with sem:
+            started = time.perf_counter()
+            texts.append(await ocr(page))
+            latencies.append(time.perf_counter() - started)
+
+    calls_before = calls[0]
+    started = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(pages)))
+    wall = time.perf_counter() - started
+    right, extra = score(texts[0], lines)
+    return {
+        "wall": wall,
+        "latency": sum(latencies) / len(latencies),
+        "calls": (calls[0] - calls_before) / pages,
+        "tokens": sum(len(_TOKEN.findall(text)) for text in texts) / pages,
+        "right": right,
+        "extra": extra,
+    }
+
+calls = [0]
+
+async def main(args) -> None:
+    base_url, server = serve_in_thread()
+    reader = stub_reader(args.lines)
+
+    def counting_reader(image: Image.Image) -> str:
+        calls[0] += 1
+        return reader(image)
+
+    config.update(latency=args.latency, token_latency=args.token_latency, image_latency=args.image_latency,
+                  parallel=args.parallel, max_tokens=args.max_tokens, image_reply=counting_reader)
+    settings.OLLAMA_MAX_CONCURRENCY = max(settings.OLLAMA_MAX_CONCURRENCY, args.parallel)
+    ocr_cache.enabled = False  # every page is the same image
+    ollama_client.base_url = base_url
+    await ollama_client.start()
+    try:
+        page = fit_page(receipt(args.lines))
+        bands = len(band_boxes(page.size))
+        print(f"receipt {page.width}x{page.height} px, {args.lines} lines, {bands} bands; "
+              f"model: {args.latency}s + {args.image_latency}s/MP to first token, {args.token_latency}s/token, "
+              f"{args.parallel} parallel, max {args.max_tokens or 'unlimited'} tokens")
+        print(f"{'mode':<12} {'latency':>9} {'pages/s':>8} {'calls':>6} {'tokens':>7} {'lines right':>12} {'extra':>6}")
+        for mode in ("single-shot", "tiled"):
+            await run(mode, page, 1, 1, args.lines)  # warm up
+            single = await run(mode, page, args.repeat, 1, args.lines)
+            loaded = await run(mode, page, args.pages, args.concurrency, args.lines)
+            print(f"{mode:<12} {single['latency']:8.2f}s {args.pages / loaded['wall']:8.2f} {single['calls']:6.1f} "
+                  f"{single['tokens']:7.0f} {single['right']:>7}/{args.lines:<4} {single['extra']:6}")
+    finally:
+        await ollama_client.close()
+        server.should_exit = True
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--lines", type=int, default=180, help="receipt lines, the page is ~36 px per line tall")
+    parser.add_argument("--latency", type=float, default=0.1, help="seconds to first token per call")
+    parser.add_argument("--image-latency", type=float, default=0.2, help="extra seconds per megapixel of image")
+    parser.add_argument("--token-latency", type=float, default=0.002, help="seconds per generated token")
+    parser.add_argument("--parallel", type=int, default=4, help="requests the model generates at once")
+    parser.add_argument("--max-tokens", type=int, default=1024, help="reply budget left in num_ctx after prompt and image, 0 = none")
+    parser.add_argument("--repeat", type=int, default=3, help="pages OCR'd one at a time for the latency")
+    parser.add_argument("--pages", type=int, default=8, help="pages for the throughput run")
+    parser.add_argument("--concurrency", type=int, default=4, help="pages in flight in the throughput run")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,74 @@
+"""
+Wall-clock time of /api/ocr/translate style processing against a fake Ollama
+with separate OCR and translation latencies: OCR page N then translate page N
+one page at a time (old behaviour) vs the two-stage OCR -> translation pipeline.
+Also reports when the first translated page becomes available.
+
+Run from the project root:
+    python -m backend.benchmarks.bench_translate_pipeline --pages 10 --ocr-latency 0.4 --translate-latency 0.3
+"""
+import argparse
+import asyncio
+import time
+
+from PIL import Image
+
+from backend.benchmarks.fake_ollama import config, serve_in_thread
+from backend.config import settings
+from backend.services.ocr_cache import ocr_cache
+from backend.services.ollama_client import ollama_client
+from backend.services.translation_memory import translation_memory
+from backend.services.translation_service import DocumentTranslationService
+
+async def fake_pages(count: int):
+    # Pre-rendered pages, so only the model stages are measured
+    image = Image.new("RGB", (850, 1100), "white")
+    for index in range(count):
+        yield index, image
+
+async def sequential(pages: int, target_language: str) -> tuple[float, float]:
+    start = time.perf_counter()
+    first = None
+    async for _, img in fake_pages(pages):
+        await DocumentTranslationService.translate_page(img, target_language)
+        first = first or time.perf_counter() - start
+    return time.perf_counter() - start, first
+
+async def pipelined(pages: int, target_language: str, depth: int) -> tuple[float, float]:
+    start = time.perf_counter()
+    first = None
+    async for _ in DocumentTranslationService.aiter_translated_pages(fake_pages(pages), target_language, depth):
+        first = first or time.perf_counter() - start
+    return time.perf_counter() - start, first
+
+async def main(pages: int, ocr_latency: float, translate_latency: float, depth: int) -> None:
+    base_url, server = serve_in_thread()
+    config["reply"] = "Invoice total due within thirty days."
+    config["model_latency"] = {settings.OCR_MODEL: ocr_latency, settings.TRANSLATION_MODEL: translate_latency}
+    # Every page gets the same reply, caching would hide the model latency
+    ocr_cache.enabled = False
+    translation_memory.enabled = False
+    ollama_client.base_url = base_url
+    await ollama_client.start()
+    try:
+        print(f"{pages} pages, OCR {ocr_latency:.2f}s/page, translation {translate_latency:.2f}s/page")
+        ideal = ocr_latency + translate_latency + (pages - 1) * max(ocr_latency, translate_latency)
+        for label, run in (
+            ("sequential", sequential(pages, "Spanish")),
+            (f"pipelined (depth {depth})", pipelined(pages, "Spanish", depth)),
+        ):
+            wall, first = await run
+            print(f"{label:<22} wall {wall:6.2f} s   first page {first:5.2f} s   {pages / wall:5.2f} pages/s")
+        print(f"{'pipeline lower bound':<22} wall {ideal:6.2f} s")
+    finally:
+        await ollama_client.close()
+        server.should_exit = True
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=10)
+    parser.add_argument("--ocr-latency", type=float, default=0.4)
+    parser.add_argument("--translate-latency", type=float, default=0.3)
+    parser.add_argument("--depth", type=int, default=settings.TRANSLATE_PIPELINE_DEPTH)
+    args = parser.parse_args()
+    asyncio.run(main(args.pages, args.ocr_latency, args.translate_latency, args.depth))
@@ -0,0 +1,221 @@
+"""
+Minimal stand-in for the Ollama /api/chat endpoint, streaming and non-streaming.
+Used by the benchmarks to measure client-side overhead without a GPU, and by the
+load test as the model server of a running app.
+
+Replies are canned per task (page OCR, table extraction, translation) unless a
+fixed reply is configured, or an `image_reply` function "reads" the image. Latency
+is simulated per phase: model load on first use, time to the first token (plus
+time per megapixel of the image and per prompt token), then time per generated
+token. `max_tokens` and `num_ctx` cut replies off like a context window that is too small.
+
+Run standalone (then start the app with OLLAMA_BASE_URL=http://127.0.0.1:11435):
+    python -m backend.benchmarks.fake_ollama --token-latency 0.02 --load-delay 2 --parallel 4
+"""
+import argparse
+import asyncio
+import base64
+import io
+import json
+import re
+import socket
+import threading
+import time
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+from PIL import Image
+
+app = FastAPI()
+
+OCR_REPLY = """# Statement of Account
+
+Customer: Northwind Traders, 120 Hanover Square, London
+Period: January 1 to January 31, 2024
+
+Payments received after the statement date will appear on the next statement. Please
+quote the account number on all correspondence.
+
+| Date | Description | Amount |
+|---|---|---|
+| 2024-01-03 | Opening balance | 1,250.00 |
+| 2024-01-12 | Invoice 10452 | 310.75 |
+| 2024-01-28 | Payment, thank you | -500.00 |
+"""
+
+TABLE_REPLY = "| Date | Description | Debit | Credit | Balance |\n|---|---|---|---|---|\n" + "".join(
+    f"| 2024-01-{day:02d} | Transfer {day:04d} | {day * 13.5:.2f} | {day * 7.25:.2f} | {1000 + day * 6.25:.2f} |\n"
+    for day in range(1, 29)
+)
+
+# Simulated model behaviour, tweak from the benchmark scripts
+config = {
+    "latency": 0.0,        # seconds before the first token / full response
+    "model_latency": {},   # per-model overrides of latency, e.g. {"docai-ocr": 0.5}
+    "token_latency": 0.0,  # seconds per generated token, streamed or not
+    "image_latency": 0.0,  # extra seconds before the first token per megapixel of the image (vision encoder)
+    "load_delay": 0.0,     # seconds to load a model the first time (and after keep_alive)
+    "keep_alive": 0.0,     # idle seconds before a model is unloaded again, 0 = never
+    "parallel": 0,         # requests per model generated at once (OLLAMA_NUM_PARALLEL), 0 = no limit
+    "reply": None,         # same reply for every call, or None for the canned ones below
+    "replies": {"ocr": OCR_REPLY, "table": TABLE_REPLY},
+    "image_reply": None,   # function(PIL image) -> reply for image prompts (in-process servers only)
+    "max_tokens": 0,       # replies are cut off after this many tokens, like a full context window; 0 = no limit
+    "num_ctx": 0,          # replies are cut off once prompt and reply fill this many tokens; 0 = no limit
+    "prompt_token_latency": 0.0,  # seconds per prompt token before the first token
+}
+
+_TOKEN = re.compile(r"\S+\s*|\s+")
+
+# Per model: when it was last used (absent = not loaded), load lock, generation slots
+_last_used: dict[str, float] = {}
+_load_locks: dict[str, asyncio.Lock] = {}
+_slots: dict[str, tuple[int, asyncio.Semaphore]] = {}
+
+def _image(payload: dict) -> Image.Image | None:
+    images = (payload.get("messages") or [{}])[-1].get("images")
+    return Image.open(io.BytesIO(base64.b64decode(images[0]))) if images else None
+
+def _reply(payload: dict, image: Image.Image | None) -> str:
+    if config["reply"] is not None:
+        return config["reply"]
+    message = (payload.get("messages") or [{}])[-1]
+    content = message.get("content", "")
+    if image is not None:
+        if config["image_reply"] is not None:
+            return config["image_reply"](image)
+        return config["replies"]["table" if "table" in content.lower() else "ocr"]
+    # A translation prompt: "uppercase" is the translation, which keeps the layout and [[n]] markers
+    return content.rsplit(":\n\n\n", 1)[-1].upper()
+
+async def _load(model: str) -> int:
+    """Waits for the model to be loaded, returns the load time in ns (0 if it was loaded)."""
+    lock = _load_locks.setdefault(model, asyncio.Lock())
+    async with lock:
+        last = _last_used.get(model)
+        loaded = 0
+        if last is None or (config["keep_alive"] and time.monotonic() - last > config["keep_alive"]):
+            started = time.perf_counter_ns()
+            if config["load_delay"]:
+                await asyncio.sleep(config["load_delay"])
+            loaded = time.perf_counter_ns() - started
+        _last_used[model] = time.monotonic()
+        return loaded
+
+def _slot(model: str) -> asyncio.Semaphore | None:
+    limit = config["parallel"]
+    if not limit:
+        return None
+    current = _slots.get(model)
+    if current is None or current[0] != limit:
+        current = _slots[model] = (limit, asyncio.Semaphore(limit))
+    return current[1]
+
+def _usage(payload: dict, tokens: int, started: float, load: int = 0) -> dict:
+    # Same fields (durations in ns) as the final message of a real /api/chat call
+    prompt = sum(len(m.get("content", "")) for m in payload.get("messages", [])) // 4
+    elapsed = time.perf_counter_ns() - started
+    work = max(elapsed - load, 1)
+    return {
+        "prompt_eval_count": prompt,
+        "prompt_eval_duration": work // 10,
+        "eval_count": tokens,
+        "eval_duration": max(work - work // 10, 1),
+        "load_duration": load,
+        "total_duration": elapsed,
+    }
+
+@app.post("/api/chat")
+async def chat(request: Request):
+    started = time.perf_counter_ns()
+    payload = await request.json()
+    model = payload.get("model")
+    image = _image(payload)
+    tokens = _TOKEN.findall(_reply(payload, image))
+    if config["max_tokens"]:
+        tokens = tokens[:config["max_tokens"]]
+    prompt_tokens = sum(len(_TOKEN.findall(m.get("content", ""))) for m in payload.get("messages", []))
+    if config["num_ctx"]:
+        tokens = tokens[:max(config["num_ctx"] - prompt_tokens, 0)]
+    latency = config["model_latency"].get(model, config["latency"]) + config["prompt_token_latency"] * prompt_tokens
+    if image is not None:
+        latency += config["image_latency"] * image.width * image.height / 1e6
+    load = await _load(model)
+    slot = _slot(model)
+
+    if not payload.get("stream", True):
+        if slot:
+            await slot.acquire()
+        try:
+            delay = latency + config["token_latency"] * len(tokens)
+            if delay:
+                await asyncio.sleep(delay)
+        finally:
+            if slot:
+                slot.release()
+        _last_used[model] = time.monotonic()
+        return JSONResponse({
+            "model": model,
+            "message": {"role": "assistant", "content": "".join(tokens)},
+            "done": True,
+            **_usage(payload, len(tokens), started, load),
+        })
+
+    async def token_stream():
+        if slot:
+            await slot.acquire()
+        try:
+            if latency:
+                await asyncio.sleep(latency)
+            for token in tokens:
+                if config["token_latency"]:
+                    await asyncio.sleep(config["token_latency"])
+                yield json.dumps({"model": model, "message": {"role": "assistant", "content": token}, "done": False}) + "\n"
+        finally:
+            if slot:
+                slot.release()
+        _last_used[model] = time.monotonic()
+        final = {"model": model, "message": {"role": "assistant", "content": ""}, "done": True,
+                 **_usage(payload, len(tokens), started, load)}
+        yield json.dumps(final) + "\n"
+
+    return StreamingResponse(token_stream(), media_type="application/x-ndjson")
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def serve_in_thread(port: int | None = None) -> tuple[str, uvicorn.Server]:
+    """Start the fake server on a background thread and return its base URL."""
+    port = port or free_port()
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.01)
+    return f"http://127.0.0.1:{port}", server
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=11435)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds before the first token")
+    parser.add_argument("--token-latency", type=float, default=0.0, help="seconds per generated token")
+    parser.add_argument("--image-latency", type=float, default=0.0, help="extra seconds per megapixel of an image")
+    parser.add_argument("--load-delay", type=float, default=0.0, help="seconds to load a model on first use")
+    parser.add_argument("--keep-alive", type=float, default=0.0, help="idle seconds before a model is unloaded, 0 = never")
+    parser.add_argument("--parallel", type=int, default=0, help="requests per model generated at once, 0 = no limit")
+    parser.add_argument("--reply", help="fixed reply for every call instead of the canned OCR/table/translation ones")
+    parser.add_argument("--max-tokens", type=int, default=0, help="cut replies off after this many tokens, 0 = no limit")
+    parser.add_argument("--num-ctx", type=int, default=0, help="cut replies off once prompt and reply fill this many tokens, 0 = no limit")
+    parser.add_argument("--prompt-token-latency", type=float, default=0.0, help="seconds per prompt token before the first token")
+    args = parser.parse_args()
+
+    config.update(latency=args.latency, token_latency=args.token_latency, image_latency=args.image_latency, load_delay=args.load_delay,
+                  keep_alive=args.keep_alive, parallel=args.parallel, reply=args.reply, max_tokens=args.max_tokens,
+                  num_ctx=args.num_ctx, prompt_token_latency=args.prompt_token_latency)
+    uvicorn.run(app, host="127.0.0.1", port=args.port, log_level="warning")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,367 @@
+"""
+Load test of the whole app against the fake Ollama server: a weighted mix of
+/api/ocr/text, /api/ocr/table, /api/ocr/translate(/stream) and /api/convert/*
+requests with scanned (image-only) PDFs, so every page goes through rendering and
+the model. Reports throughput, p50/p95/p99 latency, time to first token of the
+streaming endpoints, error rate per scenario and the server's RSS (render workers
+included).
+
+By default the fake server and the app are started as subprocesses, with the OCR
+cache and translation memory off (the fixtures repeat, caching would hide the
+model). --url targets an app that is already running instead.
+
+Closed loop (--concurrency users sending back to back) or open loop (--rate
+arrivals per second, latency counted from the planned start so a slow server
+can't hide its queue).
+
+Run from the project root:
+    python -m backend.benchmarks.load_test --concurrency 8 --duration 60 --token-latency 0.01
+    python -m backend.benchmarks.load_test --rate 2 --duration 120 --mix ocr_text=3,ocr_table=1,convert_pdf_to_excel=1
+    python -m backend.benchmarks.load_test --url http://127.0.0.1:8000 --server-pid 1234 --json load.json
+"""
+import argparse
+import asyncio
+import io
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from typing import Awaitable, Callable, NamedTuple
+
+import httpx
+import img2pdf
+import pypdfium2 as pdfium
+
+from backend.benchmarks.bench_pdf_render_memory import make_pdf
+from backend.benchmarks.fake_ollama import free_port
+
+# --- Fixtures ---
+
+def scanned_pdf(pages: int, dpi: int = 150) -> bytes:
+    """Synthetic statement pages as JPEG scans, no text layer, so OCR can't be skipped."""
+    pdf = pdfium.PdfDocument(make_pdf(pages))
+    try:
+        scans = []
+        for page in pdf:
+            img = page.render(scale=dpi / 72, grayscale=True).to_pil()
+            buffer = io.BytesIO()
+            img.save(buffer, format="JPEG", quality=80, dpi=(dpi, dpi))
+            scans.append(buffer.getvalue())
+    finally:
+        pdf.close()
+    return img2pdf.convert(scans)
+
+class Fixtures(NamedTuple):
+    scan: bytes        # --pages scanned pages
+    scan_page: bytes   # a single scanned page
+    text_pdf: bytes    # pages with a text layer, for the pure PDF conversions
+
+# --- Scenarios ---
+
+class Outcome(NamedTuple):
+    status: int
+    error: str | None = None
+    first_token: float | None = None  # seconds after the request started, streaming endpoints only
+
+async def _read_stream(response: httpx.Response, started: float, first: Callable[[dict], bool]) -> Outcome:
+    """Reads a JSON-lines event stream; the first event passing `first` is the first token."""
+    first_token, error = None, None
+    async for line in response.aiter_lines():
+        if not line.strip():
+            continue
+        event = json.loads(line)
+        if event.get("type") == "error":
+            error = event.get("message", "error event")
+        elif first_token is None and first(event):
+            first_token = time.perf_counter() - started
+    return Outcome(response.status_code, error, first_token)
+
+async def _post_stream(client: httpx.AsyncClient, path: str, first: Callable[[dict], bool], **kwargs) -> Outcome:
+    started = time.perf_counter()
+    async with client.stream("POST", path, **kwargs) as response:
+        if response.status_code != 200:
+            await response.aread()
+            return Outcome(response.status_code, f"HTTP {response.status_code}")
+        return await _read_stream(response, started, first)
+
+async def _post(client: httpx.AsyncClient, path: str, **kwargs) -> Outcome:
+    response = await client.post(path, **kwargs)
+    if response.status_code != 200:
+        return Outcome(response.status_code, f"HTTP {response.status_code}")
+    if response.headers.get("content-type", "").startswith("application/json"):
+        body = response.json()
+        if isinstance(body, dict) and body.get("error"):
+            return Outcome(response.status_code, str(body["error"]))
+    return Outcome(response.status_code)
+
+def _pdf(data: bytes) -> dict:
+    return {"file": ("scan.pdf", data, "application/pdf")}
+
+def _is_model_text(event: dict) -> bool:
+    # Multi-page streams send a page separator before the model's first token
+    return event.get("type") == "content" and not event.get("text", "").startswith("\n\n--- Page")
+
+SCENARIOS: dict[str, Callable[[httpx.AsyncClient, Fixtures], Awaitable[Outcome]]] = {
+    "ocr_text": lambda client, f: _post_stream(client, "/api/ocr/text", _is_model_text, files=_pdf(f.scan)),
+    "ocr_text_image": lambda client, f: _post_stream(client, "/api/ocr/text", _is_model_text, files=_pdf(f.scan_page)),
+    "ocr_table": lambda client, f: _post(client, "/api/ocr/table", files=_pdf(f.scan)),
+    "ocr_table_stream": lambda client, f: _post_stream(client, "/api/ocr/table/stream", lambda e: e.get("type") == "rows", files=_pdf(f.scan)),
+    "translate": lambda client, f: _post(client, "/api/ocr/translate", files=_pdf(f.scan), data={"target_language": "Spanish"}),
+    "translate_stream": lambda client, f: _post_stream(client, "/api/ocr/translate/stream", lambda e: e.get("type") == "page",
+                                                       files=_pdf(f.scan), data={"target_language": "Spanish"}),
+    "convert_pdf_to_excel": lambda client, f: _post(client, "/api/convert/pdf-to-excel", files=_pdf(f.scan)),
+    "convert_pdf_to_text": lambda client, f: _post(client, "/api/convert/pdf-to-text", files=_pdf(f.scan)),
+    "convert_pdf_to_jpg": lambda client, f: _post(client, "/api/convert/pdf-to-jpg", files=_pdf(f.text_pdf)),
+    "convert_merge_pdf": lambda client, f: _post(client, "/api/convert/merge-pdf", files=[
+        ("files", ("a.pdf", f.text_pdf, "application/pdf")), ("files", ("b.pdf", f.scan, "application/pdf"))]),
+    "convert_text_to_pdf": lambda client, f: _post(client, "/api/convert/text-to-pdf", data={"text": "Quarterly report. " * 400}),
+}
+
+DEFAULT_MIX = "ocr_text=4,ocr_table=2,translate=1,translate_stream=1,convert_pdf_to_excel=1,convert_pdf_to_text=1,convert_merge_pdf=1,convert_text_to_pdf=1"
+
+def parse_mix(mix: str) -> dict[str, float]:
+    weights = {}
+    for item in mix.split(","):
+        name, _, weight = item.strip().partition("=")
+        if name not in SCENARIOS:
+            raise SystemExit(f"unknown scenario {name!r}, choose from: {', '.join(SCENARIOS)}")
+        weights[name] = float(weight or 1)
+    return weights
+
+# --- Server processes and RSS ---
+
+def tree_rss_mb(pid: int) -> float | None:
+    """RSS of a process and its descendants (the render pool workers), from /proc."""
+    try:
+        parents = {}
+        for entry in os.listdir("/proc"):
+            if entry.isdigit():
+                try:
+                    with open(f"/proc/{entry}/stat") as f:
+                        # The command name may contain spaces, the fields after it don't
+                        parents[int(entry)] = int(f.read().rsplit(")", 1)[1].split()[1])
+                except (OSError, IndexError, ValueError):
+                    pass
+    except OSError:
+        return None  # No /proc (macOS, Windows)
+    tree, frontier = {pid}, [pid]
+    while frontier:
+        parent = frontier.pop()
+        children = [child for child, ppid in parents.items() if ppid == parent and child not in tree]
+        tree.update(children)
+        frontier.extend(children)
+    total = 0
+    for member in tree:
+        try:
+            with open(f"/proc/{member}/status") as f:
+                total += next(int(line.split()[1]) for line in f if line.startswith("VmRSS:"))
+        except (OSError, StopIteration):
+            pass
+    return total / 1024 if total else None
+
+async def sample_rss(pid: int, samples: list[float], interval: float = 0.5) -> None:
+    while True:
+        rss = await asyncio.to_thread(tree_rss_mb, pid)
+        if rss is not None:
+            samples.append(rss)
+        await asyncio.sleep(interval)
+
+def start_servers(args, workdir: str) -> tuple[str, list[subprocess.Popen]]:
+    fake_port, app_port = free_port(), free_port()
+    fake = subprocess.Popen([
+        sys.executable, "-m", "backend.benchmarks.fake_ollama", "--port", str(fake_port),
+        "--latency", str(args.latency), "--token-latency", str(args.token_latency),
+        "--load-delay", str(args.load_delay), "--parallel", str(args.parallel),
+    ])
+    env = {
+        **os.environ,
+        "OLLAMA_BASE_URL": f"http://127.0.0.1:{fake_port}",
+        "OCR_CACHE_ENABLED": str(args.cache).lower(),
+        "TRANSLATION_MEMORY_ENABLED": str(args.cache).lower(),
+        "OCR_CACHE_DIR": os.path.join(workdir, "cache"),
+        "TRANSLATION_MEMORY_PATH": os.path.join(workdir, "cache", "translation_memory.sqlite3"),
+        "UPLOAD_DIR": os.path.join(workdir, "uploads"),
+        "OUTPUT_DIR": os.path.join(workdir, "outputs"),
+        "JOB_DIR": os.path.join(workdir, "jobs"),
+    }
+    app = subprocess.Popen([
+        sys.executable, "-m", "uvicorn", "backend.main:app", "--host", "127.0.0.1", "--port", str(app_port),
+        "--log-level", "warning", "--no-access-log",
+    ], env=env)
+    return f"http://127.0.0.1:{app_port}", [app, fake]
+
+async def wait_ready(client: httpx.AsyncClient, timeout: float = 60.0) -> None:
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            if (await client.get("/health")).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        if time.monotonic() > deadline:
+            raise SystemExit("the app did not become ready")
+        await asyncio.sleep(0.2)
+
+# --- Load ---
+
+class Sample(NamedTuple):
+    scenario: str
+    started: float  # seconds since the start of the run
+    latency: float
+    outcome: Outcome
+
+async def run_once(client, fixtures, scenario: str, planned: float, t0: float, samples: list[Sample]) -> None:
+    begin = time.perf_counter()
+    try:
+        outcome = await SCENARIOS[scenario](client, fixtures)
+    except (httpx.HTTPError, json.JSONDecodeError) as e:
+        outcome = Outcome(0, f"{type(e).__name__}: {e}")
+    if outcome.first_token is not None:
+        # Measured from the request start, shift it like the latency in open loop
+        outcome = outcome._replace(first_token=outcome.first_token + begin - planned)
+    samples.append(Sample(scenario, planned - t0, time.perf_counter() - planned, outcome))
+
+async def closed_loop(client, fixtures, mix, concurrency: int, duration: float, rng: random.Random) -> tuple[list[Sample], float]:
+    samples: list[Sample] = []
+    t0 = time.perf_counter()
+    names, weights = list(mix), list(mix.values())
+
+    async def user():
+        while time.perf_counter() - t0 < duration:
+            await run_once(client, fixtures, rng.choices(names, weights)[0], time.perf_counter(), t0, samples)
+
+    await asyncio.gather(*(user() for _ in range(concurrency)))
+    return samples, time.perf_counter() - t0
+
+async def open_loop(client, fixtures, mix, rate: float, duration: float, rng: random.Random) -> tuple[list[Sample], float]:
+    samples: list[Sample] = []
+    t0 = time.perf_counter()
+    names, weights = list(mix), list(mix.values())
+    tasks, planned = [], t0
+    while planned - t0 < duration:
+        await asyncio.sleep(max(0.0, planned - time.perf_counter()))
+        tasks.append(asyncio.create_task(run_once(client, fixtures, rng.choices(names, weights)[0], planned, t0, samples)))
+        planned += rng.expovariate(rate)
+    await asyncio.gather(*tasks)
+    return samples, time.perf_counter() - t0
+
+# --- Report ---
+
+def percentile(values: list[float], q: float) -> float | None:
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, max(0, round(q * len(values)) - 1))]
+
+def summarize(samples: list[Sample], elapsed: float) -> dict:
+    latencies = [s.latency for s in samples]
+    first_tokens = [s.outcome.first_token for s in samples if s.outcome.first_token is not None]
+    errors = [s for s in samples if s.outcome.error]
+    return {
+        "requests": len(samples),
+        "throughput_rps": round(len(samples) / elapsed, 3) if elapsed else 0.0,
+        "errors": len(errors),
+        "error_rate": round(len(errors) / len(samples), 4) if samples else 0.0,
+        "status": dict(Counter(str(s.outcome.status) for s in samples)),
+        **{f"latency_{name}_s": round(v, 4) if (v := percentile(latencies, q)) is not None else None
+           for name, q in (("p50", 0.5), ("p95", 0.95), ("p99", 0.99))},
+        "latency_max_s": round(max(latencies), 4) if latencies else None,
+        **({f"first_token_{name}_s": round(percentile(first_tokens, q), 4) for name, q in (("p50", 0.5), ("p95", 0.95), ("p99", 0.99))}
+           if first_tokens else {}),
+    }
+
+def _fmt(value) -> str:
+    return f"{value:7.2f}" if isinstance(value, (int, float)) else f"{'-':>7}"
+
+def print_report(report: dict) -> None:
+    print(f"\n{'scenario':<22} {'reqs':>5} {'req/s':>7} {'err%':>6} {'p50 s':>7} {'p95 s':>7} {'p99 s':>7} {'ttft50':>7} {'ttft95':>7}")
+    for name, row in {**report["scenarios"], "total": report["total"]}.items():
+        print(f"{name:<22} {row['requests']:>5} {row['throughput_rps']:>7.2f} {row['error_rate'] * 100:>5.1f}% "
+              f"{_fmt(row['latency_p50_s'])} {_fmt(row['latency_p95_s'])} {_fmt(row['latency_p99_s'])} "
+              f"{_fmt(row.get('first_token_p50_s'))} {_fmt(row.get('first_token_p95_s'))}")
+    print(f"\nstatus codes: {report['total']['status']}")
+    if report["errors"]:
+        print("errors (first of each kind):")
+        for message, count in report["errors"].items():
+            print(f"  {count:>4} x {message}")
+    rss = report["server_rss_mb"]
+    if rss:
+        print(f"server RSS: start {rss['start']:.0f} MB, peak {rss['peak']:.0f} MB, end {rss['end']:.0f} MB")
+
+async def main(args) -> None:
+    mix = parse_mix(args.mix)
+    rng = random.Random(args.seed)
+    fixtures = Fixtures(scanned_pdf(args.pages), scanned_pdf(1), make_pdf(args.pages))
+    workdir = tempfile.mkdtemp(prefix="docintel_load_")
+    processes = []
+    url, pid = args.url, args.server_pid
+    if not url:
+        url, processes = start_servers(args, workdir)
+        pid = processes[0].pid
+
+    timeout = httpx.Timeout(args.timeout, connect=10.0)
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=100)
+    rss: list[float] = []
+    try:
+        async with httpx.AsyncClient(base_url=url, timeout=timeout, limits=limits) as client:
+            await wait_ready(client)
+            # One request per scenario first: worker processes, imports, model "load"
+            if not args.no_warmup:
+                for name in mix:
+                    await run_once(client, fixtures, name, time.perf_counter(), time.perf_counter(), [])
+            sampler = asyncio.create_task(sample_rss(pid, rss)) if pid else None
+            mode = f"{args.rate}/s open loop" if args.rate else f"{args.concurrency} users closed loop"
+            print(f"{url}: {mode} for {args.duration:.0f} s, {args.pages}-page scans, mix {args.mix}", flush=True)
+            if args.rate:
+                samples, elapsed = await open_loop(client, fixtures, mix, args.rate, args.duration, rng)
+            else:
+                samples, elapsed = await closed_loop(client, fixtures, mix, args.concurrency, args.duration, rng)
+            if sampler:
+                sampler.cancel()
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.wait(timeout=30)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    errors = Counter(s.outcome.error.splitlines()[0][:120] for s in samples if s.outcome.error)
+    report = {
+        "config": {key: value for key, value in vars(args).items() if key != "json"},
+        "elapsed_s": round(elapsed, 3),
+        "total": summarize(samples, elapsed),
+        "scenarios": {name: summarize([s for s in samples if s.scenario == name], elapsed) for name in mix},
+        "errors": dict(errors.most_common(10)),
+        "server_rss_mb": {"start": rss[0], "peak": max(rss), "end": rss[-1]} if rss else None,
+    }
+    print_report(report)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"saved {args.json}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="app to test instead of starting one (with the fake Ollama) here")
+    parser.add_argument("--server-pid", type=int, help="pid of the --url app, to sample its RSS")
+    parser.add_argument("--concurrency", type=int, default=8, help="virtual users, closed loop")
+    parser.add_argument("--rate", type=float, help="arrivals per second instead, open loop")
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"scenario=weight list; scenarios: {', '.join(SCENARIOS)}")
+    parser.add_argument("--pages", type=int, default=3, help="pages per scanned PDF")
+    parser.add_argument("--timeout", type=float, default=300.0, help="per request, seconds")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--no-warmup", action="store_true")
+    parser.add_argument("--json", help="save the report here")
+    fake = parser.add_argument_group("fake Ollama (ignored with --url)")
+    fake.add_argument("--latency", type=float, default=0.2, help="seconds before the first token")
+    fake.add_argument("--token-latency", type=float, default=0.005, help="seconds per generated token")
+    fake.add_argument("--load-delay", type=float, default=1.0, help="seconds to load a model on first use")
+    fake.add_argument("--parallel", type=int, default=4, help="requests per model generated at once")
+    fake.add_argument("--cache", action="store_true", help="keep the OCR cache and translation memory on")
+    asyncio.run(main(parser.parse_args()))
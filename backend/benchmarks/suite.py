@@ -0,0 +1,278 @@
+"""
+Benchmark suite for the CPU-bound service paths: rendering, image preprocessing and
+encoding, Markdown table parsing and merging, Excel export, PDF assembly and
+barcode decoding. Fixtures are generated (synthetic PDFs, page images, Markdown
+tables), so runs are reproducible and comparable across commits.
+
+Results are saved as JSON (median/min/mean per case plus machine and library
+versions). With --compare, cases that got slower than the baseline by more than
+--threshold are reported and the exit code is 1. The comparison uses the fastest
+run by default: on a busy machine the median moves with the load, the minimum
+mostly with the code.
+
+Run from the project root:
+    python -m backend.benchmarks.suite                         # all cases, saves results/<commit>.json
+    python -m backend.benchmarks.suite --filter parse_tables   # a subset
+    python -m backend.benchmarks.suite --compare backend/benchmarks/results/<base>.json --threshold 0.15
+    python -m backend.benchmarks.suite --list
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import re
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from typing import Any, Callable, NamedTuple
+
+import pypdfium2 as pdfium
+from PIL import Image
+
+from backend.benchmarks.bench_chunked_translation import page as report_page
+from backend.benchmarks.bench_excel_export import make_frame
+from backend.benchmarks.bench_pdf_render_memory import make_pdf
+from backend.benchmarks.bench_table_merge import make_pages
+from backend.benchmarks.bench_table_parser import make_table
+from backend.services.barcode_service import BarcodeService
+from backend.services.conversion_service import ConversionService
+from backend.services.excel_service import dataframes_to_excel
+from backend.services.image_service import encode_image, image_to_base64, preprocess_image
+from backend.services.markdown_chunker import chunk_markdown
+from backend.services.pdf_service import render_pdf_to_images
+from backend.services.render_pool import RenderProfile, render_page
+from backend.services.table_merger import merge_tables
+from backend.services.table_parser import parse_markdown_tables
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+
+class Case(NamedTuple):
+    name: str
+    setup: Callable[[str], Any]    # builds the fixture (not timed), gets a scratch directory
+    run: Callable[[Any], Any]      # the timed call
+
+# --- Fixtures ---
+
+_fixtures: dict[str, Any] = {}
+
+def _cached(key: str, build: Callable[[], Any]) -> Any:
+    if key not in _fixtures:
+        _fixtures[key] = build()
+    return _fixtures[key]
+
+def _pdf(pages: int) -> bytes:
+    return _cached(f"pdf{pages}", lambda: make_pdf(pages))
+
+def _page_image() -> Image.Image:
+    # A letter page at 300 DPI, what preprocess and encode get before render profiles existed
+    def build():
+        pdf = pdfium.PdfDocument(_pdf(1))
+        try:
+            return render_page(pdf, 0, RenderProfile(max_px=0, max_scale=300 / 72, grayscale=False))
+        finally:
+            pdf.close()
+    return _cached("page300", build)
+
+def _write(directory: str, name: str, data: bytes) -> str:
+    path = os.path.join(directory, name)
+    with open(path, "wb") as f:
+        f.write(data)
+    return path
+
+def _render_at(dpi: int, pages: int) -> Case:
+    def setup(tmp):
+        return _pdf(pages), RenderProfile(max_px=0, max_scale=dpi / 72, grayscale=False)
+
+    def run(state):
+        pdf_bytes, profile = state
+        pdf = pdfium.PdfDocument(pdf_bytes)
+        try:
+            for index in range(len(pdf)):
+                render_page(pdf, index, profile)
+        finally:
+            pdf.close()
+
+    return Case(f"render/{pages}p@{dpi}dpi", setup, run)
+
+def _merge_pdfs_setup(tmp):
+    paths = [_write(tmp, f"part{i}.pdf", _pdf(10)) for i in range(5)]
+    return paths, os.path.join(tmp, "merged.pdf")
+
+def _images_to_pdf_setup(tmp):
+    page = _page_image().convert("L").resize((1275, 1650))
+    paths = []
+    for i in range(10):
+        path = os.path.join(tmp, f"scan{i}.jpg")
+        page.save(path, format="JPEG", quality=85)
+        paths.append(path)
+    return paths, os.path.join(tmp, "images.pdf")
+
+def _text(paragraphs: int) -> str:
+    line = "Quarterly statement line with enough words to wrap around the page width at least once. "
+    return "\n\n".join(line * 3 for _ in range(paragraphs))
+
+def _qr_png(tmp) -> bytes:
+    return BarcodeService.generate_qr("https://example.com/invoice/2024-000123")
+
+CASES = [
+    _render_at(72, 10),
+    _render_at(150, 10),
+    _render_at(300, 3),
+    Case("render/pdf_to_images_text_profile_10p", lambda tmp: _pdf(10), render_pdf_to_images),
+    Case("preprocess/300dpi_page", lambda tmp: _page_image(), preprocess_image),
+    Case("preprocess/rgba_200dpi_page", lambda tmp: _page_image().resize((1700, 2200)).convert("RGBA"), preprocess_image),
+    Case("encode/image_to_base64_300dpi", lambda tmp: _page_image(), image_to_base64),
+    Case("encode/jpeg_2048px", lambda tmp: preprocess_image(_page_image()), encode_image),
+    Case("encode/png_bilevel_2048px", lambda tmp: preprocess_image(_page_image()),
+         lambda img: encode_image(img, format="PNG", color="bilevel")),
+    Case("parse_tables/1k_rows", lambda tmp: make_table(1000), parse_markdown_tables),
+    Case("parse_tables/10k_rows_messy", lambda tmp: make_table(10000, messy=True), parse_markdown_tables),
+    Case("chunk_markdown/50_dense_pages", lambda tmp: "".join(report_page(i, 6) for i in range(50)),
+         lambda text: chunk_markdown(text, 1024)),
+    Case("merge_tables/500_pages", lambda tmp: make_pages(500, 40)[0], merge_tables),
+    Case("excel/100k_cells", lambda tmp: (make_frame(100_000), os.path.join(tmp, "out.xlsx")),
+         lambda state: dataframes_to_excel([state[0]], state[1])),
+    Case("pdf/merge_5x10_pages", _merge_pdfs_setup, lambda state: asyncio.run(ConversionService.merge_pdfs(*state))),
+    Case("pdf/images_to_pdf_10_jpegs", _images_to_pdf_setup, lambda state: asyncio.run(ConversionService.images_to_pdf(*state))),
+    Case("pdf/text_to_pdf_200_paragraphs", lambda tmp: _text(200), lambda text: asyncio.run(ConversionService.text_to_pdf(text))),
+    Case("barcode/decode_qr", _qr_png, BarcodeService.decode_qr),
+    Case("barcode/decode_barcode", _qr_png, BarcodeService.decode_barcode),
+]
+
+# --- Running and comparing ---
+
+def measure(case: Case, tmp: str, min_runs: int, max_runs: int, min_time: float) -> dict:
+    state = case.setup(tmp)
+    case.run(state)  # warm-up: imports, caches, thread pools
+    samples = []
+    started = time.perf_counter()
+    while len(samples) < max_runs and (len(samples) < min_runs or time.perf_counter() - started < min_time):
+        start = time.perf_counter()
+        case.run(state)
+        samples.append(time.perf_counter() - start)
+    return {
+        "median_ms": round(statistics.median(samples) * 1000, 4),
+        "min_ms": round(min(samples) * 1000, 4),
+        "mean_ms": round(statistics.fmean(samples) * 1000, 4),
+        "stdev_ms": round(statistics.stdev(samples) * 1000, 4) if len(samples) > 1 else 0.0,
+        "runs": len(samples),
+    }
+
+def _git_commit() -> str | None:
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=10,
+                             cwd=os.path.dirname(__file__))
+        return out.stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+def environment() -> dict:
+    from importlib.metadata import PackageNotFoundError, version
+
+    packages = {}
+    for name in ("pandas", "numpy", "pypdfium2", "Pillow", "openpyxl", "pypdf", "img2pdf", "reportlab", "opencv-python-headless"):
+        try:
+            packages[name] = version(name)
+        except PackageNotFoundError:
+            pass
+    return {
+        "commit": _git_commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "packages": packages,
+    }
+
+def regressed(current: dict, before: dict | None, threshold: float, min_delta_ms: float, stat: str) -> bool:
+    if before is None or not before[stat]:
+        return False
+    return current[stat] / before[stat] - 1 > threshold and current[stat] - before[stat] >= min_delta_ms
+
+def print_comparison(results: dict, baseline: dict, threshold: float, min_delta_ms: float, stat: str) -> None:
+    print(f"\n{'case':<40} {'baseline':>11} {'current':>11} {'change':>8}")
+    for name, current in results.items():
+        before = baseline.get(name)
+        if before is None:
+            print(f"{name:<40} {'-':>11} {current[stat]:>9.2f}ms {'new':>8}")
+            continue
+        change = current[stat] / before[stat] - 1 if before[stat] else 0.0
+        flag = "  REGRESSION" if regressed(current, before, threshold, min_delta_ms, stat) else ""
+        print(f"{name:<40} {before[stat]:>9.2f}ms {current[stat]:>9.2f}ms {change:>+7.1%}{flag}")
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--filter", help="only cases whose name matches this regular expression")
+    parser.add_argument("--list", action="store_true", help="list the cases and exit")
+    parser.add_argument("--output", help="where to save the JSON results (default: results/<commit>.json)")
+    parser.add_argument("--compare", metavar="BASELINE", help="JSON results of an earlier run to compare against")
+    parser.add_argument("--threshold", type=float, default=0.15, help="allowed slowdown, 0.15 = 15%%")
+    parser.add_argument("--stat", choices=("min", "median", "mean"), default="min", help="statistic compared")
+    parser.add_argument("--min-delta-ms", type=float, default=1.0, help="ignore slowdowns smaller than this (noise)")
+    parser.add_argument("--retries", type=int, default=2, help="times a slower case is measured again before it counts")
+    parser.add_argument("--min-runs", type=int, default=5)
+    parser.add_argument("--max-runs", type=int, default=50)
+    parser.add_argument("--min-time", type=float, default=1.0, help="seconds each case keeps repeating for")
+    args = parser.parse_args()
+
+    cases = [case for case in CASES if not args.filter or re.search(args.filter, case.name)]
+    if args.list or not cases:
+        print("\n".join(case.name for case in cases) or "no case matches")
+        return 0
+
+    baseline, stat = None, f"{args.stat}_ms"
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+
+    results = {}
+    tmp = tempfile.mkdtemp(prefix="docintel_bench_")
+    try:
+        for case in cases:
+            result = measure(case, tmp, args.min_runs, args.max_runs, args.min_time)
+            results[case.name] = result
+            print(f"{case.name:<40} median {result['median_ms']:>9.2f} ms   min {result['min_ms']:>9.2f} ms   "
+                  f"runs {result['runs']}", flush=True)
+
+        # A slow run is often the machine, not the code: measure suspects again, keep the better run
+        for _ in range(args.retries if baseline else 0):
+            suspects = [case for case in cases
+                        if regressed(results[case.name], baseline["results"].get(case.name), args.threshold, args.min_delta_ms, stat)]
+            if not suspects:
+                break
+            print(f"re-measuring {len(suspects)} slower case(s)", flush=True)
+            for case in suspects:
+                result = measure(case, tmp, args.min_runs, args.max_runs, args.min_time)
+                if result[stat] < results[case.name][stat]:
+                    results[case.name] = result
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    env = environment()
+    output = args.output or os.path.join(RESULTS_DIR, f"{env['commit'] or 'local'}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump({"environment": env, "results": results}, f, indent=2)
+    print(f"\nsaved {output}")
+
+    if baseline:
+        if baseline.get("environment", {}).get("machine") != env["machine"]:
+            print("note: the baseline was recorded on a different machine type")
+        print_comparison(results, baseline["results"], args.threshold, args.min_delta_ms, stat)
+        regressions = [name for name, result in results.items()
+                       if regressed(result, baseline["results"].get(name), args.threshold, args.min_delta_ms, stat)]
+        if regressions:
+            print(f"\n{len(regressions)} case(s) slower than the baseline by more than {args.threshold:.0%}: "
+                  + ", ".join(regressions))
+            return 1
+        print(f"\nno case slower than the baseline by more than {args.threshold:.0%}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
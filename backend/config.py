@@ -1,4 +1,5 @@
 import os
+import tempfile
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 class Settings(BaseSettings):
@@ -6,7 +7,92 @@ class Settings(BaseSettings):
     OCR_MODEL: str = "docai-ocr"
     TRANSLATION_MODEL: str = "translategemma:4b"
     PDF_DPI: int = 300
-    MAX_FILE_SIZE_MB: int = 50
+    PDF_RENDER_LOOKAHEAD: int = 2
+    RENDER_POOL_WORKERS: int = 0  # 0 = one render process per CPU core
+    RENDER_JOB_PARALLELISM: int = 2
+    TABLE_PAGE_CONCURRENCY: int = 4  # pages OCR'd at once by the table extraction endpoints
+    # Text layer fast path: pages with a usable embedded text layer skip OCR
+    TEXT_LAYER_MIN_CHARS: int = 32
+    TEXT_LAYER_MIN_COVERAGE: float = 0.02  # share of a mostly-image page that text must cover
+    # Render profiles: longest page side in pixels (PDF_DPI stays the ceiling) and color mode
+    RENDER_TEXT_MAX_PX: int = 2048
+    RENDER_TEXT_GRAYSCALE: bool = True
+    RENDER_TEXT_MIN_WIDTH_PX: int = 1024  # tall pages (receipts) are rendered at least this wide when OCR tiling is on
+    RENDER_TABLE_MAX_PX: int = 2048
+    RENDER_TABLE_GRAYSCALE: bool = True
+    RENDER_THUMBNAIL_MAX_PX: int = 1600
+    RENDER_THUMBNAIL_GRAYSCALE: bool = False
+    MAX_FILE_SIZE_MB: int = 50  # whole request body, enforced while it streams in
+    UPLOAD_DIR: str = os.path.join(tempfile.gettempdir(), "docintel_uploads")  # uploads handed to services as files
+    # Generated documents are written here and stay downloadable (resumable) for a while
+    OUTPUT_DIR: str = os.path.join(tempfile.gettempdir(), "docintel_outputs")
+    OUTPUT_RETENTION_MINUTES: int = 30
+
+    # How page images are encoded for the model: JPEG, PNG or WEBP; color is auto, gray or bilevel
+    IMAGE_ENCODE_FORMAT: str = "JPEG"
+    IMAGE_ENCODE_QUALITY: int = 95
+    IMAGE_ENCODE_COLOR: str = "auto"
+
+    # Shared HTTP connection pool towards Ollama
+    OLLAMA_CONNECT_TIMEOUT: float = 10.0
+    OLLAMA_READ_TIMEOUT: float = 300.0
+    OLLAMA_MAX_CONNECTIONS: int = 20
+    OLLAMA_MAX_KEEPALIVE_CONNECTIONS: int = 10
+    OLLAMA_KEEPALIVE_EXPIRY: float = 30.0
+
+    # Global model scheduler: concurrent calls per model and queue depth before 429
+    OLLAMA_MAX_CONCURRENCY: int = 4
+    OLLAMA_MODEL_CONCURRENCY: dict[str, int] = {}  # per-model overrides, e.g. {"docai-ocr": 2}
+    OLLAMA_MAX_QUEUE: int = 200
+
+    # OCR result cache (in-memory LRU backed by SQLite on disk)
+    OCR_CACHE_ENABLED: bool = True
+    OCR_CACHE_DIR: str = os.path.join(tempfile.gettempdir(), "docintel_cache")
+    OCR_CACHE_MEMORY_ITEMS: int = 256
+    OCR_CACHE_DISK_MAX_MB: int = 512
+    OCR_CACHE_TTL_SECONDS: int = 7 * 24 * 3600
+
+    # Segment-level translation memory
+    TRANSLATION_MEMORY_ENABLED: bool = True
+    TRANSLATION_MEMORY_PATH: str = os.path.join(tempfile.gettempdir(), "docintel_cache", "translation_memory.sqlite3")
+    TRANSLATION_MEMORY_MAX_ENTRIES: int = 200_000
+    TRANSLATION_BATCH_SEGMENTS: int = 40
+    TRANSLATE_PIPELINE_DEPTH: int = 2  # OCR results allowed to wait for the translation stage
+    # Longer texts are cut between Markdown blocks, and batched segments are capped at it too,
+    # so prompt and reply fit the translation model's num_ctx
+    TRANSLATION_CHUNK_TOKENS: int = 1024
+    TRANSLATION_CHUNK_CONCURRENCY: int = 4  # chunks of one text translated at once
+
+    # Tiled OCR: pages taller than OCR_TILE_TRIGGER_PX (once fitted to OCR_TILE_MAX_PX wide)
+    # are OCR'd as overlapping horizontal bands instead of being shrunk to fit the model
+    OCR_TILING_ENABLED: bool = True
+    OCR_TILE_MAX_PX: int = 2048  # band width, the model's input sweet spot
+    OCR_TILE_TRIGGER_PX: int = 2560
+    OCR_TILE_BAND_PX: int = 1536  # band height; smaller bands mean less text per call (num_ctx)
+    OCR_TILE_OVERLAP_PX: int = 128  # a few lines of text, so no line is only ever seen cut in half
+    OCR_TILE_CONCURRENCY: int = 4  # bands of one page OCR'd at once
+    OCR_TILE_MAX_HEIGHT_PX: int = 32768  # longer images are scaled down to this
+
+    # Pre-OCR page filter: near-blank pages are skipped, near-duplicates reuse an earlier page's OCR
+    PAGE_FILTER_ENABLED: bool = True
+    PAGE_BLANK_MAX_INK: float = 0.0001  # share of the page covered by ink: specks and a lone page number, not a word
+    PAGE_BLANK_MAX_STD: float = 4.0  # gray level spread, keeps faint but busy pages
+    PAGE_DUPLICATE_MAX_SIGNATURE_DISTANCE: float = 0.15  # coarse hash match that makes a page a candidate
+    PAGE_DUPLICATE_MAX_CANDIDATES: int = 3  # candidates verified with the aligned comparison
+    PAGE_DUPLICATE_MAX_DIFFERENCE: float = 10.0  # worst 16x16 block difference after alignment
+    PAGE_DUPLICATE_WINDOW: int = 50  # distinct pages per document kept to compare against
+
+    # Asynchronous jobs: durable state, per-page outputs and results live under JOB_DIR
+    JOB_DIR: str = os.path.join(tempfile.gettempdir(), "docintel_jobs")
+    JOB_MAX_RUNNING: int = 2
+    JOB_PAGE_CONCURRENCY: int = 4
+    JOB_RETENTION_HOURS: int = 24
+
+    # Batch endpoint: documents processed at once, pages of the whole batch at the model at once
+    BATCH_DOCUMENT_CONCURRENCY: int = 2
+    BATCH_PAGE_CONCURRENCY: int = 4
+    BATCH_MAX_DOCUMENTS: int = 5000
+    BATCH_MAX_UPLOAD_MB: int = 2048  # whole request body of /api/batch (every member still obeys MAX_FILE_SIZE_MB)
 
     model_config = SettingsConfigDict(env_file=".env", extra="ignore")
 
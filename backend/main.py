@@ -7,30 +7,71 @@ root_dir = Path(__file__).resolve().parent.parent
 if str(root_dir) not in sys.path:
     sys.path.append(str(root_dir))
 
-from fastapi import FastAPI, Request, HTTPException
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
-from backend.routers import ocr, translate, table, conversion
+from backend.routers import ocr, translate, table, conversion, jobs, downloads, batch
+from backend.services.ollama_client import ollama_client
+from backend.services.ocr_cache import ocr_cache
+from backend.services.translation_memory import translation_memory
+from backend.services.render_pool import render_pool
+from backend.services.job_service import job_runner
+from backend.services.model_scheduler import SchedulerOverloaded, set_request_context
+from backend.utils.uploads import UploadLimitMiddleware, clear_upload_dir
+from backend.utils.outputs import purge_outputs
+from backend.utils.metrics import MetricsMiddleware, metrics
 from backend.config import settings
 import uvicorn
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Uploads orphaned by a crash of the last run
+    clear_upload_dir()
+    purge_outputs(force=True)
+    # One pooled keep-alive HTTP client towards Ollama for the lifetime of the app
+    await ollama_client.start()
+    # PDF rasterization runs in worker processes, away from the event loop
+    render_pool.start()
+    # Resume background jobs that were interrupted by the last shutdown
+    await job_runner.start()
+    try:
+        yield
+    finally:
+        await job_runner.shutdown()
+        await ollama_client.close()
+        ocr_cache.close()
+        translation_memory.close()
+        render_pool.shutdown()
+
 app = FastAPI(
     title="DocIntel — Document Intelligence Platform",
     description="Enterprise-grade API for high-fidelity OCR, massive table extraction, and layout-preserving translation. Supports 20+ document intelligence services.",
-    version="2.0.0"
+    version="2.0.0",
+    lifespan=lifespan
 )
 
-# File size limit middleware (50MB)
+# File size limit middleware (50MB), counts the body as it arrives
 MAX_FILE_SIZE = settings.MAX_FILE_SIZE_MB * 1024 * 1024
+# Registered first so it sits innermost: the body parser calls its receive directly,
+# not through a BaseHTTPMiddleware task group that would wrap the 413
+app.add_middleware(UploadLimitMiddleware, max_bytes=MAX_FILE_SIZE,
+                   path_limits={"/api/batch": settings.BATCH_MAX_UPLOAD_MB * 1024 * 1024})
 
 @app.middleware("http")
-async def file_size_limit(request: Request, call_next):
-    if request.method == "POST":
-        content_length = request.headers.get("content-length")
-        if content_length:
-            if int(content_length) > MAX_FILE_SIZE:
-                raise HTTPException(status_code=413, detail=f"File too large. Maximum size is {settings.MAX_FILE_SIZE_MB}MB")
-    response = await call_next(request)
-    return response
+async def model_request_context(request: Request, call_next):
+    # Model calls are queued fairly per tenant, then per request
+    tenant = request.headers.get("x-tenant-id") or (request.client.host if request.client else "default")
+    set_request_context(tenant)
+    return await call_next(request)
+
+@app.exception_handler(SchedulerOverloaded)
+async def scheduler_overloaded_handler(request: Request, exc: SchedulerOverloaded):
+    return JSONResponse(
+        status_code=429,
+        content={"detail": str(exc)},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
 
 # CORS Middleware
 # Allow all origins for development convenience
@@ -42,15 +83,25 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Outermost, so request timings include every other middleware and streamed bodies
+app.add_middleware(MetricsMiddleware)
+
 # Register Routers
 app.include_router(ocr.router)
 app.include_router(translate.router)
 app.include_router(table.router)
 app.include_router(conversion.router)
+app.include_router(jobs.router)
+app.include_router(downloads.router)
+app.include_router(batch.router)
 
 @app.get("/health")
 async def health_check():
     return {"status": "ok", "model": settings.OCR_MODEL}
 
+@app.get("/metrics", include_in_schema=False)
+async def prometheus_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
 if __name__ == "__main__":
     uvicorn.run("backend.main:app", host="0.0.0.0", port=8000, reload=True)
@@ -0,0 +1,51 @@
+from contextlib import aclosing
+from typing import List
+from fastapi import APIRouter, UploadFile, File, Form, HTTPException
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
+from backend.services.batch_service import BatchProcessor, BATCH_OPERATIONS
+from backend.services.model_scheduler import set_priority, BULK
+from backend.utils.uploads import save_upload, remove_upload
+import json
+
+router = APIRouter(prefix="/api/batch", tags=["Batch"])
+
+@router.post("")
+async def process_batch(
+    files: List[UploadFile] = File(...),
+    operation: str = Form("text"),
+):
+    """
+    Runs OCR ("text") or table extraction ("table") over many documents: PDFs, JPG/PNG
+    images and ZIP archives of them, read member by member. Streams one JSON line per
+    document as it finishes (in completion order), then a "done" line with the URL of
+    a ZIP holding every output (.txt or .xlsx) and a manifest.json.
+    """
+    if operation not in BATCH_OPERATIONS:
+        raise HTTPException(status_code=400, detail=f"Unknown operation. Supported: {', '.join(BATCH_OPERATIONS)}")
+    set_priority(BULK)
+
+    # The uploads outlive this handler, they are removed once the stream is finished
+    uploads = []
+    try:
+        for file in files:
+            uploads.append((file.filename or "document", file.content_type, await save_upload(file)))
+    except BaseException:
+        for _, _, path in uploads:
+            remove_upload(path)
+        raise
+    processor = BatchProcessor(operation)
+
+    async def event_generator():
+        try:
+            async with aclosing(processor.run(uploads)) as results:
+                async for result in results:
+                    yield json.dumps(result) + "\n"
+        except Exception as e:
+            yield json.dumps({"type": "error", "message": f"Batch failed: {str(e)}"}) + "\n"
+
+    def cleanup():
+        for _, _, path in uploads:
+            remove_upload(path)
+
+    return StreamingResponse(event_generator(), media_type="application/x-ndjson", background=BackgroundTask(cleanup))
@@ -4,56 +4,77 @@ from fastapi.responses import Response, JSONResponse
 from typing import List
 import io
 
-from backend.services.conversion_service import ConversionService
+from backend.services.conversion_service import ConversionService, TEXT_MODES
 from backend.services.barcode_service import BarcodeService
 from backend.services.office_service import OfficeService
 # Reuse existing services where possible
 from backend.services.ollama_client import ollama_client 
-from backend.services.pdf_service import render_pdf_to_images
-from backend.services.image_service import image_to_base64, preprocess_image
+from backend.services.pdf_service import aiter_pdf_pages, render_pdf_page, TABLE
+from backend.services.page_classifier import PageFilter
+from backend.services.tiled_ocr import tiled_ocr
+from backend.services.image_service import encode_image, preprocess_image
 from backend.services.translation_service import PdfTranslatorService
+from backend.services.table_service import TableService, CONVERT_TABLE_PROMPT
+from backend.services.model_scheduler import SchedulerOverloaded, set_priority, BULK
+from backend.utils.concurrency import map_ordered
+from backend.utils.uploads import upload_path, upload_paths, upload_buffer
+from backend.utils.outputs import output_file, file_response
+from backend.config import settings
 from PIL import Image
+from contextlib import aclosing
 
 router = APIRouter(prefix="/api/convert", tags=["Conversion"])
 
+DOCX_MEDIA_TYPE = "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+XLSX_MEDIA_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
 # --- GROUP 1: Document Conversion ---
 
 @router.post("/images-to-pdf")
 async def images_to_pdf(files: List[UploadFile] = File(...)):
-    image_bytes_list = []
     for file in files:
         if not file.content_type.startswith("image/"):
             raise HTTPException(400, "All files must be images")
-        content = await file.read()
-        image_bytes_list.append(content)
         
-    pdf_bytes = await ConversionService.images_to_pdf(image_bytes_list)
-    return Response(content=pdf_bytes, media_type="application/pdf", headers={"Content-Disposition": "attachment; filename=converted.pdf"})
+    with output_file("converted.pdf") as output:
+        async with upload_paths(files) as paths:
+            await ConversionService.images_to_pdf(paths, output)
+    return file_response(output, "application/pdf")
 
 @router.post("/text-to-pdf")
 async def text_to_pdf(text: str = Form(...)):
     pdf_bytes = await ConversionService.text_to_pdf(text)
     return Response(content=pdf_bytes, media_type="application/pdf", headers={"Content-Disposition": "attachment; filename=converted.pdf"})
 
+def _check_text_mode(mode: str) -> None:
+    if mode not in TEXT_MODES:
+        raise HTTPException(400, f"mode must be one of: {', '.join(TEXT_MODES)}")
+
 @router.post("/pdf-to-text")
-async def pdf_to_text(file: UploadFile = File(...)):
+async def pdf_to_text(file: UploadFile = File(...), mode: str = Form("auto")):
+    set_priority(BULK)
     if file.content_type != "application/pdf":
         raise HTTPException(400, "File must be PDF")
-    content = await file.read()
-    text = await ConversionService.pdf_to_text(content)
-    return JSONResponse({"text": text})
+    _check_text_mode(mode)
+    # Pages with a usable text layer are read directly, only scanned pages go through OCR
+    async with upload_path(file) as path:
+        pages = await ConversionService.pdf_to_text_pages(path, mode)
+    return JSONResponse({
+        "text": ConversionService.join_pages([page["text"] for page in pages]),
+        "pages": [{key: value for key, value in page.items() if key != "text"} for page in pages],
+        "sources": ConversionService.count_sources(pages),
+    })
 
 @router.post("/merge-pdf")
 async def merge_pdf(files: List[UploadFile] = File(...)):
-    pdf_bytes_list = []
     for file in files:
         if file.content_type != "application/pdf":
             raise HTTPException(400, "All files must be PDF")
-        content = await file.read()
-        pdf_bytes_list.append(content)
         
-    merged_pdf = await ConversionService.merge_pdfs(pdf_bytes_list)
-    return Response(content=merged_pdf, media_type="application/pdf", headers={"Content-Disposition": "attachment; filename=merged.pdf"})
+    with output_file("merged.pdf") as output:
+        async with upload_paths(files) as paths:
+            await ConversionService.merge_pdfs(paths, output)
+    return file_response(output, "application/pdf")
 
 @router.post("/html-to-pdf")
 async def html_to_pdf(file: UploadFile = File(...)):
@@ -67,16 +88,17 @@ async def html_to_pdf(file: UploadFile = File(...)):
 
 @router.post("/text-to-word")
 async def text_to_word(text: str = Form(...)):
-    docx_bytes = await OfficeService.convert_text_to_word(text)
-    return Response(content=docx_bytes, media_type="application/vnd.openxmlformats-officedocument.wordprocessingml.document", headers={"Content-Disposition": "attachment; filename=converted.docx"})
+    with output_file("converted.docx") as output:
+        await OfficeService.convert_text_to_word(text, output)
+    return file_response(output, DOCX_MEDIA_TYPE)
 
 @router.post("/word-to-pdf")
 async def word_to_pdf(file: UploadFile = File(...)):
      if "wordprocessingml" not in file.content_type and not file.filename.endswith(".docx"):
          raise HTTPException(400, "File must be .docx")
-     content = await file.read()
      try:
-         pdf_bytes = await OfficeService.convert_word_to_pdf(content)
+         async with upload_path(file) as path:
+             pdf_bytes = await OfficeService.convert_word_to_pdf(path)
          return Response(content=pdf_bytes, media_type="application/pdf", headers={"Content-Disposition": "attachment; filename=converted.pdf"})
      except Exception as e:
          raise HTTPException(500, str(e))
@@ -84,28 +106,32 @@ async def word_to_pdf(file: UploadFile = File(...)):
 @router.post("/jpg-to-word")
 async def jpg_to_word(file: UploadFile = File(...)):
     # Reuse OCR logic: Image -> Text -> Word
-    content = await file.read()
     # 1. Base64 encode
     # 2. Ollama OCR
     # 3. Text output -> Docx
     # Since we can't easily call other routers, we replicate logic or move logic to service in future refactor.
     # For now, let's just do a quick OCR -> Text implementation here for MVP.
-    image = Image.open(io.BytesIO(content)).convert("RGB")
-    # Resize if needed
-    b64 = image_to_base64(image)
-    text = await ollama_client.ocr_image(b64)
+    image = Image.open(file.file).convert("RGB")
+    # Long images (receipts, screenshots) are OCR'd in bands
+    text = await tiled_ocr(image, lambda band: ollama_client.ocr_image(encode_image(band)))
     
-    docx_bytes = await OfficeService.convert_text_to_word(text)
-    return Response(content=docx_bytes, media_type="application/vnd.openxmlformats-officedocument.wordprocessingml.document", headers={"Content-Disposition": "attachment; filename=ocr_converted.docx"})
+    with output_file("ocr_converted.docx") as output:
+        await OfficeService.convert_text_to_word(text, output)
+    return file_response(output, DOCX_MEDIA_TYPE)
 
 @router.post("/pdf-to-word")
-async def pdf_to_word(file: UploadFile = File(...)):
-    # PDF -> Text -> Word (Simple version)
-    # Advanced version would be PDF -> Images -> OCR -> Word OR PDF -> Text extraction -> Word
-    content = await file.read()
-    text = await ConversionService.pdf_to_text(content)
-    docx_bytes = await OfficeService.convert_text_to_word(text)
-    return Response(content=docx_bytes, media_type="application/vnd.openxmlformats-officedocument.wordprocessingml.document", headers={"Content-Disposition": "attachment; filename=converted.docx"})
+async def pdf_to_word(file: UploadFile = File(...), mode: str = Form("auto")):
+    set_priority(BULK)
+    _check_text_mode(mode)
+    # PDF -> Text (text layer, or OCR for scanned pages) -> Word
+    async with upload_path(file) as path:
+        pages = await ConversionService.pdf_to_text_pages(path, mode)
+    text = ConversionService.join_pages([page["text"] for page in pages])
+    with output_file("converted.docx") as output:
+        await OfficeService.convert_text_to_word(text, output)
+    return file_response(output, DOCX_MEDIA_TYPE, headers={
+        "X-Page-Sources": ConversionService.summarize_sources(pages),
+    })
 
 # --- GROUP 3: Image Tools & Barcodes ---
 
@@ -113,8 +139,7 @@ async def pdf_to_word(file: UploadFile = File(...)):
 
 @router.post("/invert-image")
 async def invert_image(file: UploadFile = File(...)):
-    content = await file.read()
-    inverted_bytes = BarcodeService.invert_image(content)
+    inverted_bytes = BarcodeService.invert_image(file.file)
     return Response(content=inverted_bytes, media_type="image/png")
 
 @router.post("/text-to-image")
@@ -148,17 +173,17 @@ async def text_to_image(text: str = Form(...)):
 @router.post("/image-translator")
 async def image_translator(file: UploadFile = File(...), target_language: str = Form("English")):
     # Reuse Translate logic: Image -> OCR -> Translate
-    content = await file.read()
-    image = Image.open(io.BytesIO(content))
+    image = Image.open(file.file)
     img = preprocess_image(image)
-    b64 = image_to_base64(img)
+    encoded = encode_image(img)
     
-    original_text = await ollama_client.ocr_image(b64, prompt="Extract the text from this image.")
-    translated_text = await ollama_client.translate_text(original_text, target_language)
+    original_text = await ollama_client.ocr_image(encoded, prompt="Extract the text from this image.")
+    translated_text, memory_stats = await ollama_client.translate_markdown(original_text, target_language)
     
     return JSONResponse({
         "original_text": original_text,
-        "translated_text": translated_text
+        "translated_text": translated_text,
+        "translation_memory": memory_stats
     })
 
 @router.post("/qr-generator")
@@ -168,23 +193,23 @@ async def qr_generator(text: str = Form(...)):
 
 @router.post("/qr-scanner")
 async def qr_scanner(file: UploadFile = File(...)):
-    content = await file.read()
-    result = BarcodeService.decode_qr(content)
+    with upload_buffer(file) as buffer:
+        result = BarcodeService.decode_qr(buffer)
     return JSONResponse({"text": result})
 
 @router.post("/barcode-scanner")
 async def barcode_scanner(file: UploadFile = File(...)):
-    content = await file.read()
-    result = BarcodeService.decode_barcode(content)
+    with upload_buffer(file) as buffer:
+        result = BarcodeService.decode_barcode(buffer)
     return JSONResponse({"text": result})
 
 # --- Pdf To Jpg (Reuse existing pdf_service logic) ---
 @router.post("/pdf-to-jpg")
 async def pdf_to_jpg(file: UploadFile = File(...)):
-    content = await file.read()
-    images = render_pdf_to_images(content)
+    # Only the first page is needed, don't render the rest
+    async with upload_path(file) as path:
+        img = await render_pdf_page(path, 0)
     
-    img = images[0]
     buffer = io.BytesIO()
     img.save(buffer, format="JPEG")
     buffer.seek(0)
@@ -196,14 +221,13 @@ async def word_to_jpg(file: UploadFile = File(...)):
     if "wordprocessingml" not in file.content_type and not file.filename.endswith(".docx"):
          raise HTTPException(400, "File must be .docx")
     
-    content = await file.read()
     try:
         # 1. Word -> PDF
-        pdf_bytes = await OfficeService.convert_word_to_pdf(content)
-        # 2. PDF -> Images
-        images = render_pdf_to_images(pdf_bytes)
+        async with upload_path(file) as path:
+            pdf_bytes = await OfficeService.convert_word_to_pdf(path)
+        # 2. PDF -> first page image
+        img = await render_pdf_page(pdf_bytes, 0)
         # 3. Image -> JPG
-        img = images[0]
         buffer = io.BytesIO()
         img.save(buffer, format="JPEG")
         buffer.seek(0)
@@ -213,74 +237,102 @@ async def word_to_jpg(file: UploadFile = File(...)):
 
 # --- Excel Tools ---
 
+async def _ocr_table_page(img: Image.Image) -> str:
+    return await TableService.extract_page_markdown(img, CONVERT_TABLE_PROMPT, preprocess=True)
+
+def _record_page_failure(failed_pages: list[int], index: int, error: Exception) -> None:
+    # Overload is not a page problem, the client should retry the whole request
+    if isinstance(error, SchedulerOverloaded):
+        raise error
+    failed_pages.append(index + 1)
+
+def _failed_pages_header(failed_pages: list[int]) -> dict:
+    """Pages that could not be processed are reported instead of failing the document."""
+    return {"X-Failed-Pages": ",".join(map(str, failed_pages))} if failed_pages else {}
+
 @router.post("/jpg-to-excel")
 async def jpg_to_excel(file: UploadFile = File(...)):
     # Image -> OCR (Table) -> Excel
-    from backend.services.table_parser import parse_markdown_tables
-    from backend.services.excel_service import dataframes_to_excel
+    image = Image.open(file.file)
     
-    content = await file.read()
-    image = Image.open(io.BytesIO(content))
-    img = preprocess_image(image)
-    b64 = image_to_base64(img)
-    
-    markdown = await ollama_client.ocr_image(b64, prompt="Extract the table from this image as a Markdown table.")
-    tables = parse_markdown_tables(markdown)
+    markdown = await TableService.extract_page_markdown(image, CONVERT_TABLE_PROMPT, preprocess=True)
+    tables = TableService.tables_from_markdown([markdown])
     
     if not tables:
         raise HTTPException(400, "No tables found in image.")
         
-    excel_bytes = dataframes_to_excel(tables)
-    return Response(content=excel_bytes, media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", headers={"Content-Disposition": "attachment; filename=converted.xlsx"})
+    with output_file("converted.xlsx") as output:
+        TableService.build_workbook(tables, output)
+    return file_response(output, XLSX_MEDIA_TYPE)
 
 @router.post("/pdf-to-excel")
 async def pdf_to_excel(file: UploadFile = File(...)):
+    set_priority(BULK)
     # PDF -> Images -> OCR (Table) -> Excel
-    from backend.services.table_parser import parse_markdown_tables
-    from backend.services.excel_service import dataframes_to_excel
-    
-    content = await file.read()
-    images = render_pdf_to_images(content)
-    
-    all_tables = []
-    for img in images:
-        b64 = image_to_base64(preprocess_image(img))
-        markdown = await ollama_client.ocr_image(b64, prompt="Extract the table from this image as a Markdown table.")
-        tables = parse_markdown_tables(markdown)
-        all_tables.extend(tables)
-        
+    markdown_by_page = {}
+    failed_pages = []
+    page_filter = PageFilter()
+    # Pages are OCR'd concurrently, results come back in page order
+    async with upload_path(file) as path:
+        async with aclosing(aiter_pdf_pages(path, profile=TABLE)) as pages:
+            async with aclosing(page_filter.distinct(pages)) as distinct:
+                async with aclosing(map_ordered(distinct, _ocr_table_page, settings.TABLE_PAGE_CONCURRENCY)) as results:
+                    async for i, markdown, error in results:
+                        if error is not None:
+                            _record_page_failure(failed_pages, i, error)
+                            continue
+                        markdown_by_page[i] = markdown
+
+    # Repeated pages get their original's tables, blank pages have none
+    markdown_pages = [markdown for _, markdown in sorted(page_filter.fan_out(markdown_by_page).items())]
+    if not markdown_pages and failed_pages:
+        raise HTTPException(502, "Table extraction failed on every page.")
+    all_tables = TableService.tables_from_markdown(markdown_pages)
     if not all_tables:
         raise HTTPException(400, "No tables found in PDF.")
         
-    excel_bytes = dataframes_to_excel(all_tables)
-    return Response(content=excel_bytes, media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", headers={"Content-Disposition": "attachment; filename=converted.xlsx"})
+    with output_file("converted.xlsx") as output:
+        TableService.build_workbook(all_tables, output)
+    return file_response(output, XLSX_MEDIA_TYPE, headers={
+        "X-Page-Filter": page_filter.summary(),
+        **_failed_pages_header(failed_pages),
+    })
 
 @router.post("/pdf-to-csv")
 async def pdf_to_csv(file: UploadFile = File(...)):
+    set_priority(BULK)
     # PDF -> Excel logic -> CSV (first table only or zip?)
     # For MVP, return first table as CSV
-    from backend.services.table_parser import parse_markdown_tables
-    import pandas as pd
-    
-    content = await file.read()
-    images = render_pdf_to_images(content)
     
     # Process first page only for speed/MVP or all?
-    # Let's do first page that has a table
+    # Let's do first page that has a table, pages after it are never rendered
+    # Pages are OCR'd a few at a time; once a table turns up, the pages still in flight are cancelled
+    # Blank pages and repeats of a page already searched can't hold the first table, they are skipped
     found_df = None
-    for img in images:
-        b64 = image_to_base64(preprocess_image(img))
-        markdown = await ollama_client.ocr_image(b64, prompt="Extract the table from this image as a Markdown table.")
-        tables = parse_markdown_tables(markdown)
-        if tables:
-            found_df = tables[0]
-            break
-            
+    failed_pages = []
+    page_filter = PageFilter()
+    async with upload_path(file) as path:
+        async with aclosing(aiter_pdf_pages(path, profile=TABLE)) as pages:
+            async with aclosing(page_filter.distinct(pages)) as distinct:
+                async with aclosing(map_ordered(distinct, _ocr_table_page, settings.TABLE_PAGE_CONCURRENCY)) as results:
+                    async for i, markdown, error in results:
+                        if error is not None:
+                            _record_page_failure(failed_pages, i, error)
+                            continue
+                        tables = TableService.tables_from_markdown([markdown])
+                        if tables:
+                            found_df = tables[0]
+                            break
+
     if found_df is None:
         raise HTTPException(400, "No tables found in PDF.")
         
     csv_str = found_df.to_csv(index=False)
-    return Response(content=csv_str, media_type="text/csv", headers={"Content-Disposition": "attachment; filename=converted.csv"})
+    return Response(content=csv_str, media_type="text/csv", headers={
+        "Content-Disposition": "attachment; filename=converted.csv",
+        "X-Page-Filter": page_filter.summary(),
+        **_failed_pages_header(failed_pages),
+    })
 
 @router.post("/excel-to-jpg")
 async def excel_to_jpg(file: UploadFile = File(...)):
@@ -288,10 +340,9 @@ async def excel_to_jpg(file: UploadFile = File(...)):
     # Complex chain but robust given libraries
     import pandas as pd
     
-    content = await file.read()
     try:
-        # Load Excel using pandas (requires openpyxl)
-        excel_data = pd.read_excel(io.BytesIO(content), sheet_name=None)
+        # Load Excel using pandas (requires openpyxl), straight from the spooled upload
+        excel_data = pd.read_excel(file.file, sheet_name=None)
         
         # Take first sheet
         first_sheet_name = list(excel_data.keys())[0]
@@ -304,8 +355,7 @@ async def excel_to_jpg(file: UploadFile = File(...)):
         pdf_bytes = await ConversionService.html_to_pdf(html_str)
         
         # PDF -> JPG
-        images = render_pdf_to_images(pdf_bytes)
-        img = images[0]
+        img = await render_pdf_page(pdf_bytes, 0)
         
         buffer = io.BytesIO()
         img.save(buffer, format="JPEG")
@@ -316,10 +366,13 @@ async def excel_to_jpg(file: UploadFile = File(...)):
         raise HTTPException(500, f"Conversion failed: {str(e)}")
 
 @router.post("/pdf-to-html")
-async def pdf_to_html(file: UploadFile = File(...)):
+async def pdf_to_html(file: UploadFile = File(...), mode: str = Form("auto")):
+    set_priority(BULK)
+    _check_text_mode(mode)
     # PDF -> Text -> HTML (Basic)
-    content = await file.read()
-    text = await ConversionService.pdf_to_text(content)
+    async with upload_path(file) as path:
+        pages = await ConversionService.pdf_to_text_pages(path, mode)
+    text = ConversionService.join_pages([page["text"] for page in pages])
     
     # Simple HTML wrapper
     html = f"""
@@ -333,18 +386,31 @@ async def pdf_to_html(file: UploadFile = File(...)):
     </body>
     </html>
     """
-    return Response(content=html, media_type="text/html", headers={"Content-Disposition": "attachment; filename=converted.html"})
+    return Response(content=html, media_type="text/html", headers={
+        "Content-Disposition": "attachment; filename=converted.html",
+        "X-Page-Sources": ConversionService.summarize_sources(pages),
+    })
 
 @router.post("/pdf-translator")
 async def pdf_translator(file: UploadFile = File(...), target_language: str = Form("Spanish")):
+    set_priority(BULK)
     # PDF -> Images -> Layout Analysis -> Translate -> Reconstruct PDF
     if file.content_type != "application/pdf":
         raise HTTPException(400, "File must be PDF")
         
-    content = await file.read()
     try:
-        pdf_bytes = await PdfTranslatorService.translate_pdf(content, target_language)
-        return Response(content=pdf_bytes, media_type="application/pdf", headers={"Content-Disposition": "attachment; filename=translated.pdf"})
+        page_filter = PageFilter()
+        with output_file("translated.pdf") as output:
+            async with upload_path(file) as path:
+                memory_stats = await PdfTranslatorService.translate_pdf(path, output, target_language, page_filter)
+        return file_response(output, "application/pdf", headers={
+            "X-Page-Filter": page_filter.summary(),
+            "X-Translation-Memory-Hits": str(memory_stats["hits"]),
+            "X-Translation-Memory-Segments": str(memory_stats["segments"]),
+            "X-Translation-Memory-Hit-Rate": str(memory_stats["hit_rate"]),
+        })
+    except SchedulerOverloaded:
+        raise
     except Exception as e:
         import traceback
         traceback.print_exc()
@@ -0,0 +1,17 @@
+from fastapi import APIRouter, HTTPException
+from backend.utils.outputs import output_path, file_response
+import mimetypes
+
+router = APIRouter(prefix="/api/downloads", tags=["Downloads"])
+
+@router.get("/{token}/{filename}")
+async def download_output(token: str, filename: str):
+    """
+    Re-downloads a generated document (the Content-Location of the original response)
+    while it is retained. Supports Range requests, so interrupted downloads can resume.
+    """
+    path = output_path(token, filename)
+    if path is None:
+        raise HTTPException(status_code=404, detail="File not found or expired")
+    media_type = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+    return file_response(path, media_type)
@@ -0,0 +1,106 @@
+from fastapi import APIRouter, UploadFile, File, Form, HTTPException
+from fastapi.responses import FileResponse
+from backend.services.job_service import job_runner, OPERATIONS
+from backend.services.job_store import job_store, COMPLETED
+from backend.services.model_scheduler import get_tenant
+from backend.utils.uploads import upload_path
+import os
+
+router = APIRouter(prefix="/api/jobs", tags=["Jobs"])
+
+def _job_view(job: dict) -> dict:
+    total = len(job["pages"])
+    return {
+        "job_id": job["id"],
+        "operation": job["operation"],
+        "status": job["status"],
+        "params": job["params"],
+        "progress": {
+            "total_pages": total,
+            "completed_pages": job["completed"],
+            "percent": round(100 * job["completed"] / total, 1) if total else 100.0,
+        },
+        "error": job["error"],
+        "result": job["result"],
+        "result_url": f"/api/jobs/{job['id']}/result" if job["status"] == COMPLETED else None,
+        "created_at": job["created"],
+        "updated_at": job["updated"],
+    }
+
+async def _get_job(job_id: str) -> dict:
+    job = await job_store.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@router.post("", status_code=202)
+async def create_job(
+    file: UploadFile = File(...),
+    operation: str = Form(...),
+    target_language: str | None = Form(None),
+    pages: str = Form(""),
+):
+    """
+    Queues a long-running operation and returns its job id right away.
+    Poll GET /api/jobs/{job_id} for progress and fetch the output from /result.
+    `pages` optionally limits PDFs to a 1-based range such as "1-10,15".
+    """
+    job_operation = OPERATIONS.get(operation)
+    if job_operation is None:
+        raise HTTPException(status_code=400, detail=f"Unknown operation. Supported: {', '.join(OPERATIONS)}")
+    if file.content_type not in job_operation.content_types:
+        raise HTTPException(status_code=400, detail=f"Invalid file type for '{operation}'.")
+
+    supplied = {"target_language": target_language}
+    params = {}
+    for name, default in job_operation.params.items():
+        value = supplied.get(name) or default
+        if value is None:
+            raise HTTPException(status_code=400, detail=f"'{name}' is required for '{operation}'.")
+        params[name] = value
+
+    # The job takes the uploaded file over; whatever is left is removed on the way out
+    async with upload_path(file) as path:
+        try:
+            job = await job_runner.submit(path, file.content_type, operation, params, get_tenant(), pages)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    return _job_view(job)
+
+@router.get("/{job_id}")
+async def get_job(job_id: str):
+    """Status, progress and (once completed) the JSON result of a job."""
+    return _job_view(await _get_job(job_id))
+
+@router.get("/{job_id}/pages")
+async def get_job_pages(job_id: str):
+    """Per-page progress, including the stored output of every page already processed."""
+    job = await _get_job(job_id)
+    outputs = await job_store.page_outputs(job_id)
+    return {
+        "job_id": job_id,
+        "status": job["status"],
+        "pages": [
+            {"page": index + 1, "status": "completed", "output": outputs[index]} if index in outputs
+            else {"page": index + 1, "status": "pending"}
+            for index in job["pages"]
+        ],
+    }
+
+@router.get("/{job_id}/result")
+async def get_job_result(job_id: str):
+    """The produced file (Excel, PDF) or, for text operations, the JSON result."""
+    job = await _get_job(job_id)
+    if job["status"] != COMPLETED:
+        raise HTTPException(status_code=409, detail=f"Job is {job['status']}")
+    if job["result_file"] and os.path.exists(job["result_file"]):
+        return FileResponse(job["result_file"], filename=job["result_name"], media_type=job["media_type"])
+    return job["result"]
+
+@router.post("/{job_id}/cancel")
+async def cancel_job(job_id: str):
+    """Stops a queued or running job. Finished jobs are returned unchanged."""
+    job = await job_runner.cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return _job_view(job)
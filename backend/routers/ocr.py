@@ -1,14 +1,21 @@
 from fastapi import APIRouter, UploadFile, File, HTTPException
 from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
 from backend.services.ollama_client import ollama_client
-from backend.services.image_service import preprocess_image, image_to_base64
-from backend.services.pdf_service import render_pdf_to_images
-from PIL import Image
-import io
+from backend.services.ocr_cache import ocr_cache
+from backend.services.model_scheduler import model_scheduler, set_priority, BULK
+from backend.services.image_service import encode_image
+from backend.services.pdf_service import aiter_document_pages, count_document_pages
+from backend.services.page_classifier import PageFilter, BLANK, DUPLICATE, DISTINCT
+from backend.services.tiled_ocr import aiter_tiled_ocr, needs_tiling
+from backend.utils.uploads import save_upload, remove_upload
+from contextlib import aclosing
 import json
 
 router = APIRouter(prefix="/api/ocr", tags=["OCR"])
 
+OCR_TEXT_PROMPT = "Transcribe the text in this image. Use Markdown to denote headers (**), lists (-), and bold elements. Do not describe the layout."
+
 @router.post("/text")
 async def ocr_text(file: UploadFile = File(...)):
     """
@@ -18,35 +25,75 @@ async def ocr_text(file: UploadFile = File(...)):
     if file.content_type not in ["image/jpeg", "image/png", "application/pdf"]:
         raise HTTPException(status_code=400, detail="Invalid file type. Only JPG, PNG, and PDF are supported.")
 
-    images = []
-    content = await file.read()
-
     if file.content_type == "application/pdf":
-        images = render_pdf_to_images(content)
-    else:
-        image = Image.open(io.BytesIO(content))
-        images = [preprocess_image(image)]
+        # Multi-page documents queue behind single-image requests
+        set_priority(BULK)
+
+    # The upload outlives this handler, it is removed once the stream is finished
+    path = await save_upload(file)
+    try:
+        # Pages are rendered lazily while streaming, only the count is needed up front
+        total = await count_document_pages(path, file.content_type)
+    except BaseException:
+        remove_upload(path)
+        raise
 
     async def event_generator():
+        page_filter = PageFilter()
+        texts = {}  # OCR'd pages, for the duplicates that repeat them
         try:
-            for i, img in enumerate(images):
-                # Send page header for multi-page docs
-                if len(images) > 1:
-                    yield json.dumps({"type": "progress", "page": i + 1, "total": len(images)}) + "\n"
-                    yield json.dumps({"type": "content", "text": f"\n\n--- Page {i + 1} ---\n\n"}) + "\n"
-
-                base64_img = image_to_base64(img)
-                
-                # Stream the OCR result for this page
-                try:
-                    async for token in ollama_client.ocr_image_stream(base64_img, prompt="Transcribe the text in this image. Use Markdown to denote headers (**), lists (-), and bold elements. Do not describe the layout."):
-                        yield json.dumps({"type": "content", "text": token}) + "\n"
-                except Exception as e:
-                    yield json.dumps({"type": "error", "message": f"OCR failed on page {i + 1}: {str(e)}"}) + "\n"
-                    return
+            async with aclosing(aiter_document_pages(path, file.content_type)) as pages:
+                async for i, img in pages:
+                    kind = await page_filter.aclassify(i, img)
+                    # Send page header for multi-page docs
+                    if total > 1:
+                        progress = {"type": "progress", "page": i + 1, "total": total}
+                        if kind != DISTINCT:
+                            progress["skipped"] = kind
+                        yield json.dumps(progress) + "\n"
+                        yield json.dumps({"type": "content", "text": f"\n\n--- Page {i + 1} ---\n\n"}) + "\n"
+
+                    # Blank pages have nothing to stream, duplicates repeat their original's text
+                    if kind == BLANK:
+                        continue
+                    if kind == DUPLICATE:
+                        yield json.dumps({"type": "content", "text": texts[page_filter.original(i)]}) + "\n"
+                        continue
+
+                    # Stream the OCR result for this page; tall pages are OCR'd in concurrent
+                    # bands and streamed band by band as the stitched text becomes final
+                    if needs_tiling(img.size):
+                        text_stream = aiter_tiled_ocr(img, lambda band: ollama_client.ocr_image(encode_image(band), prompt=OCR_TEXT_PROMPT))
+                    else:
+                        text_stream = ollama_client.ocr_image_stream(encode_image(img), prompt=OCR_TEXT_PROMPT)
+                    tokens = []
+                    try:
+                        async with aclosing(text_stream) as stream:
+                            async for token in stream:
+                                tokens.append(token)
+                                yield json.dumps({"type": "content", "text": token}) + "\n"
+                    except Exception as e:
+                        yield json.dumps({"type": "error", "message": f"OCR failed on page {i + 1}: {str(e)}"}) + "\n"
+                        return
+                    texts[i] = "".join(tokens)
             
-            yield json.dumps({"type": "done"}) + "\n"
+            yield json.dumps({"type": "done", "page_filter": page_filter.stats()}) + "\n"
         except Exception as e:
             yield json.dumps({"type": "error", "message": f"Processing failed: {str(e)}"}) + "\n"
 
-    return StreamingResponse(event_generator(), media_type="text/event-stream")
+    return StreamingResponse(event_generator(), media_type="text/event-stream", background=BackgroundTask(remove_upload, path))
+
+@router.get("/cache/stats")
+async def cache_stats():
+    """Hit/miss counters and sizes of the OCR result cache."""
+    return ocr_cache.stats()
+
+@router.get("/scheduler/stats")
+async def scheduler_stats():
+    """Concurrency, queue depth and wait times of the model scheduler, per model."""
+    return model_scheduler.stats()
+
+@router.get("/payload/stats")
+async def payload_stats():
+    """Request and encoded image sizes sent to the model server."""
+    return ollama_client.payload_stats()
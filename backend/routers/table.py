@@ -1,13 +1,15 @@
 from fastapi import APIRouter, UploadFile, File, HTTPException, BackgroundTasks
-from fastapi.responses import FileResponse, JSONResponse
-from backend.services.ollama_client import ollama_client
-from backend.services.image_service import preprocess_image, image_to_base64
-from backend.services.pdf_service import render_pdf_to_images
-from backend.services.table_parser import parse_markdown_tables
-from backend.services.table_merger import merge_tables
-from backend.services.excel_service import dataframes_to_excel
-from PIL import Image
-import io
+from fastapi.responses import FileResponse, JSONResponse, StreamingResponse
+from starlette.background import BackgroundTask
+from backend.services.pdf_service import aiter_document_pages, count_document_pages, TABLE
+from backend.services.page_classifier import PageFilter
+from contextlib import aclosing
+from backend.services.table_service import TableService, TableStreamer
+from backend.services.model_scheduler import SchedulerOverloaded, set_priority, BULK
+from backend.utils.concurrency import map_ordered
+from backend.utils.uploads import upload_path, save_upload, remove_upload
+from backend.config import settings
+import json
 import uuid
 import os
 import tempfile
@@ -27,59 +29,97 @@ async def extract_table(file: UploadFile = File(...)):
     """
     if file.content_type not in ["image/jpeg", "image/png", "application/pdf"]:
         raise HTTPException(status_code=400, detail="Invalid file type.")
-
-    images = []
-    content = await file.read()
-
     if file.content_type == "application/pdf":
-        images = render_pdf_to_images(content)
-    else:
-        images = [preprocess_image(Image.open(io.BytesIO(content)))]
+        set_priority(BULK)
 
-    all_tables = []
-    
-    # Process each page
-    for img in images:
-        base64_img = image_to_base64(img)
-        # Prompt specifically for Markdown table output
-        markdown_response = await ollama_client.ocr_image(
-            base64_img,
-            prompt="Extract the table from this image. Output strictly as a Markdown table. Do not include any other text."
-        )
-        
-        page_tables = parse_markdown_tables(markdown_response)
-        all_tables.extend(page_tables)
-
-    if not all_tables:
-        return {"message": "No tables found", "preview_data": []}
-
-    # Consolidated logic for table merging (if multiple tables found)
-    # merged_tables = merge_tables(all_tables) 
-    # For now, let's keep them separate or use the merger if they look like continuations
-    # To keep it simple for the MVP, we'll try to merge indiscriminately if they match headers
-    final_tables = merge_tables(all_tables)
-
-    # Generate Excel
-    excel_bytes = dataframes_to_excel(final_tables)
+    markdown_by_page = {}
+    errors = {}
+    page_filter = PageFilter()
     
-    # Save to temp file
+    # Pages are OCR'd concurrently but collected in page order, so continued tables still merge.
+    # Blank pages are skipped and repeated pages get the result of the page they repeat
+    async with upload_path(file) as path:
+        async with aclosing(aiter_document_pages(path, file.content_type, profile=TABLE)) as pages:
+            async with aclosing(page_filter.distinct(pages)) as distinct:
+                async with aclosing(map_ordered(distinct, TableService.extract_page_markdown, settings.TABLE_PAGE_CONCURRENCY)) as results:
+                    async for i, markdown, error in results:
+                        if error is not None:
+                            if isinstance(error, SchedulerOverloaded):
+                                raise error
+                            errors[i] = str(error)
+                            continue
+                        markdown_by_page[i] = markdown
+
+    page_numbers = [i + 1 for i in sorted(page_filter.fan_out(markdown_by_page))]
+    markdown_pages = [markdown_by_page[page - 1] for page in page_numbers]
+    failed_pages = [{"page": i + 1, "error": error} for i, error in sorted(page_filter.fan_out(errors).items())]
+
+    if not markdown_pages and failed_pages:
+        raise HTTPException(status_code=502, detail={"message": "Table extraction failed on every page", "failed_pages": failed_pages})
+
+    # Tables continued across pages are merged when their headers and column types match
+    final_tables, merges = TableService.merge_page_tables(markdown_pages, page_numbers)
+    return _result(final_tables, merges, failed_pages, page_filter)
+
+def _result(final_tables: list, merges: list[dict], failed_pages: list[dict], page_filter: PageFilter) -> dict:
+    if not final_tables:
+        return {"message": "No tables found", "preview_data": [], "failed_pages": failed_pages, "page_filter": page_filter.stats()}
+
+    # Generate Excel straight into the temp file
     filename = f"{uuid.uuid4()}.xlsx"
     filepath = os.path.join(TEMP_DIR, filename)
-    with open(filepath, "wb") as f:
-        f.write(excel_bytes)
-    
-    # Prepare preview (limit to first 5 rows of first table)
-    preview = []
-    if final_tables:
-        preview = final_tables[0].head(5).to_dict(orient="records")
+    preview = TableService.build_workbook(final_tables, filepath)
 
     return {
         "message": "Tables extracted successfully",
         "download_url": f"/api/ocr/download/{filename}",
         "preview_data": preview,
-        "total_tables": len(final_tables)
+        "total_tables": len(final_tables),
+        "merges": merges,
+        "failed_pages": failed_pages,
+        "page_filter": page_filter.stats()
     }
 
+@router.post("/table/stream")
+async def extract_table_stream(file: UploadFile = File(...)):
+    """
+    Same as /table, but streams JSON lines while the document is processed: the rows of
+    each table as the model generates them, one line per page (in page order) with the
+    merge decision for each of its tables, then "done" with the /table response.
+    """
+    if file.content_type not in ["image/jpeg", "image/png", "application/pdf"]:
+        raise HTTPException(status_code=400, detail="Invalid file type.")
+    if file.content_type == "application/pdf":
+        set_priority(BULK)
+
+    # The upload outlives this handler, it is removed once the stream is finished
+    path = await save_upload(file)
+    try:
+        total = await count_document_pages(path, file.content_type)
+    except BaseException:
+        remove_upload(path)
+        raise
+
+    async def event_generator():
+        streamer = TableStreamer(PageFilter())
+        try:
+            async with aclosing(aiter_document_pages(path, file.content_type, profile=TABLE)) as pages:
+                async with aclosing(streamer.run(pages)) as events:
+                    async for event in events:
+                        if event["type"] == "page":
+                            event["total"] = total
+                        yield json.dumps(event) + "\n"
+
+            if not streamer.extracted_pages and streamer.failed_pages:
+                yield json.dumps({"type": "error", "message": "Table extraction failed on every page", "failed_pages": streamer.failed_pages}) + "\n"
+                return
+            result = await asyncio.to_thread(_result, streamer.merged(), streamer.merger.decisions, streamer.failed_pages, streamer.page_filter)
+            yield json.dumps({"type": "done", **result}, default=str) + "\n"
+        except Exception as e:
+            yield json.dumps({"type": "error", "message": f"Table extraction failed: {str(e)}"}) + "\n"
+
+    return StreamingResponse(event_generator(), media_type="text/event-stream", background=BackgroundTask(remove_upload, path))
+
 @router.get("/download/{filename}")
 async def download_file(filename: str, background_tasks: BackgroundTasks):
     filepath = os.path.join(TEMP_DIR, filename)
@@ -1,10 +1,15 @@
 from fastapi import APIRouter, UploadFile, File, Form, HTTPException
-from backend.services.ollama_client import ollama_client
-from backend.services.image_service import preprocess_image, image_to_base64
-from backend.services.pdf_service import render_pdf_to_images
-from PIL import Image
-import io
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
+from backend.services.translation_service import DocumentTranslationService
+from backend.services.pdf_service import aiter_document_pages, count_document_pages
+from backend.services.page_classifier import PageFilter
+from contextlib import aclosing
+from backend.services.translation_memory import merge_stats
+from backend.services.model_scheduler import set_priority, BULK
+from backend.utils.uploads import upload_path, save_upload, remove_upload
 from pydantic import BaseModel
+import json
 
 router = APIRouter(prefix="/api/ocr", tags=["Translation"])
 
@@ -13,6 +18,12 @@ class TranslationResponse(BaseModel):
     translated_text: str
     page: int
 
+def _check_upload(file: UploadFile) -> None:
+    if file.content_type not in ["image/jpeg", "image/png", "application/pdf"]:
+        raise HTTPException(status_code=400, detail="Invalid file type.")
+    if file.content_type == "application/pdf":
+        set_priority(BULK)
+
 @router.post("/translate")
 async def translate_document(
     file: UploadFile = File(...),
@@ -21,35 +32,53 @@ async def translate_document(
     """
     Extracts text from image/PDF and translates it to target language.
     """
-    if file.content_type not in ["image/jpeg", "image/png", "application/pdf"]:
-        raise HTTPException(status_code=400, detail="Invalid file type.")
-
-    images = []
-    content = await file.read()
-
-    if file.content_type == "application/pdf":
-        images = render_pdf_to_images(content)
-    else:
-        images = [preprocess_image(Image.open(io.BytesIO(content)))]
+    _check_upload(file)
 
     results = []
+    page_filter = PageFilter()
     
-    # Process sequentially to avoid OOM
-    for i, img in enumerate(images):
-        # Stage 1: Local OCR
-        base64_img = image_to_base64(img)
-        original_text = await ollama_client.ocr_image(
-            base64_img, 
-            prompt="Extract the text from this image exactly as it appears. Maintain all Markdown formatting. Do not translate."
-        )
-        
-        # Stage 2: Translation
-        translated_text = await ollama_client.translate_text(original_text, target_language)
-        
-        results.append({
-            "page": i + 1,
-            "original_text": original_text,
-            "translated_text": translated_text
-        })
-
-    return {"pages": results}
+    # OCR of the next page overlaps translation of the current one, pages are rendered on demand
+    async with upload_path(file) as path:
+        async with aclosing(aiter_document_pages(path, file.content_type)) as pages:
+            async with aclosing(DocumentTranslationService.aiter_translated_pages(pages, target_language, page_filter=page_filter)) as translated:
+                async for page in translated:
+                    results.append(page)
+
+    return {
+        "pages": results,
+        "translation_memory": merge_stats([r["translation_memory"] for r in results]),
+        "page_filter": page_filter.stats(),
+    }
+
+@router.post("/translate/stream")
+async def translate_document_stream(
+    file: UploadFile = File(...),
+    target_language: str = Form(...)
+):
+    """
+    Same as /translate, but streams one JSON line per page (in page order)
+    as soon as that page is translated.
+    """
+    _check_upload(file)
+    # The upload outlives this handler, it is removed once the stream is finished
+    path = await save_upload(file)
+    try:
+        total = await count_document_pages(path, file.content_type)
+    except BaseException:
+        remove_upload(path)
+        raise
+
+    async def event_generator():
+        stats = []
+        page_filter = PageFilter()
+        try:
+            async with aclosing(aiter_document_pages(path, file.content_type)) as pages:
+                async with aclosing(DocumentTranslationService.aiter_translated_pages(pages, target_language, page_filter=page_filter)) as translated:
+                    async for page in translated:
+                        stats.append(page["translation_memory"])
+                        yield json.dumps({"type": "page", "total": total, **page}) + "\n"
+            yield json.dumps({"type": "done", "translation_memory": merge_stats(stats), "page_filter": page_filter.stats()}) + "\n"
+        except Exception as e:
+            yield json.dumps({"type": "error", "message": f"Translation failed: {str(e)}"}) + "\n"
+
+    return StreamingResponse(event_generator(), media_type="text/event-stream", background=BackgroundTask(remove_upload, path))
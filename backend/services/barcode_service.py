@@ -3,6 +3,7 @@ import qrcode
 import cv2
 import numpy as np
 import io
+from typing import BinaryIO
 from PIL import Image
 
 class BarcodeService:
@@ -26,7 +27,7 @@ class BarcodeService:
         return buffer.getvalue()
 
     @staticmethod
-    def decode_qr(image_bytes: bytes) -> str:
+    def decode_qr(image_bytes: bytes | memoryview) -> str:
         """Decode a QR code from an image."""
         # Convert bytes to numpy array for cv2
         nparr = np.frombuffer(image_bytes, np.uint8)
@@ -40,7 +41,7 @@ class BarcodeService:
         return "No QR code detected"
 
     @staticmethod
-    def decode_barcode(image_bytes: bytes) -> str:
+    def decode_barcode(image_bytes: bytes | memoryview) -> str:
         """Decode a 1D barcode from an image using OpenCV."""
         nparr = np.frombuffer(image_bytes, np.uint8)
         img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
@@ -48,8 +49,12 @@ class BarcodeService:
         # Try OpenCV's barcode detector (available in opencv-contrib or newer builds)
         try:
             barcode_detector = cv2.barcode.BarcodeDetector()
-            retval, decoded_info, decoded_type, points = barcode_detector.detectAndDecode(img)
-            if retval and decoded_info:
+            # OpenCV 4.x returns (retval, infos, types, points), 5.x (info, type, points)
+            result = barcode_detector.detectAndDecode(img)
+            decoded_info = result[1] if len(result) == 4 else result[0]
+            if isinstance(decoded_info, str):
+                decoded_info = [decoded_info]
+            if decoded_info:
                 results = [d for d in decoded_info if d]
                 if results:
                     return results[0]
@@ -65,9 +70,9 @@ class BarcodeService:
         return "No barcode detected"
 
     @staticmethod
-    def invert_image(image_bytes: bytes) -> bytes:
+    def invert_image(image_file: BinaryIO) -> bytes:
         """Invert image colors."""
-        image = Image.open(io.BytesIO(image_bytes))
+        image = Image.open(image_file)
         
         # Handle alpha channel (transparency)
         if image.mode == 'RGBA':
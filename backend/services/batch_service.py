@@ -0,0 +1,269 @@
+import asyncio
+import json
+import os
+import re
+import shutil
+import tempfile
+import zipfile
+from contextlib import aclosing
+from typing import AsyncIterator, Awaitable, Callable
+from PIL import Image
+from backend.config import settings
+from backend.services.conversion_service import ConversionService
+from backend.services.model_scheduler import SchedulerOverloaded
+from backend.services.page_classifier import PageFilter
+from backend.services.pdf_service import aiter_document_pages, TABLE
+from backend.services.table_service import TableService
+from backend.services.tiled_ocr import tiled_ocr
+from backend.utils.concurrency import map_ordered
+from backend.utils.outputs import new_output
+from backend.utils.uploads import remove_upload
+
+BATCH_OPERATIONS = ("text", "table")
+DOCUMENT_TYPES = {".pdf": "application/pdf", ".jpg": "image/jpeg", ".jpeg": "image/jpeg", ".png": "image/png"}
+ARCHIVE_TYPES = ("application/zip", "application/x-zip-compressed")
+RESULT_NAME = "batch_results.zip"
+
+_UNSAFE = re.compile(r"[^\w.-]+")
+
+class BatchDocument:
+    """
+    One document of a batch. `open()` returns a file path the caller removes afterwards;
+    archive members are only extracted then, so a ZIP is read member by member.
+    """
+
+    def __init__(self, index: int, name: str, content_type: str | None, open: Callable[[], Awaitable[str]] | None, error: str | None = None):
+        self.index = index
+        self.name = name
+        self.content_type = content_type
+        self.open = open
+        self.error = error  # Set for documents that are skipped
+
+def _extract_member(archive: zipfile.ZipFile, info: zipfile.ZipInfo) -> str:
+    os.makedirs(settings.UPLOAD_DIR, exist_ok=True)
+    fd, path = tempfile.mkstemp(suffix=os.path.splitext(info.filename)[1].lower()[:16], prefix="batch_", dir=settings.UPLOAD_DIR)
+    try:
+        with os.fdopen(fd, "wb") as out, archive.open(info) as member:
+            while chunk := member.read(1024 * 1024):
+                out.write(chunk)
+    except BaseException:
+        remove_upload(path)
+        raise
+    return path
+
+def _member_document(index: int, archive: zipfile.ZipFile, info: zipfile.ZipInfo) -> BatchDocument:
+    content_type = DOCUMENT_TYPES.get(os.path.splitext(info.filename)[1].lower())
+    max_bytes = settings.MAX_FILE_SIZE_MB * 1024 * 1024
+    if content_type is None:
+        return BatchDocument(index, info.filename, None, None, "Unsupported file type. Only PDF, JPG and PNG are processed.")
+    if info.file_size > max_bytes:
+        return BatchDocument(index, info.filename, content_type, None, f"File too large. Maximum size is {settings.MAX_FILE_SIZE_MB}MB")
+    return BatchDocument(index, info.filename, content_type, lambda: asyncio.to_thread(_extract_member, archive, info))
+
+def _is_listed(info: zipfile.ZipInfo) -> bool:
+    # Folders and the resource forks macOS adds to archives aren't documents
+    name = info.filename
+    return not info.is_dir() and not name.startswith("__MACOSX/") and not os.path.basename(name).startswith(".")
+
+async def _saved(path: str) -> str:
+    return path
+
+class BatchProcessor:
+    """
+    Runs one batch: up to BATCH_DOCUMENT_CONCURRENCY documents at a time, and at most
+    BATCH_PAGE_CONCURRENCY pages of the whole batch at the model. Every finished
+    document's output is added to the result ZIP straight away. The ZIP is built under
+    UPLOAD_DIR and only becomes a downloadable output once the batch is done.
+    """
+
+    def __init__(self, operation: str):
+        if operation not in BATCH_OPERATIONS:
+            raise ValueError(f"Unknown operation '{operation}', expected one of: {', '.join(BATCH_OPERATIONS)}")
+        self.operation = operation
+        self.pages = asyncio.Semaphore(max(settings.BATCH_PAGE_CONCURRENCY, 1))
+        os.makedirs(settings.UPLOAD_DIR, exist_ok=True)
+        fd, self.archive_path = tempfile.mkstemp(suffix=".zip", prefix="batch_", dir=settings.UPLOAD_DIR)
+        os.close(fd)
+        self.archive = zipfile.ZipFile(self.archive_path, "w", zipfile.ZIP_DEFLATED)
+        self.archive_lock = asyncio.Lock()
+        self.manifest: list[dict] = []
+        # Input archives stay open until every document extracted from them is done
+        self.sources: list[zipfile.ZipFile] = []
+
+    async def documents(self, uploads: list[tuple[str, str, str]]) -> AsyncIterator[BatchDocument]:
+        """
+        Expands saved uploads, (name, content_type, path), into the documents of the batch:
+        PDFs and images as they are, ZIP archives member by member (only the central
+        directory is read up front). At most BATCH_MAX_DOCUMENTS are yielded.
+        """
+        index = 0
+        for name, content_type, path in uploads:
+            if content_type in ARCHIVE_TYPES or name.lower().endswith(".zip"):
+                try:
+                    archive = await asyncio.to_thread(zipfile.ZipFile, path)
+                except zipfile.BadZipFile:
+                    index += 1
+                    yield BatchDocument(index, name, None, None, "Not a valid ZIP archive.")
+                    continue
+                self.sources.append(archive)
+                members = [info for info in archive.infolist() if _is_listed(info)]
+            else:
+                members = [None]
+            for info in members:
+                if index >= settings.BATCH_MAX_DOCUMENTS:
+                    return
+                index += 1
+                if info is not None:
+                    yield _member_document(index, archive, info)
+                elif content_type in DOCUMENT_TYPES.values():
+                    # Saved by the router already, handed over as is
+                    yield BatchDocument(index, name, content_type, lambda path=path: _saved(path))
+                else:
+                    yield BatchDocument(index, name, None, None, "Unsupported file type. Only PDF, JPG, PNG and ZIP are accepted.")
+
+    async def _page(self, step: Callable[[Image.Image], Awaitable[str]], img: Image.Image) -> str:
+        # Batches are bulk work: when the model queue is full, wait instead of failing the page
+        async with self.pages:
+            while True:
+                try:
+                    return await step(img)
+                except SchedulerOverloaded as e:
+                    await asyncio.sleep(e.retry_after)
+
+    async def _add_output(self, arcname: str, text: str | None = None, path: str | None = None) -> None:
+        async with self.archive_lock:
+            if path is not None:
+                await asyncio.to_thread(self.archive.write, path, arcname)
+            else:
+                await asyncio.to_thread(self.archive.writestr, arcname, text)
+
+    def _arcname(self, document: BatchDocument, extension: str) -> str:
+        stem = _UNSAFE.sub("_", os.path.splitext(os.path.basename(document.name))[0]).strip("._") or "document"
+        return f"{document.index:04d}_{stem[:80]}{extension}"
+
+    async def _text(self, document: BatchDocument, path: str) -> dict:
+        # Tall pages are OCR'd in bands, every band takes its own model slot
+        ocr_page = lambda img: tiled_ocr(img, lambda band: self._page(ConversionService.ocr_image_text, band))
+        if document.content_type == "application/pdf":
+            # Pages with a usable text layer are read directly, like /api/convert/pdf-to-text
+            pages = await ConversionService.pdf_to_text_pages(path, "auto", ocr_page=ocr_page)
+        else:
+            pages = []
+            async with aclosing(aiter_document_pages(path, document.content_type)) as images:
+                async for index, img in images:
+                    pages.append({"page": index + 1, "source": "ocr", "text": await ocr_page(img)})
+        text = ConversionService.join_pages([page["text"] for page in pages])
+        output = self._arcname(document, ".txt")
+        await self._add_output(output, text=text)
+        return {"pages": len(pages), "sources": ConversionService.summarize_sources(pages), "output": output, "text": text}
+
+    async def _table(self, document: BatchDocument, path: str) -> dict:
+        markdown_by_page, errors = {}, {}
+        page_filter = PageFilter()
+        step = lambda img: self._page(TableService.extract_page_markdown, img)
+        async with aclosing(aiter_document_pages(path, document.content_type, profile=TABLE)) as images:
+            async with aclosing(page_filter.distinct(images)) as distinct:
+                async with aclosing(map_ordered(distinct, step, settings.BATCH_PAGE_CONCURRENCY)) as results:
+                    async for i, markdown, error in results:
+                        if error is not None:
+                            errors[i] = str(error)
+                            continue
+                        markdown_by_page[i] = markdown
+        # Blank pages are skipped, repeated pages get the result of the page they repeat
+        page_numbers = [i + 1 for i in sorted(page_filter.fan_out(markdown_by_page))]
+        markdown_pages = [markdown_by_page[page - 1] for page in page_numbers]
+        failed_pages = [{"page": i + 1, "error": error} for i, error in sorted(page_filter.fan_out(errors).items())]
+        if not markdown_pages and failed_pages:
+            raise RuntimeError(f"Table extraction failed on every page: {failed_pages[0]['error']}")
+
+        def build() -> dict:
+            tables, _ = TableService.merge_page_tables(markdown_pages, page_numbers)
+            if not tables:
+                return {"total_tables": 0, "output": None}
+            os.makedirs(settings.UPLOAD_DIR, exist_ok=True)
+            fd, xlsx = tempfile.mkstemp(suffix=".xlsx", prefix="batch_", dir=settings.UPLOAD_DIR)
+            os.close(fd)
+            TableService.build_workbook(tables, xlsx)
+            return {"total_tables": len(tables), "output": xlsx}
+
+        built = await asyncio.to_thread(build)
+        result = {"pages": page_filter.pages, "total_tables": built["total_tables"], "output": None,
+                  "failed_pages": failed_pages, "page_filter": page_filter.stats()}
+        if built["output"] is not None:
+            result["output"] = self._arcname(document, ".xlsx")
+            try:
+                await self._add_output(result["output"], path=built["output"])
+            finally:
+                remove_upload(built["output"])
+        return result
+
+    async def process(self, document: BatchDocument) -> dict:
+        """Processes one document; failures are reported in the result, not raised."""
+        result = {"type": "document", "index": document.index, "name": document.name}
+        if document.error is not None:
+            result.update(status="skipped", error=document.error)
+        else:
+            path = None
+            try:
+                path = await document.open()
+                handler = self._text if self.operation == "text" else self._table
+                result.update(status="completed", **await handler(document, path))
+            except Exception as e:
+                result.update(status="failed", error=str(e) or type(e).__name__)
+            finally:
+                if path is not None:
+                    remove_upload(path)
+        self.manifest.append({key: value for key, value in result.items() if key not in ("type", "text")})
+        return result
+
+    async def run(self, uploads: list[tuple[str, str, str]]) -> AsyncIterator[dict]:
+        """
+        Yields a result per document as each one finishes (not in input order), then a
+        "done" summary with the URL of the result ZIP. The next document is only taken
+        from the uploads (and extracted) when a slot is free.
+        """
+        documents = self.documents(uploads)
+        pending: set[asyncio.Task] = set()
+        exhausted = False
+        concurrency = max(settings.BATCH_DOCUMENT_CONCURRENCY, 1)
+        counts = {"completed": 0, "failed": 0, "skipped": 0}
+        try:
+            while True:
+                while not exhausted and len(pending) < concurrency:
+                    try:
+                        document = await anext(documents)
+                    except StopAsyncIteration:
+                        exhausted = True
+                        break
+                    pending.add(asyncio.create_task(self.process(document)))
+                if not pending:
+                    break
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    result = task.result()
+                    counts[result["status"]] += 1
+                    yield result
+
+            async with self.archive_lock:
+                await asyncio.to_thread(self._close_archive)
+            # The output's retention starts now, not when the batch started
+            result_path = new_output(RESULT_NAME)
+            await asyncio.to_thread(shutil.move, self.archive_path, result_path)
+            token = os.path.basename(os.path.dirname(result_path))
+            yield {"type": "done", "documents": sum(counts.values()), **counts,
+                   "result_url": f"/api/downloads/{token}/{RESULT_NAME}"}
+        except BaseException:
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+            self.archive.close()
+            remove_upload(self.archive_path)
+            raise
+        finally:
+            await documents.aclose()
+            for archive in self.sources:
+                archive.close()
+
+    def _close_archive(self) -> None:
+        self.archive.writestr("manifest.json", json.dumps({"operation": self.operation, "documents": self.manifest}, indent=2))
+        self.archive.close()
@@ -1,4 +1,5 @@
 
+import asyncio
 import io
 import img2pdf
 from PIL import Image
@@ -6,15 +7,24 @@ from pypdf import PdfReader, PdfWriter
 from reportlab.pdfgen import canvas
 from reportlab.lib.pagesizes import letter
 from xhtml2pdf import pisa
-import asyncio
-from backend.services.pdf_service import render_pdf_to_images
+from contextlib import aclosing
+from typing import Awaitable, Callable
+from backend.services.pdf_service import aiter_pdf_pages, analyze_pdf_text, count_pdf_pages, pdf_path
+from backend.services.page_classifier import PageFilter
+from backend.services.tiled_ocr import tiled_ocr
+from backend.utils.concurrency import map_ordered
 from backend.services.ollama_client import ollama_client
-from backend.services.image_service import image_to_base64, preprocess_image
+from backend.services.image_service import encode_image, preprocess_image
+
+# Text extraction modes: text layer where usable / OCR only / text layer only
+TEXT_MODES = ("auto", "ocr", "text")
+# Where a page's text came from, see pdf_to_text_pages()
+PAGE_SOURCES = ("text", "ocr", "blank", "duplicate")
 
 class ConversionService:
     @staticmethod
-    async def images_to_pdf(image_files: list[bytes]) -> bytes:
-        """Convert a list of image bytes to a single PDF."""
+    async def images_to_pdf(image_files: list[str], output: str) -> None:
+        """Convert a list of image files (paths) to a single PDF written to `output`."""
         # img2pdf requires direct bytes or file paths. 
         # It handles JPEG/PNG metrics better than PIL for PDF generation.
         # However, for consistency and stripping alpha channels if needed, PIL is safer intermediate
@@ -23,8 +33,12 @@ class ConversionService:
         # Actually, let's just use img2pdf for everything if possible, or PIL.
         # PIL convert('RGB') is robust.
         
-        pdf_bytes = img2pdf.convert(image_files)
-        return pdf_bytes
+        # img2pdf reads the files itself, JPEGs are embedded without re-encoding
+        def convert():
+            with open(output, "wb") as f:
+                img2pdf.convert(image_files, outputstream=f)
+
+        await asyncio.to_thread(convert)
 
     @staticmethod
     async def text_to_pdf(text: str) -> bytes:
@@ -51,54 +65,108 @@ class ConversionService:
         return buffer.getvalue()
 
     @staticmethod
-    async def pdf_to_text(pdf_bytes: bytes) -> str:
+    async def ocr_page_text(img: Image.Image) -> str:
+        """OCRs one rendered page to Markdown-formatted text, pages too tall for one call in bands."""
+        return await tiled_ocr(img, ConversionService.ocr_image_text)
+
+    @staticmethod
+    async def ocr_image_text(img: Image.Image) -> str:
+        """One OCR call for a page, or a band of one."""
+        # Preprocess and encode
+        processed_img = preprocess_image(img)
+        encoded = encode_image(processed_img)
+        # We use a specific prompt for pure text extraction
+        return await ollama_client.ocr_image(
+            encoded, 
+            prompt="Extract the text content from this page. Return raw text with Markdown formatting for structure. Do not include commentary."
+        )
+
+    @staticmethod
+    def join_pages(page_texts: list[str]) -> str:
+        return "\n\n--- Page Break ---\n\n".join(page_texts)
+
+    @staticmethod
+    async def pdf_to_text_pages(source: bytes | str, mode: str = "auto", ocr_page: Callable[[Image.Image], Awaitable[str]] | None = None) -> list[dict]:
         """
-        Extract text from PDF using High-Fidelity OCR.
-        Renders pages to images and uses the configured OCR model.
+        Extracts the text of every page, as [{"page", "source", "text"}] in page order.
+        mode "auto" reads pages with a usable embedded text layer directly and OCRs only
+        the scanned ones, "text" never OCRs, "ocr" always renders and OCRs.
+        The PDF is given as bytes or a file path; each page's `source` tells
+        which path it took ("text", "ocr", or "blank" / "duplicate" for scanned pages
+        the page filter kept from the model). `ocr_page` replaces ocr_page_text,
+        e.g. to share a concurrency limit across documents.
         """
-        images = render_pdf_to_images(pdf_bytes)
-        
-        full_text = []
-        
-        # Semaphore to limit concurrent Ollama requests
-        sem = asyncio.Semaphore(5)
-
-        async def process_page(index, img):
-            async with sem:
-                # Preprocess and encode
-                processed_img = preprocess_image(img)
-                b64 = image_to_base64(processed_img)
-                # Perform OCR
-                # We use a specific prompt for pure text extraction
-                page_text = await ollama_client.ocr_image(
-                    b64, 
-                    prompt="Extract the text content from this page. Return raw text with Markdown formatting for structure. Do not include commentary."
-                )
-                return index, page_text
-
-        tasks = [process_page(i, img) for i, img in enumerate(images)]
-        
-        if tasks:
-            results = await asyncio.gather(*tasks)
-            # Sort by index to ensure page order
-            results.sort(key=lambda x: x[0])
-            full_text = [r[1] for r in results]
-            
-        return "\n\n--- Page Break ---\n\n".join(full_text)
+        if mode not in TEXT_MODES:
+            raise ValueError(f"Unknown mode '{mode}', expected one of: {', '.join(TEXT_MODES)}")
+
+        pages: dict[int, dict] = {}
+        async with pdf_path(source) as path:
+            if mode == "ocr":
+                ocr_indexes = list(range(await count_pdf_pages(path)))
+            else:
+                ocr_indexes = []
+                for analysis in await analyze_pdf_text(path):
+                    index = analysis["index"]
+                    if mode == "text" or analysis["usable"]:
+                        pages[index] = {"page": index + 1, "source": "text", "text": analysis["text"]}
+                    else:
+                        ocr_indexes.append(index)
+
+            # Only pages without a usable text layer are rendered; at most
+            # 5 of them (plus the render lookahead) are held in memory at once
+            page_filter = PageFilter()
+            async with aclosing(aiter_pdf_pages(path, ocr_indexes)) as images:
+                async with aclosing(page_filter.distinct(images)) as distinct:
+                    async with aclosing(map_ordered(distinct, ocr_page or ConversionService.ocr_page_text, 5)) as results:
+                        async for index, page_text, error in results:
+                            if error is not None:
+                                raise error
+                            pages[index] = {"page": index + 1, "source": "ocr", "text": page_text}
+
+            # Near-blank pages are skipped, near-duplicates take the text of the page they repeat
+            for index in page_filter.blank:
+                pages[index] = {"page": index + 1, "source": "blank", "text": ""}
+            for index, original in page_filter.duplicates.items():
+                pages[index] = {"page": index + 1, "source": "duplicate", "text": pages[original]["text"], "duplicate_of": original + 1}
+
+        return [pages[index] for index in sorted(pages)]
 
     @staticmethod
-    async def merge_pdfs(pdf_files: list[bytes]) -> bytes:
-        """Merge multiple PDF files into one."""
-        merger = PdfWriter()
-        for pdf_bytes in pdf_files:
-            reader = PdfReader(io.BytesIO(pdf_bytes))
-            for page in reader.pages:
-                merger.add_page(page)
-        
-        buffer = io.BytesIO()
-        merger.write(buffer)
-        buffer.seek(0)
-        return buffer.getvalue()
+    async def pdf_to_text(source: bytes | str, mode: str = "auto") -> str:
+        """
+        Extract text from PDF using the embedded text layer where it is usable,
+        and High-Fidelity OCR with the configured model for scanned pages.
+        """
+        pages = await ConversionService.pdf_to_text_pages(source, mode)
+        return ConversionService.join_pages([page["text"] for page in pages])
+
+    @staticmethod
+    def count_sources(pages: list[dict]) -> dict:
+        """Pages per source, e.g. {"text": 12, "ocr": 3, "blank": 1, "duplicate": 2}."""
+        counts = dict.fromkeys(PAGE_SOURCES, 0)
+        for page in pages:
+            counts[page["source"]] += 1
+        return counts
+
+    @staticmethod
+    def summarize_sources(pages: list[dict]) -> str:
+        """Compact per-document summary for response headers, e.g. "text=12, ocr=3, blank=1, duplicate=2"."""
+        return ", ".join(f"{source}={count}" for source, count in ConversionService.count_sources(pages).items())
+
+    @staticmethod
+    async def merge_pdfs(pdf_files: list[str], output: str) -> None:
+        """Merge multiple PDF files (paths) into one, written to `output`."""
+        def merge():
+            merger = PdfWriter()
+            for pdf_file in pdf_files:
+                reader = PdfReader(pdf_file)
+                for page in reader.pages:
+                    merger.add_page(page)
+            # Objects are serialized straight into the output file
+            with open(output, "wb") as f:
+                merger.write(f)
+
+        await asyncio.to_thread(merge)
 
     @staticmethod
     async def html_to_pdf(html_content: str) -> bytes:
@@ -1,36 +1,72 @@
+import re
+import numpy as np
 import pandas as pd
-import io
+from openpyxl import Workbook
 from openpyxl.utils import get_column_letter
+from backend.utils.metrics import metrics
 
-def dataframes_to_excel(dfs: list[pd.DataFrame], sheet_names: list[str] = None) -> bytes:
+# Excel limits for sheet titles
+_SHEET_NAME_MAX = 31
+_SHEET_NAME_INVALID = re.compile(r"[\[\]:*?/\\]")
+# Rows converted to Python values at a time, keeps memory flat on big tables
+_ROW_CHUNK = 10000
+# Column widths are estimated from at most this many rows
+_WIDTH_SAMPLE_ROWS = 20000
+_MAX_COLUMN_WIDTH = 80
+
+def sheet_titles(count: int, names: list[str] | None = None) -> list[str]:
     """
-    Writes a list of DataFrames to an Excel file in memory.
+    Valid, unique sheet titles: invalid characters replaced, cut to 31 characters,
+    "Table n" for missing or blank names and " (2)"-style suffixes for repeats
+    (Excel compares titles case-insensitively).
     """
-    output = io.BytesIO()
-    
-    # Create Excel writer object
-    with pd.ExcelWriter(output, engine='openpyxl') as writer:
-        for i, df in enumerate(dfs):
-            sheet_name = f"Table {i+1}"
-            if sheet_names and i < len(sheet_names):
-                 sheet_name = sheet_names[i]
-            
-            # Write DF to sheet
-            df.to_excel(writer, sheet_name=sheet_name, index=False)
-            
-            # Auto-adjust column widths
-            worksheet = writer.sheets[sheet_name]
-            for idx, col in enumerate(worksheet.columns):
-                max_length = 0
-                column = get_column_letter(idx + 1) # Get the column name
-                # iterating through each cell in the column
-                for cell in col:
-                    try:
-                        if len(str(cell.value)) > max_length:
-                            max_length = len(str(cell.value))
-                    except:
-                        pass
-                adjusted_width = (max_length + 2)
-                worksheet.column_dimensions[column].width = adjusted_width
+    titles, used = [], set()
+    for i in range(count):
+        name = names[i] if names and i < len(names) and names[i] else ""
+        name = _SHEET_NAME_INVALID.sub("_", str(name)).strip().strip("'")[:_SHEET_NAME_MAX].strip()
+        name = name or f"Table {i + 1}"
+        title, n = name, 1
+        while title.lower() in used:
+            n += 1
+            suffix = f" ({n})"
+            title = name[:_SHEET_NAME_MAX - len(suffix)] + suffix
+        used.add(title.lower())
+        titles.append(title)
+    return titles
+
+def column_widths(df: pd.DataFrame) -> list[int]:
+    """Longest text per column (header included) + 2, from a sample of rows on big tables."""
+    sample = df
+    if len(df) > _WIDTH_SAMPLE_ROWS:
+        sample = df.iloc[np.linspace(0, len(df) - 1, _WIDTH_SAMPLE_ROWS, dtype=np.int64)]
+    widths = []
+    for i, name in enumerate(df.columns):
+        column = sample.iloc[:, i]
+        longest = column.astype(str).str.len().max() if len(column) else 0
+        widths.append(min(max(int(longest), len(str(name))) + 2, _MAX_COLUMN_WIDTH))
+    return widths
+
+def _rows(df: pd.DataFrame):
+    # NaN/NaT become empty cells, numpy scalars plain Python values
+    for start in range(0, len(df), _ROW_CHUNK):
+        chunk = df.iloc[start:start + _ROW_CHUNK].astype(object)
+        yield from chunk.where(chunk.notna(), None).to_numpy().tolist()
 
-    return output.getvalue()
+@metrics.timed("excel_export")
+def dataframes_to_excel(dfs: list[pd.DataFrame], output: str, sheet_names: list[str] = None) -> None:
+    """
+    Writes a list of DataFrames to an Excel file at `output`, one sheet each.
+    Rows are streamed through openpyxl's write-only mode, so memory doesn't grow with the table.
+    """
+    workbook = Workbook(write_only=True)
+    for df, title in zip(dfs, sheet_titles(len(dfs), sheet_names)):
+        worksheet = workbook.create_sheet(title)
+        # Widths have to be set before the first row in write-only mode
+        for idx, width in enumerate(column_widths(df)):
+            worksheet.column_dimensions[get_column_letter(idx + 1)].width = width
+        worksheet.append([str(name) for name in df.columns])
+        for row in _rows(df):
+            worksheet.append(row)
+    if not dfs:
+        workbook.create_sheet("Table 1")
+    workbook.save(output)
@@ -1,7 +1,17 @@
 from PIL import Image
-import io
 import base64
+import hashlib
+import threading
+from backend.config import settings
+from backend.utils.metrics import metrics
 
+IMAGE_FORMATS = ("JPEG", "PNG", "WEBP")
+IMAGE_COLORS = ("auto", "gray", "bilevel")
+
+# Encode buffers bigger than this are not kept around between calls
+_MAX_RETAINED_BUFFER = 16 * 1024 * 1024
+
+@metrics.timed("preprocess")
 def preprocess_image(img: Image.Image, max_dim: int = 2048) -> Image.Image:
     """
     Resize image if larger than max_dim, preserving aspect ratio.
@@ -20,8 +30,113 @@ def preprocess_image(img: Image.Image, max_dim: int = 2048) -> Image.Image:
         
     return img
 
+class _EncodeBuffer:
+    """
+    Minimal writable file for PIL.Image.save backed by a bytearray that is kept
+    between calls, so encoding a page doesn't grow a fresh BytesIO every time.
+    """
+
+    def __init__(self):
+        self.data = bytearray()
+        self.length = 0
+
+    def reset(self) -> None:
+        self.length = 0
+
+    def write(self, chunk) -> int:
+        end = self.length + len(chunk)
+        self.data[self.length:end] = chunk
+        self.length = end
+        return len(chunk)
+
+    def tell(self) -> int:
+        return self.length
+
+    def flush(self) -> None:
+        pass
+
+    def view(self) -> memoryview:
+        return memoryview(self.data)[:self.length]
+
+_buffers = threading.local()
+
+def _encode_buffer() -> _EncodeBuffer:
+    # One buffer per thread: pages are encoded on the event loop and in to_thread workers
+    buffer = getattr(_buffers, "buffer", None)
+    if buffer is None or len(buffer.data) > _MAX_RETAINED_BUFFER:
+        buffer = _buffers.buffer = _EncodeBuffer()
+    buffer.reset()
+    return buffer
+
+class EncodedImage:
+    """
+    An image encoded for a model payload. `b64` is the ASCII base64 body that goes
+    into the request as-is, `size` the encoded (pre-base64) byte count and
+    `sha256` the digest of the encoded bytes, used for cache keys.
+    """
+    __slots__ = ("b64", "size", "sha256", "format", "width", "height")
+
+    def __init__(self, b64: bytes, size: int, sha256: str, format: str, width: int, height: int):
+        self.b64 = b64
+        self.size = size
+        self.sha256 = sha256
+        self.format = format
+        self.width = width
+        self.height = height
+
+    def __repr__(self) -> str:
+        return f"EncodedImage({self.format} {self.width}x{self.height}, {self.size} bytes)"
+
+def _to_color(img: Image.Image, color: str) -> Image.Image:
+    if color == "gray":
+        return img if img.mode == "L" else img.convert("L")
+    if color == "bilevel":
+        return img if img.mode == "1" else img.convert("L").convert("1")
+    if img.mode not in ("RGB", "L"):
+        return img.convert("RGB")
+    return img
+
+@metrics.timed("encode")
+def encode_image(
+    img: Image.Image,
+    format: str | None = None,
+    quality: int | None = None,
+    color: str | None = None,
+) -> EncodedImage:
+    """
+    Encodes a page for the model. Format (JPEG, PNG or WEBP), quality and color
+    ("auto" keeps RGB/grayscale, "gray", "bilevel") default to the IMAGE_ENCODE_* settings.
+    """
+    format = (format or settings.IMAGE_ENCODE_FORMAT).upper()
+    quality = quality or settings.IMAGE_ENCODE_QUALITY
+    color = color or settings.IMAGE_ENCODE_COLOR
+    if format not in IMAGE_FORMATS:
+        raise ValueError(f"Unsupported image format '{format}'. Use one of: {', '.join(IMAGE_FORMATS)}")
+    if color not in IMAGE_COLORS:
+        raise ValueError(f"Unsupported image color '{color}'. Use one of: {', '.join(IMAGE_COLORS)}")
+
+    img = _to_color(img, color)
+    if format == "JPEG" and img.mode == "1":
+        # JPEG has no 1-bit mode; the thresholded page is stored as 8-bit
+        img = img.convert("L")
+
+    buffer = _encode_buffer()
+    if format == "PNG":
+        img.save(buffer, format="PNG", optimize=False, compress_level=6)
+    else:
+        img.save(buffer, format=format, quality=quality)
+
+    # Hash and base64 straight from the buffer; b64 is the only copy that's kept
+    with buffer.view() as view:
+        return EncodedImage(
+            b64=base64.b64encode(view),
+            size=len(view),
+            sha256=hashlib.sha256(view).hexdigest(),
+            format=format,
+            width=img.width,
+            height=img.height,
+        )
+
 def image_to_base64(img: Image.Image) -> str:
     """Convert PIL Image to Base64 string."""
-    buffered = io.BytesIO()
-    img.save(buffered, format="JPEG", quality=95)
-    return base64.b64encode(buffered.getvalue()).decode("utf-8")
+    return encode_image(img).b64.decode("ascii")
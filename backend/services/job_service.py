@@ -0,0 +1,340 @@
+import asyncio
+import os
+import shutil
+import time
+import uuid
+from contextlib import aclosing
+from typing import AsyncIterator, Awaitable, Callable
+import pypdfium2 as pdfium
+from PIL import Image
+from backend.config import settings
+from backend.services.job_store import job_store, RUNNING, COMPLETED, FAILED, CANCELLED, FINISHED_STATES
+from backend.services.pdf_service import aiter_pdf_pages, aiter_document_pages, analyze_pdf_text, count_pdf_pages, parse_page_range, TEXT, TABLE
+from backend.services.model_scheduler import SchedulerOverloaded, set_request_context, set_priority, BULK
+from backend.services.conversion_service import ConversionService
+from backend.services.table_service import TableService, CONVERT_TABLE_PROMPT
+from backend.services.translation_service import PdfTranslatorService, DocumentTranslationService
+from backend.services.translation_memory import merge_stats
+from backend.utils.metrics import set_endpoint
+
+XLSX_MEDIA_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+IMAGE_TYPES = ("image/jpeg", "image/png")
+
+class JobOutput:
+    """
+    What a finished job produces: JSON data for the status endpoint, plus optionally
+    a file that finalize already wrote to result_path(job, filename).
+    """
+
+    def __init__(self, data: dict, filename: str | None = None, media_type: str | None = None):
+        self.data = data
+        self.filename = filename
+        self.media_type = media_type
+
+class JobOperation:
+    """
+    A long-running operation split into a per-page step and a finalize step.
+    process_page(index, image, params) returns a JSON-serializable page output, which is
+    stored as soon as the page is done. finalize(outputs, job) combines the outputs
+    (in page order) into a JobOutput. `params` maps parameter names to defaults,
+    None meaning the parameter is required. Pages are rendered with the given
+    render profile. prefill(job, pages), if given, returns outputs for the pages
+    that need no rendering at all ({index: output}); only the rest are rendered.
+    """
+
+    def __init__(
+        self,
+        content_types: tuple[str, ...],
+        process_page: Callable[[int, Image.Image, dict], Awaitable[dict]],
+        finalize: Callable[[list[dict], dict], Awaitable[JobOutput]],
+        params: dict | None = None,
+        profile: str = TEXT,
+        prefill: Callable[[dict, list[int]], Awaitable[dict[int, dict]]] | None = None,
+    ):
+        self.content_types = content_types
+        self.process_page = process_page
+        self.finalize = finalize
+        self.params = params or {}
+        self.profile = profile
+        self.prefill = prefill
+
+# --- Operations, built from the same service steps the synchronous endpoints use ---
+
+async def _text_prefill(job: dict, pages: list[int]) -> dict[int, dict]:
+    # Same fast path as /api/convert/pdf-to-text: pages with a usable text layer skip OCR
+    return {
+        analysis["index"]: {"text": analysis["text"]}
+        for analysis in await analyze_pdf_text(job["source"], pages)
+        if analysis["usable"]
+    }
+
+async def _text_page(index: int, img: Image.Image, params: dict) -> dict:
+    return {"text": await ConversionService.ocr_page_text(img)}
+
+async def _text_finalize(outputs: list[dict], job: dict) -> JobOutput:
+    return JobOutput({"text": ConversionService.join_pages([o["text"] for o in outputs])})
+
+async def _table_page(index: int, img: Image.Image, params: dict) -> dict:
+    return {"markdown": await TableService.extract_page_markdown(img)}
+
+async def _table_finalize(outputs: list[dict], job: dict) -> JobOutput:
+    def build() -> JobOutput:
+        page_numbers = [index + 1 for index in job["pages"]]
+        tables, merges = TableService.merge_page_tables([o["markdown"] for o in outputs], page_numbers)
+        if not tables:
+            return JobOutput({"message": "No tables found", "preview_data": []})
+        preview = TableService.build_workbook(tables, result_path(job, "extracted_tables.xlsx"))
+        data = {"message": "Tables extracted successfully", "preview_data": preview, "total_tables": len(tables),
+                "merges": merges}
+        return JobOutput(data, "extracted_tables.xlsx", XLSX_MEDIA_TYPE)
+
+    return await asyncio.to_thread(build)
+
+async def _excel_page(index: int, img: Image.Image, params: dict) -> dict:
+    return {"markdown": await TableService.extract_page_markdown(img, CONVERT_TABLE_PROMPT, preprocess=True)}
+
+async def _excel_finalize(outputs: list[dict], job: dict) -> JobOutput:
+    def build() -> JobOutput:
+        tables = TableService.tables_from_markdown([o["markdown"] for o in outputs])
+        if not tables:
+            raise ValueError("No tables found in PDF.")
+        TableService.build_workbook(tables, result_path(job, "converted.xlsx"))
+        return JobOutput({"total_tables": len(tables)}, "converted.xlsx", XLSX_MEDIA_TYPE)
+
+    return await asyncio.to_thread(build)
+
+async def _translate_page(index: int, img: Image.Image, params: dict) -> dict:
+    return await DocumentTranslationService.translate_page(img, params["target_language"])
+
+async def _translate_finalize(outputs: list[dict], job: dict) -> JobOutput:
+    pages = [{"page": index + 1, **output} for index, output in zip(job["pages"], outputs)]
+    return JobOutput({"pages": pages, "translation_memory": merge_stats([p["translation_memory"] for p in pages])})
+
+async def _pdf_translator_page(index: int, img: Image.Image, params: dict) -> dict:
+    text = await PdfTranslatorService.ocr_page(img)
+    translated, memory_stats = await PdfTranslatorService.translate_page(index, text, params["target_language"])
+    return {"text": text, "translated_text": translated, "translation_memory": memory_stats}
+
+async def _pdf_translator_finalize(outputs: list[dict], job: dict) -> JobOutput:
+    def build() -> JobOutput:
+        output = result_path(job, "translated.pdf")
+        if not PdfTranslatorService.render_pdf([o["translated_text"] for o in outputs], output):
+            # Same fallback as the synchronous endpoint: hand back the original
+            PdfTranslatorService.copy_source(job["source"], output)
+        data = {"translation_memory": merge_stats([o["translation_memory"] for o in outputs])}
+        return JobOutput(data, "translated.pdf", "application/pdf")
+
+    return await asyncio.to_thread(build)
+
+OPERATIONS: dict[str, JobOperation] = {
+    "pdf-to-text": JobOperation(("application/pdf",), _text_page, _text_finalize, prefill=_text_prefill),
+    "pdf-to-excel": JobOperation(("application/pdf",), _excel_page, _excel_finalize, profile=TABLE),
+    "table": JobOperation(("application/pdf", *IMAGE_TYPES), _table_page, _table_finalize, profile=TABLE),
+    "translate": JobOperation(("application/pdf", *IMAGE_TYPES), _translate_page, _translate_finalize, {"target_language": None}),
+    "pdf-translator": JobOperation(("application/pdf",), _pdf_translator_page, _pdf_translator_finalize, {"target_language": "Spanish"}),
+}
+
+# --- Runner ---
+
+def _job_dir(job_id: str) -> str:
+    return os.path.join(settings.JOB_DIR, job_id)
+
+def result_path(job: dict, filename: str) -> str:
+    return os.path.join(_job_dir(job["id"]), filename)
+
+class JobRunner:
+    """
+    Runs jobs in the background of the API process. Every finished page is written
+    to the job store, and jobs still queued or running when the process stops are
+    picked up again on the next start, skipping the pages already done.
+    """
+
+    def __init__(self, max_running: int, page_concurrency: int, retention_hours: int):
+        self.max_running = max_running
+        self.page_concurrency = page_concurrency
+        self.retention_seconds = retention_hours * 3600
+        self._tasks: dict[str, asyncio.Task] = {}
+        self._slots: asyncio.Semaphore | None = None
+        self._janitor: asyncio.Task | None = None
+
+    async def start(self) -> None:
+        self._slots = asyncio.Semaphore(self.max_running)
+        await self.purge_expired()
+        for job_id in await job_store.unfinished():
+            self._schedule(job_id)
+        self._janitor = asyncio.create_task(self._purge_periodically())
+
+    async def shutdown(self) -> None:
+        # Interrupted jobs keep their queued/running status and resume on the next start
+        tasks = list(self._tasks.values())
+        if self._janitor is not None:
+            tasks.append(self._janitor)
+            self._janitor = None
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        job_store.close()
+
+    async def submit(self, upload: str, content_type: str, operation: str, params: dict, tenant: str, page_spec: str = "") -> dict:
+        """
+        Moves the uploaded file (a path the job takes over) into the job directory and
+        queues the job. Raises ValueError for an invalid page range or a PDF pdfium can't open.
+        """
+        job_id = uuid.uuid4().hex
+        job_dir = _job_dir(job_id)
+        os.makedirs(job_dir, exist_ok=True)
+        source = os.path.join(job_dir, "source.pdf" if content_type == "application/pdf" else "source")
+        try:
+            # A rename when uploads and jobs share a filesystem, a copy otherwise
+            await asyncio.to_thread(shutil.move, upload, source)
+            if content_type == "application/pdf":
+                try:
+                    page_count = await count_pdf_pages(source)
+                except pdfium.PdfiumError as e:
+                    raise ValueError(f"Invalid PDF: {e}") from e
+                pages = parse_page_range(page_spec, page_count)
+            else:
+                pages = [0]
+        except Exception:
+            shutil.rmtree(job_dir, ignore_errors=True)
+            raise
+
+        await job_store.create({
+            "id": job_id,
+            "operation": operation,
+            "params": params,
+            "tenant": tenant,
+            "source": source,
+            "content_type": content_type,
+            "pages": pages,
+        })
+        self._schedule(job_id)
+        return await job_store.get(job_id)
+
+    async def cancel(self, job_id: str) -> dict | None:
+        job = await job_store.get(job_id)
+        if job is None or job["status"] in FINISHED_STATES:
+            return job
+        if not await job_store.update(job_id, status=CANCELLED):
+            # Finished in the meantime
+            return await job_store.get(job_id)
+        task = self._tasks.get(job_id)
+        if task is not None:
+            task.cancel()
+        return await job_store.get(job_id)
+
+    def _schedule(self, job_id: str) -> None:
+        task = asyncio.create_task(self._run(job_id))
+        self._tasks[job_id] = task
+        task.add_done_callback(lambda _: self._tasks.pop(job_id, None))
+
+    async def _run(self, job_id: str) -> None:
+        async with self._slots:
+            job = await job_store.get(job_id)
+            if job is None or job["status"] in FINISHED_STATES:
+                return
+            # Job pages queue as bulk work, shared fairly with the tenant's other requests
+            set_request_context(job["tenant"])
+            set_priority(BULK)
+            set_endpoint(f"job:{job['operation']}")
+            if not await job_store.update(job_id, status=RUNNING):
+                return  # Cancelled while waiting for a slot
+
+            operation = OPERATIONS[job["operation"]]
+            try:
+                done = set(await job_store.completed_pages(job_id))
+                pages = [p for p in job["pages"] if p not in done]
+                if operation.prefill is not None and pages:
+                    prefilled = await operation.prefill(job, pages)
+                    for index, output in prefilled.items():
+                        await job_store.save_page(job_id, index, output)
+                    pages = [p for p in pages if p not in prefilled]
+                await self._process_pages(job, operation, pages)
+
+                outputs = await job_store.page_outputs(job_id)
+                output = await operation.finalize([outputs[p] for p in job["pages"]], job)
+                result_file = result_path(job, output.filename) if output.filename else None
+                await job_store.update(
+                    job_id,
+                    status=COMPLETED,
+                    result=output.data,
+                    result_file=result_file,
+                    result_name=output.filename,
+                    media_type=output.media_type,
+                )
+            except asyncio.CancelledError:
+                # Either cancelled by the user (status already set) or the app is shutting down
+                raise
+            except Exception as e:
+                await job_store.update(job_id, status=FAILED, error=str(e))
+
+    async def _process_pages(self, job: dict, operation: JobOperation, pages: list[int]) -> None:
+        sem = asyncio.Semaphore(self.page_concurrency)
+        errors = []
+
+        async def process(index, img):
+            try:
+                output = await self._process_page(operation, index, img, job["params"])
+                await job_store.save_page(job["id"], index, output)
+            except Exception as e:
+                errors.append(e)
+                raise
+            finally:
+                sem.release()
+
+        # Same pattern as the synchronous services: a page is rendered once a slot is free
+        tasks = []
+        try:
+            async with aclosing(self._iter_pages(job, pages, operation.profile)) as page_images:
+                async for index, img in page_images:
+                    await sem.acquire()
+                    if errors:
+                        # Don't render the rest of the document once a page has failed
+                        sem.release()
+                        break
+                    tasks.append(asyncio.create_task(process(index, img)))
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    @staticmethod
+    async def _process_page(operation: JobOperation, index: int, img: Image.Image, params: dict) -> dict:
+        while True:
+            try:
+                return await operation.process_page(index, img, params)
+            except SchedulerOverloaded as e:
+                # Jobs are not in a hurry, back off instead of failing
+                await asyncio.sleep(e.retry_after)
+
+    @staticmethod
+    async def _iter_pages(job: dict, pages: list[int], profile: str) -> AsyncIterator[tuple[int, Image.Image]]:
+        if job["content_type"] == "application/pdf":
+            async with aclosing(aiter_pdf_pages(job["source"], pages, profile=profile)) as pdf_pages:
+                async for index, img in pdf_pages:
+                    yield index, img
+        elif pages:
+            async with aclosing(aiter_document_pages(job["source"], job["content_type"], profile=profile)) as image_pages:
+                async for index, img in image_pages:
+                    yield index, img
+
+    async def purge_expired(self) -> None:
+        """Deletes finished jobs (state, pages and files) older than the retention period."""
+        for job in await job_store.expired(time.time() - self.retention_seconds):
+            await asyncio.to_thread(shutil.rmtree, _job_dir(job["id"]), True)
+            await job_store.delete(job["id"])
+
+    async def _purge_periodically(self) -> None:
+        while True:
+            await asyncio.sleep(3600)
+            try:
+                await self.purge_expired()
+            except Exception:
+                pass  # Try again next round
+
+job_runner = JobRunner(
+    max_running=settings.JOB_MAX_RUNNING,
+    page_concurrency=settings.JOB_PAGE_CONCURRENCY,
+    retention_hours=settings.JOB_RETENTION_HOURS,
+)
@@ -0,0 +1,177 @@
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+from backend.config import settings
+
+QUEUED = "queued"
+RUNNING = "running"
+COMPLETED = "completed"
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINISHED_STATES = (COMPLETED, FAILED, CANCELLED)
+
+class JobStore:
+    """
+    Durable job state in SQLite: one row per job plus one row per completed page,
+    so an interrupted job resumes from the pages it already has.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._db: sqlite3.Connection | None = None
+        self._db_lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._db is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            db = sqlite3.connect(self.path, check_same_thread=False)
+            db.row_factory = sqlite3.Row
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                "id TEXT PRIMARY KEY, operation TEXT NOT NULL, params TEXT NOT NULL, tenant TEXT NOT NULL, "
+                "status TEXT NOT NULL, source TEXT NOT NULL, content_type TEXT NOT NULL, pages TEXT NOT NULL, "
+                "error TEXT, result TEXT, result_file TEXT, result_name TEXT, media_type TEXT, "
+                "created REAL NOT NULL, updated REAL NOT NULL)"
+            )
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS job_pages ("
+                "job_id TEXT NOT NULL, page INTEGER NOT NULL, output TEXT NOT NULL, "
+                "PRIMARY KEY (job_id, page))"
+            )
+            self._db = db
+        return self._db
+
+    @staticmethod
+    def _row_to_job(row: sqlite3.Row, completed: int) -> dict:
+        job = dict(row)
+        job["params"] = json.loads(job["params"])
+        job["pages"] = json.loads(job["pages"])
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        job["completed"] = completed
+        return job
+
+    def _create(self, job: dict) -> None:
+        now = time.time()
+        with self._db_lock:
+            db = self._connect()
+            db.execute(
+                "INSERT INTO jobs (id, operation, params, tenant, status, source, content_type, pages, created, updated) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (job["id"], job["operation"], json.dumps(job["params"]), job["tenant"], QUEUED,
+                 job["source"], job["content_type"], json.dumps(job["pages"]), now, now),
+            )
+            db.commit()
+
+    def _get(self, job_id: str) -> dict | None:
+        with self._db_lock:
+            db = self._connect()
+            row = db.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if row is None:
+                return None
+            completed = db.execute("SELECT COUNT(*) FROM job_pages WHERE job_id = ?", (job_id,)).fetchone()[0]
+        return self._row_to_job(row, completed)
+
+    def _update(self, job_id: str, **fields) -> bool:
+        if "result" in fields:
+            fields["result"] = json.dumps(fields["result"])
+        fields["updated"] = time.time()
+        columns = ", ".join(f"{name} = ?" for name in fields)
+        query, args = f"UPDATE jobs SET {columns} WHERE id = ?", (*fields.values(), job_id)
+        if "status" in fields:
+            # A finished job stays finished: a late RUNNING write must not undo a cancel
+            query += f" AND status NOT IN ({','.join('?' * len(FINISHED_STATES))})"
+            args += FINISHED_STATES
+        with self._db_lock:
+            db = self._connect()
+            updated = db.execute(query, args).rowcount > 0
+            db.commit()
+        return updated
+
+    def _save_page(self, job_id: str, page: int, output: dict) -> None:
+        with self._db_lock:
+            db = self._connect()
+            db.execute(
+                "INSERT OR REPLACE INTO job_pages (job_id, page, output) VALUES (?, ?, ?)",
+                (job_id, page, json.dumps(output)),
+            )
+            db.execute("UPDATE jobs SET updated = ? WHERE id = ?", (time.time(), job_id))
+            db.commit()
+
+    def _page_outputs(self, job_id: str) -> dict[int, dict]:
+        with self._db_lock:
+            db = self._connect()
+            rows = db.execute("SELECT page, output FROM job_pages WHERE job_id = ? ORDER BY page", (job_id,)).fetchall()
+        return {page: json.loads(output) for page, output in rows}
+
+    def _completed_pages(self, job_id: str) -> list[int]:
+        with self._db_lock:
+            db = self._connect()
+            rows = db.execute("SELECT page FROM job_pages WHERE job_id = ? ORDER BY page", (job_id,)).fetchall()
+        return [page for (page,) in rows]
+
+    def _unfinished(self) -> list[str]:
+        with self._db_lock:
+            db = self._connect()
+            rows = db.execute(
+                "SELECT id FROM jobs WHERE status IN (?, ?) ORDER BY created", (QUEUED, RUNNING)
+            ).fetchall()
+        return [job_id for (job_id,) in rows]
+
+    def _expired(self, before: float) -> list[dict]:
+        with self._db_lock:
+            db = self._connect()
+            rows = db.execute(
+                f"SELECT * FROM jobs WHERE updated < ? AND status IN ({','.join('?' * len(FINISHED_STATES))})",
+                (before, *FINISHED_STATES),
+            ).fetchall()
+        return [self._row_to_job(row, 0) for row in rows]
+
+    def _delete(self, job_id: str) -> None:
+        with self._db_lock:
+            db = self._connect()
+            db.execute("DELETE FROM job_pages WHERE job_id = ?", (job_id,))
+            db.execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+            db.commit()
+
+    # --- Async API, SQLite work runs in worker threads ---
+
+    async def create(self, job: dict) -> None:
+        await asyncio.to_thread(self._create, job)
+
+    async def get(self, job_id: str) -> dict | None:
+        return await asyncio.to_thread(self._get, job_id)
+
+    async def update(self, job_id: str, **fields) -> bool:
+        """Returns False if the job is gone, or if `status` is changed and the job was already finished."""
+        return await asyncio.to_thread(self._update, job_id, **fields)
+
+    async def save_page(self, job_id: str, page: int, output: dict) -> None:
+        await asyncio.to_thread(self._save_page, job_id, page, output)
+
+    async def page_outputs(self, job_id: str) -> dict[int, dict]:
+        return await asyncio.to_thread(self._page_outputs, job_id)
+
+    async def completed_pages(self, job_id: str) -> list[int]:
+        return await asyncio.to_thread(self._completed_pages, job_id)
+
+    async def unfinished(self) -> list[str]:
+        return await asyncio.to_thread(self._unfinished)
+
+    async def expired(self, before: float) -> list[dict]:
+        return await asyncio.to_thread(self._expired, before)
+
+    async def delete(self, job_id: str) -> None:
+        await asyncio.to_thread(self._delete, job_id)
+
+    def close(self) -> None:
+        with self._db_lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+job_store = JobStore(path=os.path.join(settings.JOB_DIR, "jobs.sqlite3"))
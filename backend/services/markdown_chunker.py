@@ -0,0 +1,149 @@
+import re
+from backend.services.translation_memory import HEADING_RE, LIST_ITEM_RE, TABLE_SEPARATOR_RE
+
+# Where an oversized paragraph may be cut: after a sentence, or at a line break inside it
+_SENTENCE_END = re.compile(r"(?<=[.!?;:。！？；])[ \t]+|\n")
+_WORD_END = re.compile(r"\s+")
+
+def estimate_tokens(text: str) -> int:
+    """
+    Rough token count without the model's tokenizer: a token per 3 bytes of UTF-8.
+    A little high for English (~4 bytes a token), about right for CJK (3-byte characters).
+    """
+    return -(-len(text.encode("utf-8")) // 3)
+
+def _ends_with_blank_line(text: str) -> bool:
+    lines = text.splitlines()
+    return not lines or not lines[-1].strip()
+
+def _blocks(text: str) -> list[tuple[str, str]]:
+    """
+    Splits Markdown into (text, kind) blocks that chunks may be cut between: headings,
+    paragraphs, list items, table rows and fenced code. Blank lines stay with the
+    block before them, so joining the texts gives back `text` exactly.
+    """
+    blocks: list[list[str]] = []  # [text, kind]
+    fence = None
+    for line in text.splitlines(keepends=True):
+        stripped = line.strip()
+        last = blocks[-1] if blocks else None
+
+        if fence is not None:
+            last[0] += line
+            if stripped.startswith(fence):
+                fence = None
+            continue
+        if stripped.startswith("```") or stripped.startswith("~~~"):
+            fence = stripped[:3]
+            blocks.append([line, "code"])
+            continue
+        if not stripped:
+            if last is None:
+                blocks.append([line, "text"])
+            else:
+                last[0] += line
+            continue
+
+        if stripped.startswith("|"):
+            # The |---| row goes with the header, which then waits for the rows like a heading
+            if last is not None and last[1] == "row" and TABLE_SEPARATOR_RE.match(stripped):
+                last[0] += line
+                last[1] = "heading"
+            else:
+                blocks.append([line, "row"])
+        elif HEADING_RE.match(line):
+            blocks.append([line, "heading"])
+        elif LIST_ITEM_RE.match(line):
+            blocks.append([line, "item"])
+        elif last is not None and last[1] in ("text", "item") and not _ends_with_blank_line(last[0]):
+            # Paragraph text and list item continuations up to the next blank line
+            last[0] += line
+        else:
+            blocks.append([line, "text"])
+    return [(block, kind) for block, kind in blocks]
+
+def _cut(text: str, budget: int, boundary: re.Pattern) -> list[str]:
+    """Greedily cuts text at `boundary` matches into pieces of at most `budget` where it can."""
+    pieces, start, cut = [], 0, 0
+    for match in boundary.finditer(text):
+        end = match.end()
+        if cut > start and estimate_tokens(text[start:end]) > budget:
+            pieces.append(text[start:cut])
+            start = cut
+        cut = end
+    if estimate_tokens(text[start:]) > budget and start < cut < len(text):
+        pieces.append(text[start:cut])
+        start = cut
+    pieces.append(text[start:])
+    return pieces
+
+def _split_long(block: str, budget: int) -> list[str]:
+    """
+    Cuts a block that alone is over budget after sentences. A sentence that is still
+    over budget is cut between words, and a word that is, between characters.
+    """
+    pieces = []
+    for sentence in _cut(block, budget, _SENTENCE_END):
+        if estimate_tokens(sentence) <= budget:
+            pieces.append(sentence)
+            continue
+        for words in _cut(sentence, budget, _WORD_END):
+            while estimate_tokens(words) > budget:
+                # A character is at most 4 bytes, so budget * 3 // 4 characters always fit
+                size = max(budget * 3 // 4, 1)
+                pieces.append(words[:size])
+                words = words[size:]
+            if words:
+                pieces.append(words)
+    return pieces
+
+def chunk_markdown(text: str, budget: int) -> list[str]:
+    """
+    Splits Markdown into chunks of at most `budget` estimated tokens, cut between headings,
+    paragraphs, list items and table rows; only a block over budget by itself is cut inside.
+    Fenced code is never cut, so a longer code block is the one chunk over budget. A heading
+    (or table header) stays with what follows it if both fit. "".join() of the chunks gives
+    back `text`.
+    """
+    if estimate_tokens(text) <= budget:
+        return [text]
+
+    chunks: list[str] = []
+    current: list[tuple[str, str]] = []
+    size = 0
+
+    def flush() -> None:
+        # Headings at the end wait for the text they introduce
+        nonlocal current, size
+        keep = len(current)
+        while keep and current[keep - 1][1] == "heading":
+            keep -= 1
+        if keep:
+            chunks.append("".join(block for block, _ in current[:keep]))
+            current = current[keep:]
+            size = sum(estimate_tokens(block) for block, _ in current)
+
+    def make_room(tokens: int) -> None:
+        # Flushes what is pending, and the carried headings too if they don't fit with `tokens`
+        nonlocal current, size
+        if current and size + tokens > budget:
+            flush()
+        if current and size + tokens > budget:
+            chunks.append("".join(block for block, _ in current))
+            current, size = [], 0
+
+    for block, kind in _blocks(text):
+        tokens = estimate_tokens(block)
+        if tokens > budget and kind != "code":
+            pieces = _split_long(block, budget)
+            make_room(estimate_tokens(pieces[0]))
+            pieces[0] = "".join(block for block, _ in current) + pieces[0]
+            chunks.extend(pieces[:-1])
+            current, size = [(pieces[-1], kind)], estimate_tokens(pieces[-1])
+            continue
+        make_room(tokens)
+        current.append((block, kind))
+        size += tokens
+    if current:
+        chunks.append("".join(block for block, _ in current))
+    return chunks
@@ -0,0 +1,207 @@
+import asyncio
+import itertools
+import math
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from backend.config import settings
+from backend.utils.metrics import metrics
+
+# Priority classes, lower is served first
+INTERACTIVE = 0
+BULK = 1
+PRIORITY_NAMES = {INTERACTIVE: "interactive", BULK: "bulk"}
+
+_request_ids = itertools.count(1)
+_tenant: ContextVar[str] = ContextVar("model_tenant", default="default")
+_request: ContextVar[str] = ContextVar("model_request", default="default")
+_priority: ContextVar[int] = ContextVar("model_priority", default=INTERACTIVE)
+
+def set_request_context(tenant: str) -> None:
+    """Called once per HTTP request; model calls made while handling it share one fair-queue flow."""
+    _tenant.set(tenant)
+    _request.set(f"request-{next(_request_ids)}")
+
+def get_tenant() -> str:
+    return _tenant.get()
+
+def set_priority(priority: int) -> None:
+    """Marks the model calls of the current request as INTERACTIVE or BULK."""
+    _priority.set(priority)
+
+class SchedulerOverloaded(Exception):
+    """The model queue is too deep to accept more work; retry after `retry_after` seconds."""
+
+    def __init__(self, model: str, retry_after: int):
+        super().__init__(f"Model '{model}' is overloaded, retry in {retry_after}s")
+        self.model = model
+        self.retry_after = retry_after
+
+class _ModelQueue:
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.active = 0
+        # priority -> tenant -> request -> waiters, round-robin at the tenant and request level
+        self.waiting: dict[int, OrderedDict[str, OrderedDict[str, deque]]] = {}
+        self.depth = 0
+        self.granted = 0
+        self.rejected = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.service_avg = 1.0
+
+    def enqueue(self, priority: int, tenant: str, request: str, waiter: asyncio.Future) -> None:
+        tenants = self.waiting.setdefault(priority, OrderedDict())
+        requests = tenants.setdefault(tenant, OrderedDict())
+        requests.setdefault(request, deque()).append(waiter)
+        self.depth += 1
+
+    def remove(self, priority: int, tenant: str, request: str, waiter: asyncio.Future) -> None:
+        try:
+            self.waiting[priority][tenant][request].remove(waiter)
+        except (KeyError, ValueError):
+            return
+        self.depth -= 1
+        self._prune(priority, tenant, request)
+
+    def _prune(self, priority: int, tenant: str, request: str) -> None:
+        tenants = self.waiting[priority]
+        if not tenants[tenant][request]:
+            del tenants[tenant][request]
+        if not tenants[tenant]:
+            del tenants[tenant]
+        if not tenants:
+            del self.waiting[priority]
+
+    def next_waiter(self) -> asyncio.Future | None:
+        for priority in sorted(self.waiting):
+            tenants = self.waiting[priority]
+            # Serve the first tenant, then move it (and its request) to the back of the line
+            tenant, requests = next(iter(tenants.items()))
+            request, waiters = next(iter(requests.items()))
+            waiter = waiters.popleft()
+            self.depth -= 1
+            requests.move_to_end(request)
+            tenants.move_to_end(tenant)
+            self._prune(priority, tenant, request)
+            return waiter
+        return None
+
+    def queued_by_priority(self) -> dict[str, int]:
+        return {
+            PRIORITY_NAMES.get(priority, str(priority)): sum(len(w) for requests in tenants.values() for w in requests.values())
+            for priority, tenants in self.waiting.items()
+        }
+
+class ModelScheduler:
+    """
+    Process-wide admission control for model calls.
+    Each model gets a concurrency cap. Waiting calls are served by priority
+    (interactive before bulk), then round-robin across tenants and across requests,
+    so one huge document cannot starve everyone else. When a model's queue is
+    full, new calls are rejected with SchedulerOverloaded.
+    """
+
+    def __init__(self, default_capacity: int, capacities: dict[str, int], max_queue: int):
+        self.default_capacity = default_capacity
+        self.capacities = capacities
+        self.max_queue = max_queue
+        self._models: dict[str, _ModelQueue] = {}
+
+    def _queue(self, model: str) -> _ModelQueue:
+        queue = self._models.get(model)
+        if queue is None:
+            queue = _ModelQueue(max(1, self.capacities.get(model, self.default_capacity)))
+            self._models[model] = queue
+        return queue
+
+    def _retry_after(self, queue: _ModelQueue) -> int:
+        # Rough time for the current backlog to drain
+        return max(1, math.ceil(queue.service_avg * (queue.depth + 1) / queue.capacity))
+
+    async def acquire(self, model: str) -> float:
+        """Waits for a slot on `model`; returns the time spent queued."""
+        queue = self._queue(model)
+        if queue.active < queue.capacity and queue.depth == 0:
+            queue.active += 1
+            queue.granted += 1
+            return 0.0
+
+        if queue.depth >= self.max_queue:
+            queue.rejected += 1
+            raise SchedulerOverloaded(model, self._retry_after(queue))
+
+        priority, tenant, request = _priority.get(), _tenant.get(), _request.get()
+        waiter = asyncio.get_running_loop().create_future()
+        queue.enqueue(priority, tenant, request, waiter)
+        start = time.monotonic()
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # Granted just as we were cancelled, hand the slot on
+                self.release(model)
+            else:
+                queue.remove(priority, tenant, request, waiter)
+            raise
+
+        waited = time.monotonic() - start
+        queue.wait_total += waited
+        queue.wait_max = max(queue.wait_max, waited)
+        return waited
+
+    def release(self, model: str, service_time: float | None = None) -> None:
+        queue = self._queue(model)
+        if service_time is not None:
+            queue.service_avg = 0.9 * queue.service_avg + 0.1 * service_time
+        while True:
+            waiter = queue.next_waiter()
+            if waiter is None:
+                queue.active -= 1
+                return
+            if not waiter.done():
+                # The slot passes straight to the next waiter, active stays the same
+                queue.granted += 1
+                waiter.set_result(None)
+                return
+
+    @asynccontextmanager
+    async def slot(self, model: str):
+        with metrics.stage("model_queue"):
+            await self.acquire(model)
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.release(model, time.monotonic() - start)
+
+    def stats(self) -> dict:
+        return {
+            model: {
+                "capacity": queue.capacity,
+                "active": queue.active,
+                "queued": queue.depth,
+                "queued_by_priority": queue.queued_by_priority(),
+                "granted": queue.granted,
+                "rejected": queue.rejected,
+                "avg_wait_seconds": round(queue.wait_total / queue.granted, 4) if queue.granted else 0.0,
+                "max_wait_seconds": round(queue.wait_max, 4),
+                "avg_service_seconds": round(queue.service_avg, 4),
+            }
+            for model, queue in self._models.items()
+        }
+
+    def collect_metrics(self):
+        queues = list(self._models.items())
+        yield "model_queue_depth", "gauge", "Model calls waiting for a slot", [({"model": m}, q.depth) for m, q in queues]
+        yield "model_active", "gauge", "Model calls running", [({"model": m}, q.active) for m, q in queues]
+        yield "model_capacity", "gauge", "Concurrent calls allowed per model", [({"model": m}, q.capacity) for m, q in queues]
+        yield "model_rejected_total", "counter", "Model calls rejected with 429", [({"model": m}, q.rejected) for m, q in queues]
+
+model_scheduler = ModelScheduler(
+    default_capacity=settings.OLLAMA_MAX_CONCURRENCY,
+    capacities=settings.OLLAMA_MODEL_CONCURRENCY,
+    max_queue=settings.OLLAMA_MAX_QUEUE,
+)
+metrics.collector(model_scheduler.collect_metrics)
@@ -0,0 +1,232 @@
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable
+from backend.config import settings
+
+class CacheAbandoned(Exception):
+    """The caller that owned an in-flight request went away before it finished."""
+
+class OcrCache:
+    """
+    Two-tier cache for OCR results, keyed by content hash.
+    Tier 1 is a bounded in-memory LRU, tier 2 is a SQLite file with
+    size-based eviction (least recently used first) and a TTL.
+    Identical concurrent requests share one in-flight model call.
+    """
+
+    def __init__(self, directory: str, memory_items: int, disk_max_bytes: int, ttl_seconds: int, enabled: bool = True):
+        self.enabled = enabled
+        self.directory = directory
+        self.memory_items = memory_items
+        self.disk_max_bytes = disk_max_bytes
+        self.ttl_seconds = ttl_seconds
+
+        self._memory: OrderedDict[str, tuple[str, float]] = OrderedDict()
+        self._inflight: dict[str, asyncio.Future] = {}
+        self._db: sqlite3.Connection | None = None
+        self._db_lock = threading.Lock()
+        self._disk_bytes = 0
+        self._last_purge = 0.0
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+
+    @staticmethod
+    def make_key(image_sha256: str, prompt: str, model: str, options: dict | None = None) -> str:
+        # Keyed on the digest of the encoded image bytes, which EncodedImage already carries
+        digest = hashlib.sha256()
+        digest.update(image_sha256.encode("ascii"))
+        for part in (prompt, model, json.dumps(options or {}, sort_keys=True)):
+            digest.update(b"\x00")
+            digest.update(part.encode("utf-8"))
+        return digest.hexdigest()
+
+    # --- Disk tier (runs in worker threads) ---
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._db is None:
+            os.makedirs(self.directory, exist_ok=True)
+            db = sqlite3.connect(os.path.join(self.directory, "ocr_cache.sqlite3"), check_same_thread=False)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, "
+                "created REAL NOT NULL, accessed REAL NOT NULL)"
+            )
+            db.execute("CREATE INDEX IF NOT EXISTS entries_accessed ON entries(accessed)")
+            self._db = db
+            self._purge_expired(time.time())
+            self._disk_bytes = db.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        return self._db
+
+    def _purge_expired(self, now: float) -> None:
+        self._last_purge = now
+        cursor = self._db.execute("DELETE FROM entries WHERE created < ?", (now - self.ttl_seconds,))
+        if cursor.rowcount:
+            self._disk_bytes = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        self._db.commit()
+
+    def _disk_get(self, key: str) -> str | None:
+        with self._db_lock:
+            db = self._connect()
+            row = db.execute("SELECT value, created FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            value, created = row
+            now = time.time()
+            if now - created > self.ttl_seconds:
+                return None
+            db.execute("UPDATE entries SET accessed = ? WHERE key = ?", (now, key))
+            db.commit()
+            return value
+
+    def _disk_put(self, key: str, value: str) -> None:
+        size = len(value.encode("utf-8"))
+        now = time.time()
+        with self._db_lock:
+            db = self._connect()
+            old = db.execute("SELECT size FROM entries WHERE key = ?", (key,)).fetchone()
+            db.execute(
+                "INSERT OR REPLACE INTO entries (key, value, size, created, accessed) VALUES (?, ?, ?, ?, ?)",
+                (key, value, size, now, now),
+            )
+            self._disk_bytes += size - (old[0] if old else 0)
+
+            if now - self._last_purge > 60:
+                self._purge_expired(now)
+
+            # Evict least recently used entries down to 90% of the budget
+            if self._disk_bytes > self.disk_max_bytes:
+                target = int(self.disk_max_bytes * 0.9)
+                for victim, victim_size in db.execute("SELECT key, size FROM entries ORDER BY accessed").fetchall():
+                    if self._disk_bytes <= target:
+                        break
+                    db.execute("DELETE FROM entries WHERE key = ?", (victim,))
+                    self._disk_bytes -= victim_size
+                    self.evictions += 1
+            db.commit()
+
+    # --- Public API ---
+
+    def _memory_get(self, key: str) -> str | None:
+        entry = self._memory.get(key)
+        if entry is None:
+            return None
+        value, created = entry
+        if time.time() - created > self.ttl_seconds:
+            del self._memory[key]
+            return None
+        self._memory.move_to_end(key)
+        return value
+
+    def _memory_put(self, key: str, value: str) -> None:
+        self._memory[key] = (value, time.time())
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_items:
+            self._memory.popitem(last=False)
+
+    async def get(self, key: str) -> str | None:
+        value = self._memory_get(key)
+        if value is not None:
+            self.memory_hits += 1
+            return value
+        value = await asyncio.to_thread(self._disk_get, key)
+        if value is not None:
+            self.disk_hits += 1
+            self._memory_put(key, value)
+        return value
+
+    async def put(self, key: str, value: str) -> None:
+        self._memory_put(key, value)
+        await asyncio.to_thread(self._disk_put, key, value)
+
+    async def lookup(self, key: str) -> str | None:
+        """
+        Returns a cached value, or the result of an identical call already in flight.
+        None means the caller should claim the key and compute it.
+        """
+        value = await self.get(key)
+        while value is None and key in self._inflight:
+            self.coalesced += 1
+            try:
+                return await asyncio.shield(self._inflight[key])
+            except CacheAbandoned:
+                continue
+        return value
+
+    def claim(self, key: str) -> asyncio.Future:
+        """Registers the caller as the owner of the in-flight computation for key."""
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        # Avoid "exception was never retrieved" warnings when nobody was waiting
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())
+        self._inflight[key] = future
+        return future
+
+    def release(self, key: str, future: asyncio.Future, value: str | None = None, error: BaseException | None = None) -> None:
+        if self._inflight.get(key) is future:
+            del self._inflight[key]
+        if future.done():
+            return
+        if error is None:
+            future.set_result(value)
+        elif isinstance(error, (asyncio.CancelledError, GeneratorExit)):
+            future.set_exception(CacheAbandoned())
+        else:
+            future.set_exception(error)
+
+    async def get_or_compute(self, key: str, compute: Callable[[], Awaitable[str]]) -> str:
+        value = await self.lookup(key)
+        if value is not None:
+            return value
+        future = self.claim(key)
+        try:
+            value = await compute()
+        except BaseException as e:
+            self.release(key, future, error=e)
+            raise
+        self.release(key, future, value)
+        await self.put(key, value)
+        return value
+
+    def stats(self) -> dict:
+        hits = self.memory_hits + self.disk_hits
+        lookups = hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+            "memory_entries": len(self._memory),
+            "memory_capacity": self.memory_items,
+            "disk_bytes": self._disk_bytes,
+            "disk_capacity_bytes": self.disk_max_bytes,
+            "evictions": self.evictions,
+            "inflight": len(self._inflight),
+        }
+
+    def close(self) -> None:
+        with self._db_lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+ocr_cache = OcrCache(
+    directory=settings.OCR_CACHE_DIR,
+    memory_items=settings.OCR_CACHE_MEMORY_ITEMS,
+    disk_max_bytes=settings.OCR_CACHE_DISK_MAX_MB * 1024 * 1024,
+    ttl_seconds=settings.OCR_CACHE_TTL_SECONDS,
+    enabled=settings.OCR_CACHE_ENABLED,
+)
@@ -1,5 +1,4 @@
 
-import io
 import os
 import tempfile
 import asyncio
@@ -13,15 +12,11 @@ _executor = ThreadPoolExecutor(max_workers=4)
 
 class OfficeService:
     @staticmethod
-    async def convert_text_to_word(text: str) -> bytes:
-        """Convert plain text to a .docx file."""
+    async def convert_text_to_word(text: str, output: str) -> None:
+        """Convert plain text to a .docx file written to `output`."""
         doc = Document()
         doc.add_paragraph(text)
-        
-        buffer = io.BytesIO()
-        doc.save(buffer)
-        buffer.seek(0)
-        return buffer.getvalue()
+        doc.save(output)
 
     @staticmethod
     def _convert_docx_to_pdf_sync(temp_docx_path: str, temp_pdf_path: str) -> None:
@@ -34,16 +29,12 @@ class OfficeService:
             pythoncom.CoUninitialize()
 
     @staticmethod
-    async def convert_word_to_pdf(docx_bytes: bytes) -> bytes:
-        """Convert .docx to .pdf (Requires Word installed on Windows)."""
-        # This is tricky because docx2pdf works on files, not streams.
+    async def convert_word_to_pdf(docx_path: str) -> bytes:
+        """Convert a .docx file to .pdf (Requires Word installed on Windows)."""
+        # docx2pdf works on files, not streams, so the upload's file is converted in place.
         # And it requires Word to be installed (which is true for this user).
-        
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".docx") as temp_docx:
-            temp_docx.write(docx_bytes)
-            temp_docx_path = temp_docx.name
-            
-        temp_pdf_path = temp_docx_path.replace(".docx", ".pdf")
+        fd, temp_pdf_path = tempfile.mkstemp(suffix=".pdf")
+        os.close(fd)
         
         try:
             # Run blocking docx2pdf in thread pool to avoid blocking event loop
@@ -51,7 +42,7 @@ class OfficeService:
             await loop.run_in_executor(
                 _executor,
                 OfficeService._convert_docx_to_pdf_sync,
-                temp_docx_path,
+                docx_path,
                 temp_pdf_path
             )
             
@@ -63,7 +54,5 @@ class OfficeService:
             raise Exception(f"Word conversion failed: {str(e)}")
         finally:
             # Cleanup
-            if os.path.exists(temp_docx_path):
-                os.remove(temp_docx_path)
             if os.path.exists(temp_pdf_path):
                 os.remove(temp_pdf_path)
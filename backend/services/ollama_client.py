@@ -1,8 +1,67 @@
 import httpx
 import json
 import asyncio
-from typing import AsyncGenerator
+import re
+import time
+from contextlib import aclosing
+from typing import AsyncGenerator, AsyncIterator
 from backend.config import settings
+from backend.services.image_service import EncodedImage
+from backend.services.ocr_cache import ocr_cache
+from backend.services.model_scheduler import model_scheduler
+from backend.services.markdown_chunker import chunk_markdown, estimate_tokens
+from backend.services.translation_memory import translation_memory, split_segments, join_segments, normalize_segment, HAS_LETTERS_RE
+from backend.utils.concurrency import map_ordered
+from backend.utils.metrics import metrics
+
+_request_seconds = metrics.histogram("ollama_request_duration_seconds", "Time of /api/chat calls once a slot was granted", ("model",))
+_prompt_tokens = metrics.counter("ollama_prompt_tokens_total", "Prompt tokens evaluated, as reported by Ollama", ("model",))
+_eval_tokens = metrics.counter("ollama_eval_tokens_total", "Tokens generated, as reported by Ollama", ("model",))
+_eval_seconds = metrics.counter("ollama_eval_seconds_total", "Time spent generating tokens (eval_duration)", ("model",))
+_prompt_seconds = metrics.counter("ollama_prompt_eval_seconds_total", "Time spent on the prompt (prompt_eval_duration)", ("model",))
+_load_seconds = metrics.counter("ollama_load_seconds_total", "Time spent loading the model (load_duration)", ("model",))
+_tokens_per_second = metrics.histogram(
+    "ollama_eval_tokens_per_second", "Generation speed per call", ("model",),
+    buckets=(1, 2, 5, 10, 20, 30, 50, 75, 100, 150, 200, 300, 500, 1000),
+)
+
+_IMAGE_SLOT = re.compile(r'"@@image(\d+)@@"')
+
+def build_chat_body(model: str, messages: list[dict], stream: bool, options: dict | None = None) -> list[bytes]:
+    """
+    Serializes an /api/chat request as a list of byte chunks. EncodedImage entries in
+    a message's "images" are spliced in as their base64 bytes instead of going
+    through json.dumps as str, so a page is never copied into the JSON text.
+    """
+    images: list[EncodedImage] = []
+
+    def slot(image) -> str:
+        if isinstance(image, EncodedImage):
+            images.append(image)
+            return f"@@image{len(images) - 1}@@"
+        return image
+
+    payload = {
+        "model": model,
+        "messages": [
+            {**m, "images": [slot(image) for image in m["images"]]} if m.get("images") else m
+            for m in messages
+        ],
+        "stream": stream,
+    }
+    if options:
+        payload["options"] = options
+
+    # Quotes inside strings are always escaped, so only our slots match here
+    parts = _IMAGE_SLOT.split(json.dumps(payload, ensure_ascii=False))
+    chunks = [parts[0].encode("utf-8")]
+    for index, text in zip(parts[1::2], parts[2::2]):
+        chunks += (b'"', images[int(index)].b64, b'"', text.encode("utf-8"))
+    return chunks
+
+async def _iter_chunks(chunks: list[bytes]) -> AsyncIterator[bytes]:
+    for chunk in chunks:
+        yield chunk
 
 class OllamaClient:
     # Supported languages for translation - Comprehensive list
@@ -172,63 +231,169 @@ class OllamaClient:
         self.base_url = settings.OLLAMA_BASE_URL
         self.ocr_model = settings.OCR_MODEL
         self.translation_model = settings.TRANSLATION_MODEL
+        self._client: httpx.AsyncClient | None = None
 
-    async def _chat_stream(self, model: str, messages: list[dict], options: dict = None) -> AsyncGenerator[str, None]:
-        url = f"{self.base_url}/api/chat"
-        payload = {
-            "model": model,
-            "messages": messages,
-            "stream": True,
+        self.requests = 0
+        self.request_bytes = 0
+        self.images = 0
+        self.image_bytes = 0
+        self.image_b64_bytes = 0
+
+    def _build_client(self) -> httpx.AsyncClient:
+        timeout = httpx.Timeout(
+            connect=settings.OLLAMA_CONNECT_TIMEOUT,
+            read=settings.OLLAMA_READ_TIMEOUT,
+            write=settings.OLLAMA_READ_TIMEOUT,
+            pool=settings.OLLAMA_READ_TIMEOUT,
+        )
+        limits = httpx.Limits(
+            max_connections=settings.OLLAMA_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.OLLAMA_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=settings.OLLAMA_KEEPALIVE_EXPIRY,
+        )
+        return httpx.AsyncClient(base_url=self.base_url, timeout=timeout, limits=limits)
+
+    async def start(self) -> None:
+        """Open the shared keep-alive connection pool. Called from the app lifespan."""
+        if self._client is None:
+            self._client = self._build_client()
+
+    async def close(self) -> None:
+        """Close the shared connection pool and release its sockets."""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        # Opened lazily as well, so scripts and benchmarks work outside the app lifespan
+        if self._client is None:
+            self._client = self._build_client()
+        return self._client
+
+    def _request_kwargs(self, model: str, messages: list[dict], stream: bool, options: dict | None) -> dict:
+        chunks = build_chat_body(model, messages, stream, options)
+        length = sum(len(chunk) for chunk in chunks)
+
+        self.requests += 1
+        self.request_bytes += length
+        for message in messages:
+            for image in message.get("images") or ():
+                if isinstance(image, EncodedImage):
+                    self.images += 1
+                    self.image_bytes += image.size
+                    self.image_b64_bytes += len(image.b64)
+
+        # A fixed Content-Length keeps httpx from switching to chunked transfer encoding
+        return {
+            "content": chunks[0] if len(chunks) == 1 else _iter_chunks(chunks),
+            "headers": {"Content-Type": "application/json", "Content-Length": str(length)},
         }
-        if options:
-            payload["options"] = options
-
-        async with httpx.AsyncClient(timeout=300.0) as client:
-            async with client.stream("POST", url, json=payload) as response:
-                response.raise_for_status()
-                async for line in response.aiter_lines():
-                    if line:
-                        try:
-                            chunk = json.loads(line)
+
+    @staticmethod
+    def _record_usage(model: str, data: dict) -> None:
+        """Token counts and timings from the final /api/chat message (durations are in ns)."""
+        eval_count = data.get("eval_count") or 0
+        eval_seconds = (data.get("eval_duration") or 0) / 1e9
+        _prompt_tokens.inc(model, value=data.get("prompt_eval_count") or 0)
+        _prompt_seconds.inc(model, value=(data.get("prompt_eval_duration") or 0) / 1e9)
+        _load_seconds.inc(model, value=(data.get("load_duration") or 0) / 1e9)
+        _eval_tokens.inc(model, value=eval_count)
+        _eval_seconds.inc(model, value=eval_seconds)
+        if eval_count and eval_seconds:
+            _tokens_per_second.observe(eval_count / eval_seconds, model)
+
+    def collect_metrics(self):
+        yield "ollama_requests_total", "counter", "Requests sent to /api/chat", [({}, self.requests)]
+        yield "ollama_request_bytes_total", "counter", "Request body bytes sent to Ollama", [({}, self.request_bytes)]
+        yield "ollama_images_total", "counter", "Page images sent to Ollama", [({}, self.images)]
+        yield "ollama_image_bytes_total", "counter", "Encoded image bytes sent (before base64)", [({}, self.image_bytes)]
+
+    def payload_stats(self) -> dict:
+        return {
+            "requests": self.requests,
+            "request_bytes": self.request_bytes,
+            "images": self.images,
+            "image_bytes": self.image_bytes,
+            "image_base64_bytes": self.image_b64_bytes,
+            "avg_image_bytes": round(self.image_bytes / self.images) if self.images else 0,
+        }
+
+    async def _chat_stream(self, model: str, messages: list[dict], options: dict = None) -> AsyncGenerator[str, None]:
+        # The slot is held for the whole generation, which is what occupies the GPU
+        async with model_scheduler.slot(model):
+            request = self._request_kwargs(model, messages, True, options)
+            with metrics.stage("ollama"):
+                start = time.perf_counter()
+                async with self.client.stream("POST", "/api/chat", **request) as response:
+                    response.raise_for_status()
+                    async for line in response.aiter_lines():
+                        if line:
+                            try:
+                                chunk = json.loads(line)
+                            except json.JSONDecodeError:
+                                continue
+                            if chunk.get("done"):
+                                self._record_usage(model, chunk)
                             if "message" in chunk and "content" in chunk["message"]:
                                 yield chunk["message"]["content"]
-                        except json.JSONDecodeError:
-                            continue
+                _request_seconds.observe(time.perf_counter() - start, model)
 
     async def _chat_request(self, model: str, messages: list[dict], options: dict = None) -> str:
-        url = f"{self.base_url}/api/chat"
-        payload = {
-            "model": model,
-            "messages": messages,
-            "stream": False,
-        }
-        if options:
-            payload["options"] = options
+        async with model_scheduler.slot(model):
+            with metrics.stage("ollama"):
+                start = time.perf_counter()
+                response = await self.client.post("/api/chat", **self._request_kwargs(model, messages, False, options))
+                _request_seconds.observe(time.perf_counter() - start, model)
+        response.raise_for_status()
+        data = response.json()
+        self._record_usage(model, data)
+        return data["message"]["content"]
 
-        async with httpx.AsyncClient(timeout=300.0) as client:
-            response = await client.post(url, json=payload)
-            response.raise_for_status()
-            data = response.json()
-            return data["message"]["content"]
-
-    async def ocr_image(self, image_b64: str, prompt: str = "Extract the text from this image.") -> str:
+    async def ocr_image(self, image: EncodedImage, prompt: str = "Extract the text from this image.") -> str:
         messages = [{
             "role": "user",
             "content": prompt,
-            "images": [image_b64]
+            "images": [image]
         }]
-        return await self._chat_request(self.ocr_model, messages)
+        if not ocr_cache.enabled:
+            return await self._chat_request(self.ocr_model, messages)
+
+        key = ocr_cache.make_key(image.sha256, prompt, self.ocr_model)
+        return await ocr_cache.get_or_compute(key, lambda: self._chat_request(self.ocr_model, messages))
 
-    async def ocr_image_stream(self, image_b64: str, prompt: str = "Extract the text from this image.") -> AsyncGenerator[str, None]:
+    async def ocr_image_stream(self, image: EncodedImage, prompt: str = "Extract the text from this image.") -> AsyncGenerator[str, None]:
         messages = [{
             "role": "user",
             "content": prompt,
-            "images": [image_b64]
+            "images": [image]
         }]
-        async for token in self._chat_stream(self.ocr_model, messages):
-            yield token
+        if not ocr_cache.enabled:
+            async for token in self._chat_stream(self.ocr_model, messages):
+                yield token
+            return
 
-    async def translate_text(self, text: str, target_lang: str) -> str:
+        key = ocr_cache.make_key(image.sha256, prompt, self.ocr_model)
+        cached = await ocr_cache.lookup(key)
+        if cached is not None:
+            # Replay the whole cached page as a single chunk
+            yield cached
+            return
+
+        future = ocr_cache.claim(key)
+        tokens = []
+        try:
+            async for token in self._chat_stream(self.ocr_model, messages):
+                tokens.append(token)
+                yield token
+        except BaseException as e:
+            ocr_cache.release(key, future, error=e)
+            raise
+        text = "".join(tokens)
+        ocr_cache.release(key, future, text)
+        await ocr_cache.put(key, text)
+
+    def _resolve_language(self, target_lang: str) -> str:
         # Validate target language
         # Robust matching: try exact match first, then try matching base name before parentheses
         target_code = None
@@ -243,17 +408,119 @@ class OllamaClient:
         if not target_code:
             supported = ", ".join(list(self.SUPPORTED_LANGUAGES.keys())[:20]) + "..."
             raise ValueError(f"Unsupported target language: '{target_lang}'. Closest supported: {supported}")
-        
+        return target_code
+
+    def _translation_prompt(self, text: str, target_lang: str, target_code: str, instructions: str = "") -> str:
         source_lang_name = "English" # Defaulting to English source for simplicity
         source_code = "en"
         
-        prompt = f"""You are a professional {source_lang_name} ({source_code}) to {target_lang} ({target_code}) translator. Your goal is to accurately convey the meaning and nuances of the original {source_lang_name} text while adhering to {target_lang} grammar, vocabulary, and cultural sensitivities.
-Produce only the {target_lang} translation, without any additional explanations or commentary. Please translate the following {source_lang_name} text into {target_lang}:
+        return f"""You are a professional {source_lang_name} ({source_code}) to {target_lang} ({target_code}) translator. Your goal is to accurately convey the meaning and nuances of the original {source_lang_name} text while adhering to {target_lang} grammar, vocabulary, and cultural sensitivities.
+Produce only the {target_lang} translation, without any additional explanations or commentary.{instructions} Please translate the following {source_lang_name} text into {target_lang}:
 
 
 {text}"""
 
-        messages = [{"role": "user", "content": prompt}]
-        return await self._chat_request(self.translation_model, messages)
+    async def translate_text(self, text: str, target_lang: str) -> str:
+        """
+        Translates text in one prompt, or if it is over TRANSLATION_CHUNK_TOKENS, in chunks cut
+        between Markdown blocks that are translated concurrently and put back together in order.
+        """
+        target_code = self._resolve_language(target_lang)
+        chunks = chunk_markdown(text, settings.TRANSLATION_CHUNK_TOKENS)
+        if len(chunks) == 1:
+            prompt = self._translation_prompt(text, target_lang, target_code)
+            return await self._chat_request(self.translation_model, [{"role": "user", "content": prompt}])
+
+        instructions = " Keep the Markdown as it is: every heading, list item and table row stays on its own line, with the same number of | cells."
+
+        async def translate_chunk(chunk: str) -> str:
+            core = chunk.strip()
+            if not HAS_LETTERS_RE.search(core):
+                return chunk  # Numbers, rules, table rows of amounts
+            prompt = self._translation_prompt(core, target_lang, target_code, instructions)
+            translated = await self._chat_request(self.translation_model, [{"role": "user", "content": prompt}])
+            # The whitespace around a chunk is what joins it to its neighbours
+            return chunk[:len(chunk) - len(chunk.lstrip())] + translated.strip() + chunk[len(chunk.rstrip()):]
+
+        async def numbered():
+            for i, chunk in enumerate(chunks):
+                yield i, chunk
+
+        parts = []
+        async with aclosing(map_ordered(numbered(), translate_chunk, settings.TRANSLATION_CHUNK_CONCURRENCY)) as results:
+            async for _, translated, error in results:
+                if error is not None:
+                    raise error
+                parts.append(translated)
+        return "".join(parts)
+
+    async def _translate_batch(self, segments: list[str], target_lang: str) -> list[str]:
+        """Translates several segments in one prompt, using [[n]] markers to split the answer."""
+        if len(segments) == 1:
+            return [await self.translate_text(segments[0], target_lang)]
+
+        target_code = self._resolve_language(target_lang)
+        body = "\n\n".join(f"[[{i}]]\n{segment}" for i, segment in enumerate(segments, 1))
+        instructions = " The text is split into numbered segments. Translate each segment separately and keep every [[n]] marker on its own line, unchanged and in the same order."
+        prompt = self._translation_prompt(body, target_lang, target_code, instructions)
+        reply = await self._chat_request(self.translation_model, [{"role": "user", "content": prompt}])
+
+        parts = re.split(r"^\s*\[\[(\d+)\]\]\s*$", reply, flags=re.MULTILINE)
+        translated = {}
+        for marker, text in zip(parts[1::2], parts[2::2]):
+            translated[int(marker)] = text.strip()
+
+        # Any segment the model merged or dropped is retried on its own
+        missing = [i for i in range(1, len(segments) + 1) if not translated.get(i)]
+        if missing:
+            retries = await asyncio.gather(*(self.translate_text(segments[i - 1], target_lang) for i in missing))
+            translated.update(zip(missing, retries))
+        return [translated[i] for i in range(1, len(segments) + 1)]
+
+    async def translate_markdown(self, text: str, target_lang: str) -> tuple[str, dict]:
+        """
+        Translates a Markdown page through the translation memory.
+        Only segments missing from the memory are sent to the model, in batched prompts.
+        Returns the reassembled page and hit statistics for the request.
+        """
+        if not translation_memory.enabled:
+            translated = await self.translate_text(text, target_lang)
+            return translated, {"segments": 0, "hits": 0, "misses": 0, "hit_rate": 0.0}
+
+        self._resolve_language(target_lang)
+        template, segments = split_segments(text)
+        keys = [normalize_segment(segment) for segment in segments]
+        unique_keys = list(dict.fromkeys(keys))
+
+        known = await translation_memory.lookup(unique_keys, target_lang, self.translation_model)
+        missing = [key for key in unique_keys if key not in known]
+
+        # Group misses into batches bounded by segment count and by the token budget of a
+        # chunk of a long text, so a batched prompt fits the model's context window too
+        batches, batch, batch_tokens = [], [], 0
+        for key in missing:
+            tokens = estimate_tokens(key) + 3  # the "[[n]]" line and the blank line after it
+            if batch and (len(batch) >= settings.TRANSLATION_BATCH_SEGMENTS or batch_tokens + tokens > settings.TRANSLATION_CHUNK_TOKENS):
+                batches.append(batch)
+                batch, batch_tokens = [], 0
+            batch.append(key)
+            batch_tokens += tokens
+        if batch:
+            batches.append(batch)
+
+        results = await asyncio.gather(*(self._translate_batch(b, target_lang) for b in batches))
+        fresh = {key: translated for b, result in zip(batches, results) for key, translated in zip(b, result)}
+        await translation_memory.store(fresh, target_lang, self.translation_model)
+        known.update(fresh)
+
+        hits = sum(1 for key in keys if key not in fresh)
+        stats = {
+            "segments": len(keys),
+            "hits": hits,
+            "misses": len(keys) - hits,
+            "hit_rate": round(hits / len(keys), 4) if keys else 0.0,
+        }
+        return join_segments(template, [known[key] for key in keys]), stats
 
 ollama_client = OllamaClient()
+metrics.collector(ollama_client.collect_metrics)
@@ -0,0 +1,177 @@
+import asyncio
+from collections import OrderedDict
+from typing import AsyncIterator, TypeVar
+import numpy as np
+from PIL import Image
+from backend.config import settings
+from backend.utils.metrics import metrics
+
+# What a page needs before OCR
+BLANK = "blank"          # nothing on it, OCR is skipped
+DUPLICATE = "duplicate"  # repeats an earlier page of the document, gets that page's result
+DISTINCT = "distinct"    # has to be OCR'd
+
+T = TypeVar("T")
+
+# Pages are compared at this size: fine enough for 8pt text, cheap enough to keep a few dozen around
+_SIDE = 512
+_SIGNATURE_BLOCKS = 16
+_BLOCK = 16
+_MAX_SHIFT = 12  # px at twice _SIDE, how far a rescan may be offset (less than a line of text)
+
+class _Page:
+    """Downsampled ink map of a page, plus what is needed to align and pre-match it."""
+
+    def __init__(self, img: Image.Image):
+        gray = img.convert("L")
+        factor = max(1, max(gray.size) // (_SIDE * 2))
+        if factor > 1:
+            gray = gray.reduce(factor)
+        a = np.asarray(gray, dtype=np.float32)
+        # Paper is the bright end of the page, whatever the scanner made of white
+        background = np.percentile(a[::4, ::4], 90)
+        ink = np.clip(background - a, 0, None)
+        # Row/column ink profiles at twice the map size, rescans are aligned on them.
+        # Smoothed, so a sub-pixel offset doesn't look worse than being a whole line off
+        self.rows = _smooth(ink.sum(axis=1))
+        self.cols = _smooth(ink.sum(axis=0))
+        h, w = (a.shape[0] // 2) * 2, (a.shape[1] // 2) * 2
+        small = a[:h, :w].reshape(h // 2, 2, w // 2, 2).mean(axis=(1, 3))
+        self.ink = np.clip(background - small, 0, None)
+        self.coverage = float((self.ink > 48).mean())
+        self.std = float(small.std())
+        # Coarse perceptual signature: ink density of a 16x16 grid
+        n = _SIGNATURE_BLOCKS
+        bh, bw = max(self.ink.shape[0] // n, 1), max(self.ink.shape[1] // n, 1)
+        self.signature = self.ink[:bh * n, :bw * n].reshape(n, bh, n, bw).mean(axis=(1, 3))
+
+    def is_blank(self) -> bool:
+        return self.coverage <= settings.PAGE_BLANK_MAX_INK and self.std <= settings.PAGE_BLANK_MAX_STD
+
+    def signature_distance(self, other: "_Page") -> float:
+        total = self.signature.sum() + other.signature.sum()
+        return float(np.abs(self.signature - other.signature).sum() / max(total, 1e-6))
+
+    def difference(self, other: "_Page") -> float:
+        """
+        Largest mean ink difference of any 16x16 block once `other` is aligned onto this
+        page, so one changed number or signature is enough to keep two pages apart.
+        """
+        a, b = self.ink, other.ink
+        if abs(a.shape[0] - b.shape[0]) > a.shape[0] * 0.02 or abs(a.shape[1] - b.shape[1]) > a.shape[1] * 0.02:
+            return float("inf")
+        dy = _best_shift(self.rows, other.rows) / 2
+        dx = _best_shift(self.cols, other.cols) / 2
+        h, w = min(a.shape[0], b.shape[0]), min(a.shape[1], b.shape[1])
+        diff = np.abs(_blur(a[:h, :w]) - _blur(_shift(b[:h, :w], dy, dx)))
+        h, w = (h // _BLOCK) * _BLOCK, (w // _BLOCK) * _BLOCK
+        return float(diff[:h, :w].reshape(h // _BLOCK, _BLOCK, w // _BLOCK, _BLOCK).mean(axis=(1, 3)).max())
+
+def _smooth(profile: np.ndarray) -> np.ndarray:
+    return np.convolve(profile, np.ones(5, dtype=np.float32) / 5, mode="same")
+
+def _best_shift(a: np.ndarray, b: np.ndarray) -> float:
+    """Offset of profile `b` that best matches `a`, to a fraction of a pixel."""
+    n = min(len(a), len(b))
+    r = min(_MAX_SHIFT, n // 4)
+    a, b = a[:n], b[:n]
+    errors = np.array([np.square(a[r:n - r] - np.roll(b, d)[r:n - r]).sum() for d in range(-r, r + 1)])
+    i = int(np.argmin(errors))
+    if 0 < i < len(errors) - 1:
+        # Vertex of the parabola through the minimum and its neighbours
+        left, mid, right = errors[i - 1:i + 2]
+        curvature = left - 2 * mid + right
+        if curvature > 0:
+            return i - r + float(np.clip((left - right) / (2 * curvature), -0.5, 0.5))
+    return float(i - r)
+
+def _shift(a: np.ndarray, dy: float, dx: float) -> np.ndarray:
+    # Linear interpolation between whole-pixel shifts, offsets are rarely whole at this size
+    for axis, d in ((0, dy), (1, dx)):
+        whole = int(np.floor(d))
+        frac = d - whole
+        a = np.roll(a, whole, axis=axis) if not frac else (1 - frac) * np.roll(a, whole, axis=axis) + frac * np.roll(a, whole + 1, axis=axis)
+    return a
+
+def _blur(a: np.ndarray) -> np.ndarray:
+    # 3x3 box blur with cumulative sums, forgives the last fraction of a pixel of misalignment
+    c = np.cumsum(np.pad(a, ((2, 1), (0, 0)), mode="edge"), axis=0)
+    a = (c[3:] - c[:-3]) / 3
+    c = np.cumsum(np.pad(a, ((0, 0), (2, 1)), mode="edge"), axis=1)
+    return (c[:, 3:] - c[:, :-3]) / 3
+
+class PageFilter:
+    """
+    Pre-OCR classifier for the pages of one document: near-blank pages are skipped and
+    near-duplicates of an earlier page (rescans, repeated covers and boilerplate) get the
+    result of that page, so every distinct page costs a single model call.
+    """
+
+    def __init__(self, enabled: bool | None = None):
+        self.enabled = settings.PAGE_FILTER_ENABLED if enabled is None else enabled
+        self.pages = 0
+        self.blank: list[int] = []
+        self.duplicates: dict[int, int] = {}  # page index -> index of the page it repeats
+        # Distinct pages that later pages are compared with, most recently matched last
+        self._seen: OrderedDict[int, _Page] = OrderedDict()
+
+    @metrics.timed("page_filter")
+    def classify(self, index: int, img: Image.Image) -> str:
+        """Returns BLANK, DUPLICATE or DISTINCT for the page and remembers it."""
+        self.pages += 1
+        if not self.enabled:
+            return DISTINCT
+        page = _Page(img)
+        if page.is_blank():
+            self.blank.append(index)
+            return BLANK
+
+        # The signature only picks candidates, the aligned comparison decides
+        candidates = sorted(
+            (distance, seen) for seen, other in self._seen.items()
+            if (distance := page.signature_distance(other)) <= settings.PAGE_DUPLICATE_MAX_SIGNATURE_DISTANCE
+        )
+        for _, seen in candidates[:settings.PAGE_DUPLICATE_MAX_CANDIDATES]:
+            if self._seen[seen].difference(page) <= settings.PAGE_DUPLICATE_MAX_DIFFERENCE:
+                self.duplicates[index] = seen
+                self._seen.move_to_end(seen)
+                return DUPLICATE
+
+        self._seen[index] = page
+        if len(self._seen) > settings.PAGE_DUPLICATE_WINDOW:
+            self._seen.popitem(last=False)
+        return DISTINCT
+
+    async def aclassify(self, index: int, img: Image.Image) -> str:
+        return await asyncio.to_thread(self.classify, index, img)
+
+    async def distinct(self, pages: AsyncIterator[tuple[int, Image.Image]]) -> AsyncIterator[tuple[int, Image.Image]]:
+        """Passes on only the pages that have to be OCR'd, see fan_out() for the others."""
+        async for index, img in pages:
+            if await self.aclassify(index, img) == DISTINCT:
+                yield index, img
+
+    def original(self, index: int) -> int | None:
+        """Index of the page a duplicate repeats, None for other pages."""
+        return self.duplicates.get(index)
+
+    def fan_out(self, results: dict[int, T]) -> dict[int, T]:
+        """Adds the result of each duplicate's original to `results` (page index -> result)."""
+        for index, original in self.duplicates.items():
+            if original in results:
+                results[index] = results[original]
+        return results
+
+    def stats(self) -> dict:
+        skipped = len(self.blank) + len(self.duplicates)
+        return {
+            "pages": self.pages,
+            "blank_pages": len(self.blank),
+            "duplicate_pages": len(self.duplicates),
+            "ocr_pages": self.pages - skipped,
+        }
+
+    def summary(self) -> str:
+        """Compact form for response headers, e.g. "blank=2, duplicate=5, ocr=40"."""
+        stats = self.stats()
+        return f"blank={stats['blank_pages']}, duplicate={stats['duplicate_pages']}, ocr={stats['ocr_pages']}"
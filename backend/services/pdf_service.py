@@ -1,36 +1,217 @@
+import asyncio
+import os
+import tempfile
+from collections import deque
+from contextlib import aclosing, asynccontextmanager
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator, Iterable, Iterator
+import io
 import pypdfium2 as pdfium
 from PIL import Image
 from backend.config import settings
+from backend.services.image_service import preprocess_image
+from backend.services.tiled_ocr import fit_page
+from backend.services.render_pool import RenderProfile, render_pool, render_page
 
-def render_pdf_to_images(pdf_bytes: bytes) -> list[Image.Image]:
+# Rendering happens in the render pool processes. The few pdfium calls made in this
+# process (page counts) go through one thread, since pdfium is not thread-safe.
+_pdfium_thread = ThreadPoolExecutor(max_workers=1, thread_name_prefix="pdfium")
+
+# Render profiles: what the rendered pages are used for
+TEXT = "text"            # OCR of running text (also translation)
+TABLE = "table"          # OCR of tables
+THUMBNAIL = "thumbnail"  # page images returned to the user (pdf-to-jpg & co.)
+
+def render_profile(name: str = TEXT) -> RenderProfile:
+    """Pixel budget and color mode configured for a kind of page consumer."""
+    max_px, grayscale = {
+        TEXT: (settings.RENDER_TEXT_MAX_PX, settings.RENDER_TEXT_GRAYSCALE),
+        TABLE: (settings.RENDER_TABLE_MAX_PX, settings.RENDER_TABLE_GRAYSCALE),
+        THUMBNAIL: (settings.RENDER_THUMBNAIL_MAX_PX, settings.RENDER_THUMBNAIL_GRAYSCALE),
+    }[name]
+    # Calculate scale factor (PDF points are 1/72 inch)
+    # scale = desired_dpi / 72, PDF_DPI is the ceiling for small pages
+    # Tall pages keep a readable width for text OCR, which tiles them
+    min_width_px = settings.RENDER_TEXT_MIN_WIDTH_PX if name == TEXT and settings.OCR_TILING_ENABLED else 0
+    return RenderProfile(max_px=max_px, max_scale=settings.PDF_DPI / 72.0, grayscale=grayscale, min_width_px=min_width_px)
+
+def parse_page_range(spec: str, page_count: int) -> list[int]:
     """
-    Renders each page of a PDF bytes object into a PIL Image.
-    Uses the configured DPI setting.
+    Turns a 1-based page range such as "1-3,7,10-" into 0-based page indexes.
+    An empty spec selects every page.
     """
-    images = []
-    pdf = None
-    
+    if not spec or not spec.strip():
+        return list(range(page_count))
+
+    indexes = []
+    for part in spec.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        if "-" in part:
+            start, end = part.split("-", 1)
+            first = int(start) if start.strip() else 1
+            last = int(end) if end.strip() else page_count
+        else:
+            first = last = int(part)
+        if first < 1 or last > page_count or first > last:
+            raise ValueError(f"Invalid page range '{part}' for a {page_count}-page document")
+        indexes.extend(range(first - 1, last))
+    return list(dict.fromkeys(indexes))
+
+def iter_pdf_pages(pdf_bytes: bytes, pages: Iterable[int] | None = None, profile: str = TEXT) -> Iterator[tuple[int, Image.Image]]:
+    """
+    Lazily renders PDF pages one at a time, yielding (page_index, image).
+    Only the page being consumed is held in memory.
+    """
+    pdf = pdfium.PdfDocument(pdf_bytes)
     try:
-        # Calculate scale factor (PDF points are 1/72 inch)
-        # scale = desired_dpi / 72
-        scale = settings.PDF_DPI / 72.0
-        
-        pdf = pdfium.PdfDocument(pdf_bytes)
-        
-        for i in range(len(pdf)):
-            page = pdf[i]
-            # Render to PIL Image
-            # rev=True means standard RGBA
-            bitmap = page.render(scale=scale) 
-            pil_image = bitmap.to_pil()
-            # Convert to RGB to ensure compatibility
-            if pil_image.mode != "RGB":
-                pil_image = pil_image.convert("RGB")
-                
-            images.append(pil_image)
+        indexes = range(len(pdf)) if pages is None else pages
+        for index in indexes:
+            yield index, render_page(pdf, index, render_profile(profile))
     finally:
         # Ensure PDF document is properly closed to free resources
-        if pdf is not None:
+        pdf.close()
+
+def render_pdf_to_images(pdf_bytes: bytes, profile: str = TEXT) -> list[Image.Image]:
+    """
+    Renders each page of a PDF bytes object into a PIL Image.
+    Uses the given render profile. Holds every page in memory,
+    prefer aiter_pdf_pages for anything that processes pages one by one.
+    """
+    return [image for _, image in iter_pdf_pages(pdf_bytes, profile=profile)]
+
+@asynccontextmanager
+async def pdf_path(source: bytes | str) -> AsyncIterator[str]:
+    """
+    Yields a file path the render workers can open. In-memory bytes are spooled
+    to a temp file once, instead of being pickled to a worker for every page.
+    """
+    if not isinstance(source, (bytes, bytearray, memoryview)):
+        yield os.fspath(source)
+        return
+
+    fd, path = tempfile.mkstemp(suffix=".pdf", prefix="docintel_render_")
+    try:
+        def spool():
+            with os.fdopen(fd, "wb") as f:
+                f.write(source)
+
+        await asyncio.to_thread(spool)
+        yield path
+    finally:
+        try:
+            os.remove(path)
+        except OSError:
+            pass  # Ignore cleanup errors
+
+async def count_pdf_pages(source: bytes | str) -> int:
+    def count() -> int:
+        pdf = pdfium.PdfDocument(source)
+        try:
+            return len(pdf)
+        finally:
             pdf.close()
-        
-    return images
+
+    return await asyncio.get_running_loop().run_in_executor(_pdfium_thread, count)
+
+async def render_pdf_page(source: bytes | str, index: int = 0, profile: str = THUMBNAIL) -> Image.Image:
+    """Renders a single page in the render pool without touching the rest of the document."""
+    async with pdf_path(source) as path:
+        return await render_pool.render(path, index, render_profile(profile))
+
+async def analyze_pdf_text(source: bytes | str, pages: Iterable[int] | None = None) -> list[dict]:
+    """
+    Text layer analysis for each page (see render_pool.analyze_text_layer), in page order.
+    Pages are split into chunks so large documents are analyzed by several workers at once.
+    """
+    async with pdf_path(source) as path:
+        indexes = list(range(await count_pdf_pages(path)) if pages is None else pages)
+        chunks = [indexes[i:i + 32] for i in range(0, len(indexes), 32)]
+        results = await asyncio.gather(*(
+            render_pool.analyze(path, chunk, settings.TEXT_LAYER_MIN_CHARS, settings.TEXT_LAYER_MIN_COVERAGE)
+            for chunk in chunks
+        ))
+    return [page for chunk in results for page in chunk]
+
+async def aiter_pdf_pages(
+    source: bytes | str,
+    pages: Iterable[int] | None = None,
+    lookahead: int | None = None,
+    parallelism: int | None = None,
+    profile: str = TEXT,
+) -> AsyncIterator[tuple[int, Image.Image]]:
+    """
+    Streams (page_index, image) pairs rendered by the render pool processes.
+    `source` is PDF bytes or a file path. Up to `parallelism` pages of this document
+    render at the same time, and at most `lookahead` pages are held ahead of the
+    consumer, so memory depends on concurrency, not on document length.
+    Pages are rendered straight at the pixel budget of the render `profile`.
+    Use contextlib.aclosing() when the consumer may stop early.
+    """
+    lookahead = settings.PDF_RENDER_LOOKAHEAD if lookahead is None else max(lookahead, 0)
+    parallelism = settings.RENDER_JOB_PARALLELISM if parallelism is None else max(parallelism, 1)
+    render_settings = render_profile(profile)
+
+    async with pdf_path(source) as path:
+        if pages is None:
+            pages = range(await count_pdf_pages(path))
+        indexes = iter(pages)
+        pending: deque[tuple[int, asyncio.Task]] = deque()
+        closed = False
+
+        def fill(_=None) -> None:
+            while not closed and len(pending) <= lookahead:
+                if sum(1 for _, task in pending if not task.done()) >= parallelism:
+                    return
+                index = next(indexes, None)
+                if index is None:
+                    return
+                task = asyncio.ensure_future(render_pool.render(path, index, render_settings))
+                # A finished render frees a slot for the next page
+                task.add_done_callback(fill)
+                pending.append((index, task))
+
+        fill()
+        try:
+            while pending:
+                index, task = pending[0]
+                image = await task
+                pending.popleft()
+                fill()
+                yield index, image
+        finally:
+            closed = True
+            for _, task in pending:
+                task.cancel()
+            await asyncio.gather(*(task for _, task in pending), return_exceptions=True)
+
+def _open_image(source: bytes | str) -> Image.Image:
+    image = Image.open(io.BytesIO(source) if isinstance(source, (bytes, bytearray)) else source)
+    image.load()  # decode now so a file source is closed again
+    return image
+
+async def aiter_document_pages(
+    source: bytes | str,
+    content_type: str,
+    pages: Iterable[int] | None = None,
+    profile: str = TEXT,
+) -> AsyncIterator[tuple[int, Image.Image]]:
+    """
+    Streams the pages of an uploaded PDF, or the single preprocessed image of an image upload.
+    `source` is the upload's bytes or a file path.
+    """
+    if content_type == "application/pdf":
+        async with aclosing(aiter_pdf_pages(source, pages, profile=profile)) as pdf_pages:
+            async for index, image in pdf_pages:
+                yield index, image
+    else:
+        image = _open_image(source)
+        max_dim = render_profile(profile).max_px or 2048
+        # Text OCR cuts tall and large images into bands instead of shrinking them
+        yield 0, fit_page(image, max_dim) if profile == TEXT else preprocess_image(image, max_dim)
+
+async def count_document_pages(source: bytes | str, content_type: str) -> int:
+    if content_type == "application/pdf":
+        return await count_pdf_pages(source)
+    return 1
@@ -0,0 +1,237 @@
+import asyncio
+import ctypes
+import multiprocessing
+import os
+import unicodedata
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from typing import NamedTuple
+import pypdfium2 as pdfium
+from PIL import Image
+from backend.config import settings
+from backend.utils.metrics import metrics
+
+class RenderProfile(NamedTuple):
+    """How to rasterize pages for one kind of consumer (OCR text, tables, thumbnails)."""
+    max_px: int        # longest side of the output in pixels, 0 = only max_scale applies
+    max_scale: float   # upper bound in pixels per PDF point (PDF_DPI / 72)
+    grayscale: bool    # render 8-bit grayscale straight from pdfium
+    min_width_px: int = 0  # tall pages are never narrower than this (max_scale still applies), 0 = off
+
+# --- Worker side (runs inside the pool processes) ---
+
+def page_scale(page: pdfium.PdfPage, profile: RenderProfile) -> float:
+    """
+    Scale that lands the page directly at the profile's pixel budget, so nothing
+    is rendered at full DPI only to be downscaled afterwards.
+    """
+    scale = profile.max_scale
+    if profile.max_px:
+        scale = min(scale, profile.max_px / max(page.get_size()))
+    if profile.min_width_px:
+        # Receipts and other strips would be squashed to a sliver, they are OCR'd in bands instead
+        scale = max(scale, min(profile.max_scale, profile.min_width_px / page.get_width()))
+    return scale
+
+def _to_output_mode(image: Image.Image) -> Image.Image:
+    # Callers get RGB, or L for grayscale profiles
+    return image if image.mode in ("RGB", "L") else image.convert("RGB")
+
+def render_page(pdf: pdfium.PdfDocument, index: int, profile: RenderProfile) -> Image.Image:
+    page = pdf[index]
+    try:
+        # rev_byteorder gives RGB directly instead of pdfium's native BGR
+        bitmap = page.render(scale=page_scale(page, profile), grayscale=profile.grayscale, rev_byteorder=True)
+        return _to_output_mode(bitmap.to_pil())
+    finally:
+        page.close()
+
+_CHANNELS = {
+    pdfium.raw.FPDFBitmap_Gray: 1,
+    pdfium.raw.FPDFBitmap_BGR: 3,
+    pdfium.raw.FPDFBitmap_BGRx: 4,
+    pdfium.raw.FPDFBitmap_BGRA: 4,
+}
+
+def _render_to_shared_memory(path: str, index: int, profile: RenderProfile) -> tuple[str, str, tuple[int, int], int]:
+    """
+    Renders one page straight into a shared memory block, so only the block name
+    crosses the process boundary instead of a pickled bitmap.
+    The document is opened per page: pdfium loads lazily, and it keeps no file
+    handle open between jobs (which would block temp file cleanup on Windows).
+    """
+    blocks = []
+
+    def shared_bitmap(width, height, format, rev_byteorder):
+        channels = _CHANNELS[format]
+        block = shared_memory.SharedMemory(create=True, size=width * height * channels)
+        blocks.append(block)
+        buffer = (ctypes.c_ubyte * block.size).from_buffer(block.buf)
+        return pdfium.PdfBitmap.new_native(width, height, format, rev_byteorder, buffer=buffer)
+
+    pdf = pdfium.PdfDocument(path)
+    try:
+        page = pdf[index]
+        try:
+            bitmap = page.render(
+                scale=page_scale(page, profile),
+                grayscale=profile.grayscale,
+                rev_byteorder=True,
+                bitmap_maker=shared_bitmap,
+            )
+            result = (blocks[0].name, bitmap.mode, (bitmap.width, bitmap.height), bitmap.stride * bitmap.height)
+            # Drop the ctypes view on the block so it can be closed
+            del bitmap
+        finally:
+            page.close()
+    except BaseException:
+        for block in blocks:
+            block.close()
+            block.unlink()
+        raise
+    finally:
+        pdf.close()
+
+    blocks[0].close()
+    return result
+
+def _box_area(left: float, bottom: float, right: float, top: float) -> float:
+    return max(right - left, 0) * max(top - bottom, 0)
+
+def _garbage_ratio(text: str) -> float:
+    # Fonts without a usable ToUnicode map extract as replacement, private-use or control characters
+    visible = [ch for ch in text if not ch.isspace()]
+    if not visible:
+        return 0.0
+    bad = sum(1 for ch in visible if ch == "\ufffd" or unicodedata.category(ch) in ("Co", "Cc", "Cs"))
+    return bad / len(visible)
+
+def analyze_text_layer(page: pdfium.PdfPage, min_chars: int, min_coverage: float) -> dict:
+    """
+    Decides whether a page's embedded text can be used instead of OCR.
+    A page needs enough characters, mostly decodable ones, and it must not be a scan
+    with only a few words of text on top (stamps, page numbers, partial OCR layers).
+    """
+    page_area = max(_box_area(0, 0, *page.get_size()), 1.0)
+    textpage = page.get_textpage()
+    try:
+        chars = textpage.count_chars()
+        text = textpage.get_text_range() if chars else ""
+        text_area = sum(_box_area(*textpage.get_rect(i)) for i in range(textpage.count_rects()))
+    finally:
+        textpage.close()
+    image_area = sum(_box_area(*obj.get_bounds()) for obj in page.get_objects(filter=(pdfium.raw.FPDF_PAGEOBJ_IMAGE,)))
+
+    text_coverage = min(text_area / page_area, 1.0)
+    image_coverage = min(image_area / page_area, 1.0)
+    usable = (
+        chars >= min_chars
+        and _garbage_ratio(text) <= 0.1
+        and not (image_coverage >= 0.5 and text_coverage < min_coverage)
+    )
+    return {
+        "chars": chars,
+        "text_coverage": round(text_coverage, 4),
+        "image_coverage": round(image_coverage, 4),
+        "image_only": chars == 0 and image_area > 0,
+        "usable": usable,
+        "text": text.replace("\r\n", "\n").strip(),
+    }
+
+def _analyze_pages(path: str, indexes: list[int] | None, min_chars: int, min_coverage: float) -> list[dict]:
+    pdf = pdfium.PdfDocument(path)
+    try:
+        results = []
+        for index in range(len(pdf)) if indexes is None else indexes:
+            page = pdf[index]
+            try:
+                results.append({"index": index, **analyze_text_layer(page, min_chars, min_coverage)})
+            finally:
+                page.close()
+        return results
+    finally:
+        pdf.close()
+
+def _count_pages(path: str) -> int:
+    pdf = pdfium.PdfDocument(path)
+    try:
+        return len(pdf)
+    finally:
+        pdf.close()
+
+# --- Event loop side ---
+
+def _image_from_shared_memory(name: str, mode: str, size: tuple[int, int], length: int) -> Image.Image:
+    block = shared_memory.SharedMemory(name=name)
+    try:
+        view = block.buf[:length]
+        try:
+            image = Image.frombytes(mode, size, view)
+        finally:
+            view.release()
+    finally:
+        block.close()
+        block.unlink()
+    # Same contract as render_page
+    return _to_output_mode(image)
+
+def _discard_shared_memory(future) -> None:
+    if future.cancelled() or future.exception() is not None:
+        return
+    block = shared_memory.SharedMemory(name=future.result()[0])
+    block.close()
+    block.unlink()
+
+class RenderPool:
+    """
+    Process pool that rasterizes PDF pages away from the event loop.
+    pdfium is not safe to drive from several threads, so each worker process
+    owns its own pdfium instance and pages are handed back via shared memory.
+    """
+
+    def __init__(self, workers: int):
+        self.workers = workers or os.cpu_count() or 1
+        self._executor: ProcessPoolExecutor | None = None
+
+    def start(self) -> None:
+        if self._executor is None:
+            # spawn: forking a process that already runs an event loop and threads is not safe
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+
+    @property
+    def executor(self) -> ProcessPoolExecutor:
+        # Started lazily as well, so scripts and benchmarks work outside the app lifespan
+        if self._executor is None:
+            self.start()
+        return self._executor
+
+    async def count_pages(self, path: str) -> int:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, _count_pages, path)
+
+    async def analyze(self, path: str, indexes: list[int] | None, min_chars: int, min_coverage: float) -> list[dict]:
+        """Text layer analysis (see analyze_text_layer) for several pages in one worker call."""
+        loop = asyncio.get_running_loop()
+        with metrics.stage("text_layer"):
+            return await loop.run_in_executor(self.executor, _analyze_pages, path, indexes, min_chars, min_coverage)
+
+    async def render(self, path: str, index: int, profile: RenderProfile) -> Image.Image:
+        with metrics.stage("render"):
+            future = self.executor.submit(_render_to_shared_memory, path, index, profile)
+            try:
+                result = await asyncio.wrap_future(future)
+            except asyncio.CancelledError:
+                # A render already running still finishes, free its block when it does
+                future.add_done_callback(_discard_shared_memory)
+                raise
+            return _image_from_shared_memory(*result)
+
+render_pool = RenderPool(workers=settings.RENDER_POOL_WORKERS)
@@ -1,35 +1,227 @@
+import re
+import numpy as np
 import pandas as pd
+from backend.utils.metrics import metrics
+
+_NON_WORD = re.compile(r"[^\w]+")
+_UNNAMED = re.compile(r"Unnamed: \d+")
+# A header cell that is really data: amounts, counts, dates, percentages
+_DATA_CELL = re.compile(r"[-+(]?[$€£]?\d[\d,.\s/:-]*\)?%?")
+
+def _normalize(name) -> str:
+    name = str(name)
+    if _UNNAMED.fullmatch(name):
+        return ""
+    return _NON_WORD.sub(" ", name.lower()).strip()
+
+def header_fingerprint(df: pd.DataFrame) -> tuple[str, ...] | None:
+    """Normalized column names (case, punctuation and blanks ignored); None if every name is blank."""
+    fingerprint = tuple(_normalize(name) for name in df.columns)
+    return fingerprint if any(fingerprint) else None
+
+def _is_empty(values: np.ndarray) -> bool:
+    if values.dtype.kind == "f":
+        return bool(np.isnan(values).all())
+    if values.dtype.kind != "O" or not len(values):
+        return not len(values)
+    first = values[0]
+    if isinstance(first, str) or (first is not None and first == first):
+        return False  # Usual case, no need to look at the rest
+    return bool(pd.isna(values).all())
+
+def type_signature(df: pd.DataFrame) -> str:
+    """One letter per column: n(umeric), t(ext) or e(mpty)."""
+    return "".join(
+        "e" if _is_empty(column.to_numpy()) else "n" if pd.api.types.is_numeric_dtype(column.dtype) else "t"
+        for _, column in df.items()
+    )
+
+def _compatible(a: str, b: str) -> bool:
+    return len(a) == len(b) and all(x == y or "e" in (x, y) for x, y in zip(a, b))
+
+def _combine(a: str, b: str) -> str:
+    return "".join(y if x == "e" else x for x, y in zip(a, b))
+
+def _header_is_data(df: pd.DataFrame) -> bool:
+    # A continuation page without a header: the parser took its first row as the header
+    cells = [str(name) for name in df.columns if not _UNNAMED.fullmatch(str(name))]
+    numeric = sum(1 for cell in cells if _DATA_CELL.fullmatch(cell.strip()))
+    return numeric > 0 and numeric * 2 >= len(cells)
+
+def _header_row(df: pd.DataFrame, columns: list) -> pd.DataFrame:
+    """The header of a headerless fragment as its first data row, typed like its body `df`."""
+    row = {}
+    for name, original, i in zip(columns, df.columns, range(df.shape[1])):
+        value = None if _UNNAMED.fullmatch(str(original)) else str(original)
+        if value is not None and pd.api.types.is_numeric_dtype(df.iloc[:, i].dtype):
+            try:
+                number = float(value.replace(",", ""))
+                value = int(number) if number.is_integer() and pd.api.types.is_integer_dtype(df.iloc[:, i].dtype) else number
+            except ValueError:
+                pass
+        row[name] = [value]
+    return pd.DataFrame(row)
+
+def _repeated_header_rows(df: pd.DataFrame, fingerprint: tuple[str, ...]) -> np.ndarray | None:
+    """Mask of body rows that repeat the header (e.g. at a page break), or None if there are none."""
+    columns = [column for _, column in df.items()]
+    named = [(columns[i], name) for i, name in enumerate(fingerprint) if name]
+    if not named or any(pd.api.types.is_numeric_dtype(column.dtype) for column, _ in named):
+        return None  # A header row would have made these text columns
+    # Narrowed down on the first named column, the rest only check those rows.
+    # Plain loops: most fragments are a page of rows, where pandas calls cost more than the work.
+    candidates = range(len(df))
+    for column, name in named:
+        values = column.to_numpy()
+        candidates = [j for j in candidates if isinstance(values[j], str) and _normalize(values[j]) == name]
+        if not candidates:
+            return None
+    mask = np.zeros(len(df), dtype=bool)
+    mask[candidates] = True
+    return mask
+
+def _retype(df: pd.DataFrame) -> pd.DataFrame:
+    """Numeric again for text columns that were only text because of a repeated header row."""
+    numeric = {}
+    for name, column in df.items():
+        if column.dtype != object:
+            continue
+        cells = [v.replace(",", "") if isinstance(v, str) else "nan" for v in column.to_numpy()]
+        # Same order as the parser: integers, then floats
+        for dtype in (np.int64, np.float64):
+            try:
+                numeric[name] = np.array(cells, dtype=dtype)
+                break
+            except (ValueError, OverflowError):
+                pass
+    return df.assign(**numeric) if numeric and df.columns.is_unique else df
+
+class _Group:
+    def __init__(self, index: int, df: pd.DataFrame, fingerprint, signature: str, page: int):
+        self.index = index
+        self.columns = list(df.columns)
+        self.fingerprint = fingerprint
+        self.signature = signature
+        self.last_page = page
+        self.frames: list[pd.DataFrame] = []
+
+class TableMerger:
+    """
+    Merges tables continued across pages, one table at a time. A fragment continues a
+    table from the same or the previous page when its header fingerprint and column
+    types match, or when its "header" is really a data row of a table with the same
+    width and types. Fragments are grouped as they come and every group is concatenated
+    once by merged(); repeated header rows in the body are dropped. The inputs aren't modified.
+    """
+
+    def __init__(self):
+        self.groups: list[_Group] = []
+        self.decisions: list[dict] = []
+        self._open_groups: dict[tuple, _Group] = {}
+        # Groups by last use, most recent last
+        self._recent: dict[int, _Group] = {}
+
+    def add(self, df: pd.DataFrame, page: int | None = None) -> dict:
+        """
+        Adds the next table, in page order. `page` defaults to one page per table (i.e.
+        only consecutive tables merge). Returns the merge decision for the table.
+        """
+        if page is None:
+            page = len(self.decisions) + 1
+        groups, open_groups, recent = self.groups, self._open_groups, self._recent
+        fingerprint = header_fingerprint(df)
+        headerless = _header_is_data(df)
+        last = None
+        if headerless:
+            # The table it continues: the latest one on this or the previous page with the same width
+            for candidate in reversed(recent.values()):
+                if candidate.last_page < page - 1:
+                    break
+                if len(candidate.columns) == df.shape[1]:
+                    last = candidate
+                    break
+
+        # Repeated header rows go first, they would make numeric columns look like text
+        frame, repeated = df, 0
+        header = last.fingerprint if headerless and last is not None else fingerprint
+        if header is not None and len(header) == df.shape[1]:
+            mask = _repeated_header_rows(df, header)
+            if mask is not None:
+                repeated = int(mask.sum())
+                frame = _retype(df[~mask])
+        signature = type_signature(frame)
+
+        group, action, reason = None, "new", "different header"
+        if headerless:
+            if last is None:
+                reason = "header row looks like data, but no table of that width on the previous page"
+            elif not _compatible(last.signature, signature):
+                reason = "header row looks like data, but column types differ"
+            else:
+                group, action, reason = last, "continued_headerless", "header row looks like data, same width and column types"
+        elif fingerprint is not None and fingerprint in open_groups:
+            candidate = open_groups[fingerprint]
+            if candidate.last_page < page - 1:
+                reason = "same header, but not on the previous page"
+            elif not _compatible(candidate.signature, signature):
+                reason = "same header, but column types differ"
+            else:
+                group, action, reason = candidate, "continued", "same header and column types"
+        elif not groups:
+            reason = "first table"
+
+        if group is None:
+            group = _Group(len(groups), df, fingerprint, signature, page)
+            groups.append(group)
+            if fingerprint is not None:
+                open_groups[fingerprint] = group
+
+        if action == "continued_headerless":
+            group.frames.append(_header_row(frame, group.columns))
+        if list(frame.columns) != group.columns:
+            frame = frame.set_axis(group.columns, axis=1)
+        group.frames.append(frame)
+        group.signature = _combine(group.signature, signature)
+        group.last_page = page
+        recent.pop(group.index, None)
+        recent[group.index] = group
+
+        decision = {
+            "table": len(self.decisions) + 1,
+            "page": page,
+            "merged_into": group.index + 1,
+            "action": action,
+            "reason": reason,
+            "rows": len(frame) + 1 if action == "continued_headerless" else len(frame),
+            "repeated_header_rows": repeated,
+        }
+        self.decisions.append(decision)
+        return decision
+
+    def merged(self) -> list[pd.DataFrame]:
+        """The merged tables so far, one per group."""
+        merged = []
+        for group in self.groups:
+            frames = [frame for frame in group.frames if not frame.empty] or group.frames[:1]
+            merged.append(frames[0].reset_index(drop=True) if len(frames) == 1 else pd.concat(frames, ignore_index=True))
+        return merged
+
+@metrics.timed("merge_tables")
+def merge_tables_with_report(tables: list[pd.DataFrame], pages: list[int] | None = None) -> tuple[list[pd.DataFrame], list[dict]]:
+    """
+    Merges a document's tables in one go, see TableMerger. `pages` gives the page of
+    each table. Returns the merged tables and one decision per input table.
+    """
+    if pages is None:
+        pages = list(range(1, len(tables) + 1))
+    merger = TableMerger()
+    for df, page in zip(tables, pages):
+        merger.add(df, page)
+    return merger.merged(), merger.decisions
 
 def merge_tables(tables: list[pd.DataFrame]) -> list[pd.DataFrame]:
     """
     Merges a list of DataFrames based on header similarity.
     Useful for reconstructing multi-page tables.
     """
-    if not tables:
-        return []
-
-    merged_tables = []
-    current_master = tables[0]
-
-    for i in range(1, len(tables)):
-        next_table = tables[i]
-        
-        # Scenario A: Exact Header Match (Continuation with repeated header)
-        if list(current_master.columns) == list(next_table.columns):
-            current_master = pd.concat([current_master, next_table], ignore_index=True)
-        
-        # Scenario B: Column Count Match (Continuation without header, or different header names but same structure)
-        # This is risky. We only do this if the column count is identical.
-        elif len(current_master.columns) == len(next_table.columns):
-             # Assume next_table lacks proper header or has garbage header
-             # We align syntax: assign master columns to next_table
-             next_table.columns = current_master.columns
-             current_master = pd.concat([current_master, next_table], ignore_index=True)
-        
-        # Scenario C: Mismatch -> New Table
-        else:
-            merged_tables.append(current_master)
-            current_master = next_table
-
-    merged_tables.append(current_master)
-    return merged_tables
+    return merge_tables_with_report(tables)[0]
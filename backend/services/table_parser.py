@@ -1,74 +1,245 @@
-import pandas as pd
-import io
 import re
+import numpy as np
+import pandas as pd
+from backend.utils.metrics import metrics
 
-def parse_markdown_tables(md_text: str) -> list[pd.DataFrame]:
+# The |---|:---:| row under the header
+_ALIGN_ROW = re.compile(r"\|[\s:|-]*-[\s:|-]*")
+# 1,234,567.89 style numbers, commas are dropped before numeric inference
+_GROUPED_NUMBER = r"[-+]?\d{1,3}(?:,\d{3})+(?:\.\d+)?"
+_LINE_BREAK = re.compile(r"<br\s*/?>", re.IGNORECASE)
+
+def split_row(line: str) -> tuple[list[str], bool]:
     """
-    Extracts Markdown tables from text and converts them to DataFrames.
-    Handlers standard pipe-separated tables.
+    Splits one table line into stripped cells. `\\|` is a literal pipe and pipes inside
+    `inline code` don't split. Also returns whether the line was closed by a pipe.
     """
-    tables = []
-    lines = md_text.split('\n')
-    current_table_lines = []
-    in_table = False
+    line = line.strip()
+    if line.startswith("|"):
+        line = line[1:]
+    closed = line.endswith("|") and not line.endswith("\\|")
+    if closed:
+        line = line[:-1]
 
-    for line in lines:
-        stripped = line.strip()
-        # Simple heuristic: a table line starts and ends with |
-        if stripped.startswith('|') and stripped.endswith('|'):
-            # Check if it's a separator line (e.g., |---|---|)
-            if re.match(r'^\|[\s-:]+(\|[\s-:]+)+\|$', stripped):
-                if not in_table:
-                    # If we hit a separator but weren't "in" a table, the previous line was likely the header
-                    # But if we are accumulating, we just skip this line as pandas handles headers
-                    pass
-                continue
-            
-            in_table = True
-            current_table_lines.append(stripped)
+    if "\\" not in line and "`" not in line:
+        return [cell.strip() for cell in line.split("|")], closed
+
+    # Slow path, character by character. An unbalanced backtick is taken literally.
+    code_spans = line.count("`") % 2 == 0
+    cells, buf, in_code = [], [], False
+    i, n = 0, len(line)
+    while i < n:
+        ch = line[i]
+        if ch == "\\" and i + 1 < n and line[i + 1] == "|":
+            buf.append("|")
+            i += 2
+            continue
+        if ch == "`" and code_spans:
+            in_code = not in_code
+        elif ch == "|" and not in_code:
+            cells.append("".join(buf).strip())
+            buf = []
+            i += 1
+            continue
+        buf.append(ch)
+        i += 1
+    cells.append("".join(buf).strip())
+    return cells, closed
+
+def _column_names(header: list[str]) -> list[str]:
+    # Same naming as pandas.read_csv: "Unnamed: n" for blanks, "name.1" for repeats
+    names, seen = [], {}
+    for i, name in enumerate(header):
+        name = name or f"Unnamed: {i}"
+        if name in seen:
+            seen[name] += 1
+            name = f"{name}.{seen[name]}"
         else:
-            if in_table:
-                # Table ended
-                if current_table_lines:
-                    try:
-                        df = _convert_lines_to_df(current_table_lines)
-                        if not df.empty:
-                            tables.append(df)
-                    except Exception as e:
-                        print(f"Failed to parse table block: {e}")
-                current_table_lines = []
-                in_table = False
-
-    # Handle case where text ends with a table
-    if in_table and current_table_lines:
-         try:
-            df = _convert_lines_to_df(current_table_lines)
+            seen[name] = 0
+        names.append(name)
+    return names
+
+def _to_numbers(values, dtype) -> np.ndarray | None:
+    # numpy parses the strings in C and gives up at the first one that isn't a number
+    try:
+        return np.array(values, dtype=dtype)
+    except (ValueError, OverflowError):
+        return None
+
+def _infer_column(values: tuple[str, ...]) -> pd.Series:
+    """Numeric when every non-empty cell is a number, text otherwise. Empty cells become NaN."""
+    if "" not in values:
+        numbers = _to_numbers(values, np.int64)
+        if numbers is not None:
+            return pd.Series(numbers)
+    cells = ["nan" if v == "" else v for v in values]
+    numbers = _to_numbers(cells, np.float64)
+    if numbers is not None:
+        return pd.Series(numbers)
+
+    # Thousands separators only get the slower regex pass
+    series = pd.Series(values, dtype=object)
+    empty = series == ""
+    if empty.all():
+        return pd.Series(np.nan, index=series.index)
+    if "," in "".join(values):
+        text = series.astype(str)
+        grouped = text.str.fullmatch(_GROUPED_NUMBER)
+        if grouped.any():
+            text = text.where(~grouped, text.str.replace(",", "", regex=False))
+            numeric = pd.to_numeric(text.where(~empty, None), errors="coerce")
+            if (numeric.notna() | empty).all():
+                return numeric
+    return series.where(~empty, np.nan)
+
+class _TableBuilder:
+    """Collects the cells of one table, padded to the table width, until it ends."""
+
+    def __init__(self, header: list[str]):
+        self.header = header
+        self.header_row = list(header)
+        self.rows: list[list[str]] = []
+        # Last row, kept while it may still be continued on the next line
+        self.last_line: str | None = None
+        self.last_short = False
+        # Row tracking (MarkdownTableParser.take_rows): table number and rows handed out so far
+        self.number: int | None = None
+        self.taken = 0
+
+    def add_row(self, line: str) -> None:
+        cells, closed = split_row(line)
+        self.last_line = None
+        if cells == self.header_row:
+            # Header repeated by the model (e.g. at a page break)
+            return
+        width = len(self.header)
+        short = len(cells) < width
+        if len(cells) > width:
+            if any(cells[width:]):
+                # Ragged row with extra cells: widen the table
+                extra = [""] * (len(cells) - width)
+                self.header.extend(extra)
+                for row in self.rows:
+                    row.extend(extra)
+            else:
+                del cells[width:]
+        elif short:
+            cells.extend([""] * (width - len(cells)))
+        self.rows.append(cells)
+        if not closed:
+            self.last_line = line
+            self.last_short = short
+
+    def continues_row(self, line: str) -> bool:
+        """Whether a line without a leading pipe is the wrapped rest of the last row."""
+        return self.last_line is not None and (self.last_short or "|" in line)
+
+    def continue_row(self, line: str) -> None:
+        last_line = self.last_line
+        self.rows.pop()
+        self.add_row(f"{last_line}\n{line}")
+
+    def to_frame(self) -> pd.DataFrame:
+        if not self.rows:
+            return pd.DataFrame()
+        names = _column_names(self.header)
+        data = {}
+        # Rows to columns in one go
+        for name, values in zip(names, zip(*self.rows)):
+            # Drop empty columns (often resulting from extra pipes)
+            if not any(values):
+                continue
+            if "<" in "".join(values):
+                values = tuple(_LINE_BREAK.sub("\n", v) for v in values)
+            data[name] = _infer_column(values)
+        return pd.DataFrame(data) if data else pd.DataFrame()
+
+class MarkdownTableParser:
+    """
+    Incremental Markdown table parser. feed() text as it arrives (e.g. streamed model
+    tokens); every table is returned from the call in which it ends, and close()
+    flushes the last one. Cells are split once per line and typed per column, no CSV round trip.
+    With `track_rows`, take_rows() also hands out the raw cells of rows as soon as they are final.
+    """
+
+    def __init__(self, track_rows: bool = False):
+        self._pending = ""
+        self._table: _TableBuilder | None = None
+        self._track_rows = track_rows
+        self._rows: list[tuple[int, list[str], list[list[str]]]] = []
+        self._tables = 0
+
+    def feed(self, text: str) -> list[pd.DataFrame]:
+        tables = []
+        lines = (self._pending + text).split("\n")
+        self._pending = lines.pop()
+        for line in lines:
+            self._line(line, tables)
+        return tables
+
+    def close(self) -> list[pd.DataFrame]:
+        tables = []
+        if self._pending:
+            self._line(self._pending, tables)
+            self._pending = ""
+        self._end(tables)
+        return tables
+
+    def take_rows(self) -> list[tuple[int, list[str], list[list[str]]]]:
+        """
+        Rows that became final since the last call, as (table number, header, rows) with
+        tables numbered from 1 in the order they are returned. Cells are the raw text.
+        """
+        rows, self._rows = self._rows, []
+        return rows
+
+    def _collect(self, table: _TableBuilder, ended: bool) -> None:
+        # The last row may still get a wrapped line appended until the table ends
+        end = len(table.rows) if ended or table.last_line is None else len(table.rows) - 1
+        if end <= table.taken:
+            return
+        if table.number is None:
+            # Tables without a single filled cell are never returned, so they get no number
+            if not any(any(row) for row in table.rows[table.taken:end]):
+                return
+            self._tables += 1
+            table.number = self._tables
+        self._rows.append((table.number, list(table.header), table.rows[table.taken:end]))
+        table.taken = end
+
+    def _line(self, line: str, tables: list[pd.DataFrame]) -> None:
+        stripped = line.strip()
+        table = self._table
+        if stripped.startswith("|"):
+            if table is None:
+                self._table = _TableBuilder(split_row(stripped)[0])
+            elif not _ALIGN_ROW.fullmatch(stripped):
+                table.add_row(stripped)
+                if self._track_rows:
+                    self._collect(table, False)
+            return
+        if table is not None and stripped and table.continues_row(stripped):
+            # Cell text the model wrapped onto its own line
+            table.continue_row(stripped)
+            if self._track_rows:
+                self._collect(table, False)
+            return
+        self._end(tables)
+
+    def _end(self, tables: list[pd.DataFrame]) -> None:
+        if self._table is not None:
+            if self._track_rows:
+                self._collect(self._table, True)
+            df = self._table.to_frame()
             if not df.empty:
                 tables.append(df)
-         except Exception as e:
-            print(f"Failed to parse table block: {e}")
-
-    return tables
-
-def _convert_lines_to_df(lines: list[str]) -> pd.DataFrame:
-    # Join lines and use pandas to read
-    # We strip outer pipes manually to avoid empty first/last columns if pandas read_csv separator is strict
-    cleaned_lines = []
-    for line in lines:
-        # Remove leading/trailing pipes
-        content = line.strip('|')
-        cleaned_lines.append(content)
-    
-    data_str = "\n".join(cleaned_lines)
-    # Use | as separator
-    try:
-        df = pd.read_csv(io.StringIO(data_str), sep="|", engine="python")
-        # Clean column names (strip whitespace)
-        df.columns = df.columns.str.strip()
-        # Clean string data
-        df = df.map(lambda x: x.strip() if isinstance(x, str) else x)
-        # Drop empty columns (often resulting from extra pipes)
-        df = df.dropna(axis=1, how='all')
-        return df
-    except pd.errors.EmptyDataError:
-        return pd.DataFrame()
+            self._table = None
+
+@metrics.timed("parse_tables")
+def parse_markdown_tables(md_text: str) -> list[pd.DataFrame]:
+    """
+    Extracts Markdown tables from text and converts them to DataFrames.
+    Handles standard pipe-separated tables, escaped pipes, inline code, ragged rows and wrapped cells.
+    """
+    parser = MarkdownTableParser()
+    return parser.feed(md_text) + parser.close()
@@ -0,0 +1,177 @@
+import asyncio
+from contextlib import aclosing
+from typing import AsyncIterator
+import pandas as pd
+from PIL import Image
+from backend.config import settings
+from backend.services.ollama_client import ollama_client
+from backend.services.image_service import encode_image, preprocess_image
+from backend.services.model_scheduler import SchedulerOverloaded
+from backend.services.page_classifier import PageFilter, BLANK, DUPLICATE
+from backend.services.table_parser import MarkdownTableParser, parse_markdown_tables
+from backend.services.table_merger import TableMerger, merge_tables_with_report
+from backend.services.excel_service import dataframes_to_excel
+from backend.utils.concurrency import map_ordered
+from backend.utils.metrics import metrics
+
+# Prompt for the table extraction endpoint
+TABLE_PROMPT = "Extract the table from this image. Output strictly as a Markdown table. Do not include any other text."
+# Prompt for the PDF/JPG -> Excel/CSV converters
+CONVERT_TABLE_PROMPT = "Extract the table from this image as a Markdown table."
+
+class TableService:
+    @staticmethod
+    async def extract_page_markdown(img: Image.Image, prompt: str = TABLE_PROMPT, preprocess: bool = False) -> str:
+        """OCRs one page into Markdown tables. This is the per-page step shared by routers and jobs."""
+        if preprocess:
+            img = preprocess_image(img)
+        return await ollama_client.ocr_image(encode_image(img), prompt=prompt)
+
+    @staticmethod
+    def tables_from_markdown(markdown_pages: list[str], merge: bool = False) -> list[pd.DataFrame]:
+        """Parses the page outputs (in page order) into DataFrames, optionally merging continued tables."""
+        if merge:
+            return TableService.merge_page_tables(markdown_pages)[0]
+        tables = []
+        for markdown in markdown_pages:
+            tables.extend(parse_markdown_tables(markdown))
+        return tables
+
+    @staticmethod
+    def merge_page_tables(markdown_pages: list[str], page_numbers: list[int] | None = None) -> tuple[list[pd.DataFrame], list[dict]]:
+        """Parses and merges the page outputs, also returning the merge decision for every table found."""
+        if page_numbers is None:
+            page_numbers = list(range(1, len(markdown_pages) + 1))
+        tables, pages = [], []
+        for markdown, page in zip(markdown_pages, page_numbers):
+            found = parse_markdown_tables(markdown)
+            tables.extend(found)
+            pages.extend([page] * len(found))
+        return merge_tables_with_report(tables, pages)
+
+    @staticmethod
+    def build_workbook(tables: list[pd.DataFrame], output: str) -> list[dict]:
+        """Writes the Excel file to `output` and returns a preview (first 5 rows of the first table)."""
+        dataframes_to_excel(tables, output)
+        return tables[0].head(5).to_dict(orient="records") if tables else []
+
+class TableStreamer:
+    """
+    Table extraction of one document as a stream of events. Pages are OCR'd concurrently
+    (TABLE_PAGE_CONCURRENCY) and parsed on the model's token stream, so rows are sent
+    while the model is still generating; pages are then merged in page order.
+
+    Events (dicts):
+    - "rows": rows of a table that became final, {page, page_table, columns, rows}.
+      Pages in flight interleave; cells are the raw text.
+    - "page": a page is done, in page order, {page, tables, skipped?, error?}
+    - "merge": the merge decision for each table of that page (see TableMerger)
+    merged(), failed_pages and extracted_pages have the result once the stream is exhausted.
+    """
+
+    def __init__(self, page_filter: PageFilter | None = None, prompt: str = TABLE_PROMPT):
+        self.page_filter = page_filter or PageFilter()
+        self.prompt = prompt
+        self.merger = TableMerger()
+        self.failed_pages: list[dict] = []
+        self.extracted_pages = 0  # pages the model read, directly or through the page they repeat
+
+    async def _stream_page(self, img: Image.Image, on_rows) -> list[pd.DataFrame]:
+        parser = MarkdownTableParser(track_rows=True)
+        tables = []
+        async with aclosing(ollama_client.ocr_image_stream(encode_image(img), prompt=self.prompt)) as tokens:
+            async for token in tokens:
+                tables += parser.feed(token)
+                on_rows(parser.take_rows())
+        tables += parser.close()
+        on_rows(parser.take_rows())
+        return tables
+
+    async def run(self, pages: AsyncIterator[tuple[int, Image.Image]]) -> AsyncIterator[dict]:
+        page_filter = self.page_filter
+        # Row events of the pages in flight and the finished pages (in order) share one queue,
+        # a page's rows are always queued before the page itself
+        events: asyncio.Queue = asyncio.Queue()
+        rows_by_page: dict[int, list[dict]] = {}  # sent rows, replayed for the duplicates of a page
+
+        async def extract(item: tuple[int, Image.Image]) -> list[pd.DataFrame]:
+            index, img = item
+
+            def on_rows(rows):
+                for number, header, new in rows:
+                    event = {"type": "rows", "page": index + 1, "page_table": number, "columns": header, "rows": new}
+                    rows_by_page.setdefault(index, []).append(event)
+                    events.put_nowait(event)
+
+            return await self._stream_page(img, on_rows)
+
+        async def indexed(distinct):
+            async for index, img in distinct:
+                yield index, (index, img)
+
+        async def ocr_stage():
+            try:
+                async with aclosing(page_filter.distinct(pages)) as distinct:
+                    async with aclosing(map_ordered(indexed(distinct), extract, settings.TABLE_PAGE_CONCURRENCY)) as results:
+                        async for index, tables, error in results:
+                            if isinstance(error, SchedulerOverloaded):
+                                raise error
+                            await events.put((index, tables, error))
+            except Exception as e:
+                await events.put(e)
+                return
+            await events.put(None)
+
+        producer = asyncio.create_task(ocr_stage())
+        results: dict[int, tuple[list[pd.DataFrame], Exception | None]] = {}
+        placed = 0  # pages before this one are merged
+
+        def place(index: int) -> list[dict]:
+            """Merges one page, blank and duplicate pages included, and returns its events."""
+            out = []
+            page = {"type": "page", "page": index + 1}
+            original = page_filter.original(index)
+            if original is not None:
+                page["skipped"] = DUPLICATE
+                out += [{**event, "page": index + 1} for event in rows_by_page.get(original, [])]
+                tables, error = results[original]
+            elif index in results:
+                tables, error = results[index]
+            else:
+                page["skipped"] = BLANK
+                tables, error = [], None
+            page["tables"] = len(tables)
+            if error is not None:
+                page["error"] = str(error)
+                self.failed_pages.append({"page": index + 1, "error": str(error)})
+            elif page.get("skipped") != BLANK:
+                self.extracted_pages += 1
+            out.append(page)
+            with metrics.stage("merge_tables"):
+                for number, df in enumerate(tables, 1):
+                    out.append({"type": "merge", "page_table": number, **self.merger.add(df, index + 1)})
+            return out
+
+        try:
+            while (item := await events.get()) is not None:
+                if isinstance(item, Exception):
+                    raise item
+                if isinstance(item, dict):
+                    yield item
+                    continue
+                index, tables, error = item
+                results[index] = (tables or [], error)
+                # Pages skipped by the filter before this one are settled by now
+                for i in range(placed, index + 1):
+                    for event in place(i):
+                        yield event
+                placed = index + 1
+            for i in range(placed, page_filter.pages):
+                for event in place(i):
+                    yield event
+        finally:
+            producer.cancel()
+            await asyncio.gather(producer, return_exceptions=True)
+
+    def merged(self) -> list[pd.DataFrame]:
+        return self.merger.merged()
@@ -0,0 +1,161 @@
+import math
+from contextlib import aclosing
+from difflib import SequenceMatcher
+from typing import AsyncIterator, Awaitable, Callable
+from PIL import Image
+from backend.config import settings
+from backend.services.image_service import preprocess_image
+from backend.utils.concurrency import map_ordered
+
+# Lines at the end of a band that are held back until the next band shows whether it repeats them
+_OVERLAP_LINES = 12
+# Characters a repeated run of lines needs before two bands are joined on it
+_MIN_OVERLAP_CHARS = 12
+
+def _fitted_size(width: int, height: int) -> tuple[float, float]:
+    """Page size once scaled to the band width (never upscaled), before any height cap."""
+    scale = min(1.0, settings.OCR_TILE_MAX_PX / width)
+    return width * scale, height * scale
+
+def needs_tiling(size: tuple[int, int]) -> bool:
+    """Whether a page of this size is OCR'd in bands rather than shrunk to fit the model."""
+    if not settings.OCR_TILING_ENABLED:
+        return False
+    return _fitted_size(*size)[1] > settings.OCR_TILE_TRIGGER_PX
+
+def fit_page(img: Image.Image, max_dim: int = 2048) -> Image.Image:
+    """
+    preprocess_image() for pages OCR'd as a whole. Pages that will be tiled only get
+    their width fitted to the bands, so tall receipts and large scans keep their detail.
+    """
+    if not needs_tiling(img.size):
+        return preprocess_image(img, max_dim)
+    width, height = _fitted_size(*img.size)
+    scale = min(1.0, settings.OCR_TILE_MAX_HEIGHT_PX / height)
+    size = (max(1, round(width * scale)), max(1, round(height * scale)))
+    if size != img.size:
+        img = img.resize(size, Image.Resampling.LANCZOS)
+    return preprocess_image(img, max(size))
+
+def band_boxes(size: tuple[int, int]) -> list[tuple[int, int, int, int]]:
+    """
+    Crop boxes (in the page's own pixels) of overlapping full-width bands, each about
+    OCR_TILE_BAND_PX tall once fitted to the band width. A single box if no tiling is needed.
+    """
+    width, height = size
+    if not needs_tiling(size):
+        return [(0, 0, width, height)]
+    scale = _fitted_size(width, height)[0] / width
+    band = settings.OCR_TILE_BAND_PX / scale
+    overlap = min(settings.OCR_TILE_OVERLAP_PX / scale, band / 2)
+    # Equal bands, so the last one isn't a thin sliver
+    count = max(1, math.ceil((height - overlap) / (band - overlap)))
+    band = (height + (count - 1) * overlap) / count
+    step = band - overlap
+    return [(0, round(i * step), width, min(height, round(i * step + band))) for i in range(count)]
+
+def _key(line: str) -> str:
+    return " ".join(line.split()).casefold()
+
+def _same(a: str, b: str) -> bool:
+    if a == b:
+        return True
+    # The same line read twice can come back with a character or so different, but
+    # lines of a list or receipt differ in little more than their numbers
+    allowed = min(len(a), len(b)) // 25
+    if not allowed or abs(len(a) - len(b)) > allowed:
+        return False
+    edits = sum(max(i2 - i1, j2 - j1) for op, i1, i2, j1, j2 in SequenceMatcher(None, a, b, autojunk=False).get_opcodes() if op != "equal")
+    return edits <= allowed
+
+def _join_point(tail: list[str], head: list[str]) -> tuple[int, int] | None:
+    """
+    Where the start of the next band (`head`) repeats the end of the previous one (`tail`).
+    Returns (lines of tail to keep, lines of head to drop), or None if they don't overlap.
+    Either side may end in one line cut in half by the band edge, which matches nothing.
+    """
+    tail, head = [_key(line) for line in tail], [_key(line) for line in head]
+    best = None
+    for cut_tail in (0, 1):
+        end = len(tail) - cut_tail
+        for cut_head in (0, 1):
+            for n in range(min(end, len(head) - cut_head), 0, -1):
+                run = tail[end - n:end]
+                if all(_same(line, head[cut_head + k]) for k, line in enumerate(run)):
+                    if sum(len(line) for line in run) >= _MIN_OVERLAP_CHARS:
+                        # Longest repeated run wins, then the one that drops fewer cut lines
+                        candidate = (n, -(cut_tail + cut_head), end, cut_head + n)
+                        best = max(best or candidate, candidate)
+                    break
+    return (best[2], best[3]) if best else None
+
+class BandStitcher:
+    """
+    Joins the OCR text of consecutive bands, dropping the lines the overlap made the
+    model read twice. add() returns the text that is final so far, finish() the rest.
+    """
+
+    def __init__(self):
+        self.tail: list[str] | None = None  # last lines of the previous band, not emitted yet
+
+    def add(self, text: str) -> str:
+        lines = text.strip("\n").splitlines()
+        emitted: list[str] = []
+        if self.tail is not None:
+            join = _join_point(self.tail, lines[:_OVERLAP_LINES])
+            if join is not None:
+                keep, drop = join
+                emitted = self.tail[:keep]
+                lines = lines[drop:]
+            else:
+                # Nothing repeated: the band edge fell into whitespace between blocks
+                emitted = self.tail + ([""] if self.tail and lines else [])
+        self.tail = lines[-_OVERLAP_LINES:]
+        emitted += lines[:-_OVERLAP_LINES]
+        return "".join(line + "\n" for line in emitted)
+
+    def finish(self) -> str:
+        tail, self.tail = self.tail or [], None
+        return "\n".join(tail)
+
+def stitch_bands(texts: list[str]) -> str:
+    stitcher = BandStitcher()
+    return "".join(stitcher.add(text) for text in texts) + stitcher.finish()
+
+async def aiter_tiled_ocr(img: Image.Image, ocr: Callable[[Image.Image], Awaitable[str]]) -> AsyncIterator[str]:
+    """
+    OCRs a page with `ocr`, in bands if it is too tall for one call. Bands run
+    concurrently (OCR_TILE_CONCURRENCY) and the stitched text is yielded in order,
+    as soon as the bands before it are done.
+    """
+    boxes = band_boxes(img.size)
+    if len(boxes) == 1:
+        yield await ocr(img)
+        return
+
+    width = min(img.width, settings.OCR_TILE_MAX_PX)
+
+    async def bands():
+        for i, box in enumerate(boxes):
+            band = img.crop(box)
+            if band.width != width:
+                band = band.resize((width, max(1, round(band.height * width / band.width))), Image.Resampling.LANCZOS)
+            yield i, band
+
+    stitcher = BandStitcher()
+    async with aclosing(map_ordered(bands(), ocr, settings.OCR_TILE_CONCURRENCY)) as results:
+        async for i, text, error in results:
+            if error is not None:
+                raise error
+            if part := stitcher.add(text):
+                yield part
+    if rest := stitcher.finish():
+        yield rest
+
+async def tiled_ocr(img: Image.Image, ocr: Callable[[Image.Image], Awaitable[str]]) -> str:
+    """aiter_tiled_ocr() as one string."""
+    parts = []
+    async with aclosing(aiter_tiled_ocr(img, ocr)) as texts:
+        async for text in texts:
+            parts.append(text)
+    return "".join(parts)
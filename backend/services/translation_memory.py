@@ -0,0 +1,200 @@
+import asyncio
+import os
+import re
+import sqlite3
+import threading
+import time
+from backend.config import settings
+
+# Markdown line shapes whose prefix is kept verbatim and only the text after it is translated
+HEADING_RE = re.compile(r'^(\s*#{1,6}\s+)(.*)$')
+LIST_ITEM_RE = re.compile(r'^(\s*(?:[-*+]|\d+[.)])\s+(?:\[[ xX]\]\s+)?)(.*)$')
+BLOCKQUOTE_RE = re.compile(r'^(\s*>\s?)(.*)$')
+TABLE_SEPARATOR_RE = re.compile(r'^\|?[\s\-:|]+\|?$')
+RULE_RE = re.compile(r'^\s*([-*_])(\s*\1){2,}\s*$')
+CELL_SPLIT_RE = re.compile(r'(?<!\\)\|')
+HAS_LETTERS_RE = re.compile(r'[^\W\d_]')
+
+def normalize_segment(text: str) -> str:
+    """Whitespace-insensitive form used as the translation memory key."""
+    return " ".join(text.split())
+
+def split_segments(md_text: str) -> tuple[list, list[str]]:
+    """
+    Splits Markdown into translatable segments (paragraphs, headings, list items, table cells).
+    Returns a template of literal strings and integer segment indexes, plus the segments.
+    Markup, code blocks and text without letters (numbers, amounts, dates) stay literal.
+    """
+    template: list = []
+    segments: list[str] = []
+    paragraph: list[str] = []
+
+    def add_segment(text: str) -> None:
+        stripped = text.strip()
+        if not stripped or not HAS_LETTERS_RE.search(stripped):
+            template.append(text)
+            return
+        leading = text[:len(text) - len(text.lstrip())]
+        trailing = text[len(text.rstrip()):]
+        if leading:
+            template.append(leading)
+        template.append(len(segments))
+        segments.append(stripped)
+        if trailing:
+            template.append(trailing)
+
+    def flush_paragraph() -> None:
+        if paragraph:
+            add_segment("\n".join(paragraph))
+            template.append("\n")
+            paragraph.clear()
+
+    in_code = False
+    for line in md_text.split("\n"):
+        stripped = line.strip()
+
+        if stripped.startswith("```") or stripped.startswith("~~~"):
+            flush_paragraph()
+            in_code = not in_code
+            template.append(line + "\n")
+            continue
+        if in_code or not stripped or RULE_RE.match(line):
+            flush_paragraph()
+            template.append(line + "\n")
+            continue
+
+        if stripped.startswith("|"):
+            flush_paragraph()
+            if TABLE_SEPARATOR_RE.match(stripped):
+                template.append(line + "\n")
+                continue
+            cells = CELL_SPLIT_RE.split(line)
+            for i, cell in enumerate(cells):
+                if i > 0:
+                    template.append("|")
+                add_segment(cell)
+            template.append("\n")
+            continue
+
+        match = HEADING_RE.match(line) or LIST_ITEM_RE.match(line) or BLOCKQUOTE_RE.match(line)
+        if match:
+            flush_paragraph()
+            template.append(match.group(1))
+            add_segment(match.group(2))
+            template.append("\n")
+            continue
+
+        paragraph.append(line)
+
+    flush_paragraph()
+    # Every line above was closed with a newline, but split() yields one more line than there are newlines
+    template[-1] = template[-1][:-1]
+    return template, segments
+
+def join_segments(template: list, translations: list[str]) -> str:
+    """Reassembles a page from the template and the translated segments."""
+    return "".join(translations[part] if isinstance(part, int) else part for part in template)
+
+class TranslationMemory:
+    """
+    Persistent (normalized source text, target language, model) -> translation store.
+    Backed by SQLite; the least recently used entries are evicted past max_entries.
+    """
+
+    def __init__(self, path: str, max_entries: int, enabled: bool = True):
+        self.enabled = enabled
+        self.path = path
+        self.max_entries = max_entries
+        self._db: sqlite3.Connection | None = None
+        self._db_lock = threading.Lock()
+        self._entries = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._db is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            db = sqlite3.connect(self.path, check_same_thread=False)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS segments ("
+                "source TEXT NOT NULL, lang TEXT NOT NULL, model TEXT NOT NULL, "
+                "translation TEXT NOT NULL, accessed REAL NOT NULL, "
+                "PRIMARY KEY (source, lang, model))"
+            )
+            db.execute("CREATE INDEX IF NOT EXISTS segments_accessed ON segments(accessed)")
+            self._entries = db.execute("SELECT COUNT(*) FROM segments").fetchone()[0]
+            self._db = db
+        return self._db
+
+    def _lookup(self, sources: list[str], lang: str, model: str) -> dict[str, str]:
+        found = {}
+        with self._db_lock:
+            db = self._connect()
+            # Stay well below SQLite's bound-parameter limit
+            for start in range(0, len(sources), 500):
+                chunk = sources[start:start + 500]
+                placeholders = ",".join("?" * len(chunk))
+                rows = db.execute(
+                    f"SELECT source, translation FROM segments WHERE lang = ? AND model = ? AND source IN ({placeholders})",
+                    (lang, model, *chunk),
+                ).fetchall()
+                found.update(rows)
+            if found:
+                now = time.time()
+                db.executemany(
+                    "UPDATE segments SET accessed = ? WHERE source = ? AND lang = ? AND model = ?",
+                    [(now, source, lang, model) for source in found],
+                )
+                db.commit()
+        return found
+
+    def _store(self, pairs: dict[str, str], lang: str, model: str) -> None:
+        now = time.time()
+        with self._db_lock:
+            db = self._connect()
+            before = db.total_changes
+            db.executemany(
+                "INSERT OR IGNORE INTO segments (source, lang, model, translation, accessed) VALUES (?, ?, ?, ?, ?)",
+                [(source, lang, model, translation, now) for source, translation in pairs.items()],
+            )
+            self._entries += db.total_changes - before
+            if self._entries > self.max_entries:
+                excess = self._entries - int(self.max_entries * 0.9)
+                db.execute(
+                    "DELETE FROM segments WHERE rowid IN (SELECT rowid FROM segments ORDER BY accessed LIMIT ?)",
+                    (excess,),
+                )
+                self._entries -= excess
+            db.commit()
+
+    async def lookup(self, sources: list[str], lang: str, model: str) -> dict[str, str]:
+        if not self.enabled or not sources:
+            return {}
+        return await asyncio.to_thread(self._lookup, sources, lang, model)
+
+    async def store(self, pairs: dict[str, str], lang: str, model: str) -> None:
+        if self.enabled and pairs:
+            await asyncio.to_thread(self._store, pairs, lang, model)
+
+    def close(self) -> None:
+        with self._db_lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+def merge_stats(stats: list[dict]) -> dict:
+    """Sums per-page translation memory stats into a per-request summary."""
+    segments = sum(s["segments"] for s in stats)
+    hits = sum(s["hits"] for s in stats)
+    return {
+        "segments": segments,
+        "hits": hits,
+        "misses": segments - hits,
+        "hit_rate": round(hits / segments, 4) if segments else 0.0,
+    }
+
+translation_memory = TranslationMemory(
+    path=settings.TRANSLATION_MEMORY_PATH,
+    max_entries=settings.TRANSLATION_MEMORY_MAX_ENTRIES,
+    enabled=settings.TRANSLATION_MEMORY_ENABLED,
+)
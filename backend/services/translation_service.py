@@ -1,70 +1,191 @@
-import io
+import shutil
 import asyncio
+from contextlib import aclosing
+from typing import AsyncIterator
 import markdown
 from PIL import Image
 from xhtml2pdf import pisa
-from backend.services.pdf_service import render_pdf_to_images
+from backend.services.pdf_service import aiter_pdf_pages
 from backend.services.ollama_client import ollama_client
-from backend.services.image_service import image_to_base64, preprocess_image
+from backend.services.image_service import encode_image, preprocess_image
+from backend.services.translation_memory import merge_stats
+from backend.services.page_classifier import PageFilter, BLANK, DUPLICATE
+from backend.services.tiled_ocr import tiled_ocr
+from backend.utils.concurrency import map_ordered
 from backend.config import settings
 
+# Prompt for the OCR + translate endpoint, which keeps the page's formatting
+TRANSLATE_OCR_PROMPT = "Extract the text from this image exactly as it appears. Maintain all Markdown formatting. Do not translate."
+
+class DocumentTranslationService:
+    @staticmethod
+    async def ocr_page(img: Image.Image) -> str:
+        return await tiled_ocr(img, lambda band: ollama_client.ocr_image(encode_image(band), prompt=TRANSLATE_OCR_PROMPT))
+
+    @staticmethod
+    async def translate_ocr_text(original_text: str, target_language: str) -> dict:
+        if not original_text.strip():
+            # Nothing to translate on a blank page
+            return {"original_text": original_text, "translated_text": original_text, "translation_memory": merge_stats([])}
+        translated_text, memory_stats = await ollama_client.translate_markdown(original_text, target_language)
+        return {
+            "original_text": original_text,
+            "translated_text": translated_text,
+            "translation_memory": memory_stats,
+        }
+
+    @staticmethod
+    async def translate_page(img: Image.Image, target_language: str) -> dict:
+        """OCRs one page and translates it, returning the per-page result of /api/ocr/translate."""
+        # Stage 1: Local OCR
+        original_text = await DocumentTranslationService.ocr_page(img)
+        # Stage 2: Translation
+        return await DocumentTranslationService.translate_ocr_text(original_text, target_language)
+
+    @staticmethod
+    async def aiter_translated_pages(
+        pages: AsyncIterator[tuple[int, Image.Image]],
+        target_language: str,
+        depth: int | None = None,
+        page_filter: PageFilter | None = None,
+    ) -> AsyncIterator[dict]:
+        """
+        Two-stage pipeline: OCR of the next pages runs while earlier pages are being
+        translated. Stages are linked by a queue of at most `depth` OCR results, so a
+        slow translation stage holds back OCR (and rendering) instead of buffering pages.
+        Yields per-page results in page order as soon as each one is translated.
+        With a `page_filter`, blank pages skip OCR and translation and near-duplicates
+        reuse the OCR text of the page they repeat; `source` tells which one a page was.
+        """
+        queue: asyncio.Queue = asyncio.Queue(maxsize=max(depth or settings.TRANSLATE_PIPELINE_DEPTH, 1))
+
+        async def ocr_stage():
+            texts = {}
+            try:
+                async for index, img in pages:
+                    source = await page_filter.aclassify(index, img) if page_filter else "ocr"
+                    if source == BLANK:
+                        text = ""
+                    elif source == DUPLICATE:
+                        text = texts[page_filter.original(index)]
+                    else:
+                        source = "ocr"
+                        text = texts[index] = await DocumentTranslationService.ocr_page(img)
+                    await queue.put((index, source, text))
+            except Exception as e:
+                await queue.put(e)
+                return
+            await queue.put(None)
+
+        producer = asyncio.create_task(ocr_stage())
+        translated = {}
+        try:
+            while (item := await queue.get()) is not None:
+                if isinstance(item, Exception):
+                    raise item
+                index, source, original_text = item
+                if source == DUPLICATE:
+                    # The original was translated already, pages come through in order
+                    page = {**translated[page_filter.original(index)], "translation_memory": merge_stats([])}
+                else:
+                    page = await DocumentTranslationService.translate_ocr_text(original_text, target_language)
+                    if page_filter:
+                        translated[index] = page
+                yield {"page": index + 1, "source": source, **page}
+        finally:
+            producer.cancel()
+            await asyncio.gather(producer, return_exceptions=True)
+
 class PdfTranslatorService:
     @staticmethod
-    async def translate_pdf(pdf_bytes: bytes, target_lang: str = "Spanish") -> bytes:
+    async def ocr_page(img: Image.Image) -> str:
+        return await tiled_ocr(img, PdfTranslatorService.ocr_image)
+
+    @staticmethod
+    async def ocr_image(img: Image.Image) -> str:
+        processed = preprocess_image(img)
+        encoded = encode_image(processed)
+        # Specific prompt to get structured markdown
+        return await ollama_client.ocr_image(
+            encoded, 
+            prompt="Extract all text from this page. Use Markdown for structure. Do not describe the layout. If there are charts or complex images, just ignore them, as I will add a placeholder."
+        )
+
+    @staticmethod
+    async def translate_page(idx: int, text: str, target_lang: str) -> tuple[str, dict]:
+        # Add [Image Page X] as requested
+        page_content = f"### [Image Page {idx + 1}]\n\n{text}"
+        return await ollama_client.translate_markdown(page_content, target_lang)
+
+    @staticmethod
+    async def translate_pdf(source: bytes | str, output: str, target_lang: str = "Spanish", page_filter: PageFilter | None = None) -> dict:
         """
         New Pipeline:
         1. Render PDF to images.
         2. OCR each page to Markdown text.
         3. Insert [Image Page X] placeholders.
-        4. Translate the Markdown content.
+        4. Translate the Markdown content (through the translation memory).
         5. Convert Translated Markdown to a "Preview Mode" PDF.
+        `source` is the PDF's bytes or a file path, the result is written to `output`.
+        Blank pages are left out and near-duplicates reuse the OCR text of the page they
+        repeat, `page_filter` (a fresh one if not given) keeps the counts.
+        Returns the translation memory hit statistics.
         """
-        
-        # 1. Render PDF to images
-        images = render_pdf_to_images(pdf_bytes)
-        
-        # 2. Extract Markdown content using OCR
-        md_pages = []
-        sem = asyncio.Semaphore(5)
-
-        async def ocr_page(idx, img):
-            async with sem:
-                processed = preprocess_image(img)
-                b64 = image_to_base64(processed)
-                # Specific prompt to get structured markdown
-                text = await ollama_client.ocr_image(
-                    b64, 
-                    prompt="Extract all text from this page. Use Markdown for structure. Do not describe the layout. If there are charts or complex images, just ignore them, as I will add a placeholder."
-                )
-                return idx, text
-
-        tasks = [ocr_page(i, img) for i, img in enumerate(images)]
-        if tasks:
-            results = await asyncio.gather(*tasks)
-            results.sort(key=lambda x: x[0])
-            for idx, text in results:
-                # Add [Image Page X] as requested
-                page_content = f"### [Image Page {idx + 1}]\n\n{text}"
-                md_pages.append(page_content)
-
-        full_md_content = "\n\n---\n\n".join(md_pages)
-
-        # 3. Translate the full Markdown content
+        page_filter = page_filter or PageFilter()
+
+        # 1. Render PDF pages lazily
+        # 2. Extract Markdown content using OCR. map_ordered only pulls (renders) a page once
+        # an OCR slot is free, and a failure cancels the pages still in flight
+        texts = {}
+        async with aclosing(aiter_pdf_pages(source)) as pages:
+            async with aclosing(page_filter.distinct(pages)) as distinct:
+                async with aclosing(map_ordered(distinct, PdfTranslatorService.ocr_page, 5)) as results:
+                    async for i, text, error in results:
+                        if error is not None:
+                            raise error
+                        texts[i] = text
+        ocr_pages = sorted(page_filter.fan_out(texts).items())
+
+        # 3-4. Translate the Markdown content
         # We split by page to avoid token limits and keep it manageable
-        translated_md_pages = []
-        
-        async def translate_page(text):
-            async with sem:
-                return await ollama_client.translate_text(text, target_lang)
+        async def numbered():
+            for idx, text in ocr_pages:
+                yield idx, (idx, text)
+
+        translated_results = []
+        async with aclosing(map_ordered(numbered(), lambda page: PdfTranslatorService.translate_page(*page, target_lang), 5)) as translated:
+            async for _, result, error in translated:
+                if error is not None:
+                    raise error
+                translated_results.append(result)
+        translated_md_pages = [text for text, _ in translated_results]
+        memory_stats = merge_stats([stats for _, stats in translated_results])
 
-        translation_tasks = [translate_page(p) for p in md_pages]
-        if translation_tasks:
-            translated_results = await asyncio.gather(*translation_tasks)
-            translated_md_pages = translated_results
+        # 5. Markdown -> styled HTML -> PDF
+        rendered = await asyncio.to_thread(PdfTranslatorService.render_pdf, translated_md_pages, output)
+        if not rendered:
+            # Fallback if pisa fails
+            await asyncio.to_thread(PdfTranslatorService.copy_source, source, output)
+        return memory_stats
+
+    @staticmethod
+    def copy_source(source: bytes | str, output: str) -> None:
+        """Writes the original PDF to `output`, the fallback when rendering fails."""
+        if isinstance(source, str):
+            shutil.copyfile(source, output)
+        else:
+            with open(output, "wb") as f:
+                f.write(source)
 
+    @staticmethod
+    def render_pdf(translated_md_pages: list[str], output: str) -> bool:
+        """
+        Renders translated Markdown pages into a "Preview Mode" PDF written to `output`.
+        Returns False if xhtml2pdf fails.
+        """
         final_translated_md = "\n\n---\n\n".join(translated_md_pages)
 
-        # 4. Convert MD to HTML with "Preview Mode" styling
+        # Convert MD to HTML with "Preview Mode" styling
         html_content = markdown.markdown(final_translated_md, extensions=['extra', 'codehilite'])
         
         styled_html = f"""
@@ -133,12 +254,8 @@ class PdfTranslatorService:
         </html>
         """
 
-        # 5. Convert HTML to PDF
-        output_pdf_io = io.BytesIO()
-        pisa_status = pisa.CreatePDF(styled_html, dest=output_pdf_io)
+        # Convert HTML to PDF, straight into the output file
+        with open(output, "wb") as f:
+            pisa_status = pisa.CreatePDF(styled_html, dest=f)
         
-        if pisa_status.err:
-             # Fallback if pisa fails
-             return pdf_bytes
-             
-        return output_pdf_io.getvalue()
\ No newline at end of file
+        return not pisa_status.err
\ No newline at end of file
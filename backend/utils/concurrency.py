@@ -0,0 +1,46 @@
+import asyncio
+from collections import deque
+from typing import AsyncIterator, Awaitable, Callable, TypeVar
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+async def map_ordered(
+    items: AsyncIterator[tuple[int, T]],
+    fn: Callable[[T], Awaitable[R]],
+    concurrency: int,
+) -> AsyncIterator[tuple[int, R | None, Exception | None]]:
+    """
+    Runs fn over (index, item) pairs with at most `concurrency` calls in flight and
+    yields (index, result, error) in input order. A failing call is reported through
+    `error` instead of stopping the others. Stopping early (via contextlib.aclosing)
+    cancels the calls still outstanding, and no more items are pulled from `items`.
+    """
+    concurrency = max(concurrency, 1)
+    pending: deque[tuple[int, asyncio.Task]] = deque()
+    exhausted = False
+
+    try:
+        while True:
+            # Keep the window full; items are only pulled when a slot is free
+            while not exhausted and len(pending) < concurrency:
+                try:
+                    index, item = await anext(items)
+                except StopAsyncIteration:
+                    exhausted = True
+                    break
+                pending.append((index, asyncio.create_task(fn(item))))
+            if not pending:
+                return
+
+            index, task = pending.popleft()
+            try:
+                result = await task
+            except Exception as e:
+                yield index, None, e
+            else:
+                yield index, result, None
+    finally:
+        for _, task in pending:
+            task.cancel()
+        await asyncio.gather(*(task for _, task in pending), return_exceptions=True)
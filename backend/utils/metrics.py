@@ -0,0 +1,229 @@
+import functools
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Callable, Iterable
+
+# Seconds; covers a cached parse (ms) up to a slow model call (minutes)
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+# What the current work is attributed to: the ASGI scope of the request (its route is
+# only known once routing is done, so it is looked up when needed) or a fixed label
+_endpoint: ContextVar[dict | str] = ContextVar("metrics_endpoint", default="background")
+
+def set_endpoint(label: str) -> None:
+    """Attributes stage timings of the current task (and tasks it starts) to `label`, e.g. a job."""
+    _endpoint.set(label)
+
+def current_endpoint() -> str:
+    value = _endpoint.get()
+    if isinstance(value, str):
+        return value
+    route = value.get("route")
+    return getattr(route, "path", None) or "unmatched"
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(names: Iterable[str], values: Iterable) -> str:
+    pairs = ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values))
+    return f"{{{pairs}}}" if pairs else ""
+
+class _Metric:
+    type = ""
+
+    def __init__(self, name: str, help: str, labels: tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._values: dict[tuple, object] = {}
+        self._lock = threading.Lock()
+
+    def _header(self) -> list[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"]
+
+    def render(self) -> list[str]:
+        lines = self._header()
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in items:
+            lines.append(f"{self.name}{_format_labels(self.labels, key)} {_format_value(value)}")
+        return lines
+
+class Counter(_Metric):
+    type = "counter"
+
+    def inc(self, *labels, value: float = 1) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + value
+
+class Gauge(_Metric):
+    type = "gauge"
+
+    def inc(self, *labels, value: float = 1) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + value
+
+    def dec(self, *labels, value: float = 1) -> None:
+        self.inc(*labels, value=-value)
+
+    def set(self, *labels, value: float) -> None:
+        with self._lock:
+            self._values[labels] = value
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(self, name: str, help: str, labels: tuple[str, ...] = (), buckets: tuple[float, ...] = DEFAULT_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, *labels) -> None:
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._values.get(labels)
+            if series is None:
+                # Per-bucket counts (+Inf last), sum, count; made cumulative when rendered
+                series = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self) -> list[str]:
+        lines = self._header()
+        with self._lock:
+            items = [(key, (list(counts), total, count)) for key, (counts, total, count) in self._values.items()]
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float("inf"),), counts):
+                cumulative += n
+                labels = _format_labels(self.labels + ("le",), key + (_format_value(float(bound)),))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labels, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+class _Stage:
+    """Times a block into the stage histogram, also counting it as in flight."""
+
+    __slots__ = ("registry", "name", "endpoint", "start")
+
+    def __init__(self, registry: "MetricsRegistry", name: str):
+        self.registry = registry
+        self.name = name
+
+    def __enter__(self):
+        self.endpoint = current_endpoint()
+        self.registry.stages_in_flight.inc(self.name)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.registry.stage_seconds.observe(time.perf_counter() - self.start, self.name, self.endpoint)
+        self.registry.stages_in_flight.dec(self.name)
+
+class MetricsRegistry:
+    """
+    Process-wide metrics in the Prometheus text format, no client library needed.
+    Updates are a dict lookup and a few additions under a lock; values owned by other
+    services (scheduler queues, payload counters) are read by collectors at scrape time.
+    """
+
+    def __init__(self, namespace: str = "docintel"):
+        self.namespace = namespace
+        self._metrics: list[_Metric] = []
+        self._collectors: list[Callable[[], Iterable[tuple[str, str, str, list[tuple[dict, float]]]]]] = []
+
+        self.stage_seconds = self.histogram("stage_duration_seconds", "Time spent per pipeline stage", ("stage", "endpoint"))
+        self.stages_in_flight = self.gauge("stage_in_flight", "Pipeline stages currently running", ("stage",))
+
+    def _register(self, metric: _Metric) -> _Metric:
+        metric.name = f"{self.namespace}_{metric.name}"
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, help: str, labels: tuple[str, ...] = ()) -> Counter:
+        return self._register(Counter(name, help, labels))
+
+    def gauge(self, name: str, help: str, labels: tuple[str, ...] = ()) -> Gauge:
+        return self._register(Gauge(name, help, labels))
+
+    def histogram(self, name: str, help: str, labels: tuple[str, ...] = (), buckets: tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, help, labels, buckets))
+
+    def collector(self, fn: Callable[[], Iterable[tuple[str, str, str, list[tuple[dict, float]]]]]) -> Callable:
+        """
+        Registers a function called at scrape time. It yields (name, type, help, samples)
+        with samples as (labels, value) pairs. Usable as a decorator.
+        """
+        self._collectors.append(fn)
+        return fn
+
+    def stage(self, name: str) -> _Stage:
+        """`with metrics.stage("render"):` times the block for the current endpoint."""
+        return _Stage(self, name)
+
+    def timed(self, name: str) -> Callable:
+        """Decorator form of stage() for plain functions."""
+        def decorate(fn):
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                with _Stage(self, name):
+                    return fn(*args, **kwargs)
+            return wrapper
+        return decorate
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for collect in self._collectors:
+            for name, type, help, samples in collect():
+                name = f"{self.namespace}_{name}"
+                lines += [f"# HELP {name} {help}", f"# TYPE {name} {type}"]
+                for labels, value in samples:
+                    lines.append(f"{name}{_format_labels(labels.keys(), labels.values())} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+metrics = MetricsRegistry()
+
+http_requests = metrics.counter("http_requests_total", "HTTP requests handled", ("endpoint", "method", "status"))
+http_seconds = metrics.histogram("http_request_duration_seconds", "HTTP request time, streamed bodies included", ("endpoint", "method"))
+http_in_flight = metrics.gauge("http_requests_in_flight", "HTTP requests being handled")
+
+class MetricsMiddleware:
+    """Counts and times every HTTP request by route template, and attributes stage timings to it."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        _endpoint.set(scope)
+        status = 500
+        http_in_flight.inc()
+        start = time.perf_counter()
+
+        async def tracked_send(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, tracked_send)
+        finally:
+            endpoint = current_endpoint()
+            http_in_flight.dec()
+            http_seconds.observe(time.perf_counter() - start, endpoint, scope["method"])
+            http_requests.inc(endpoint, scope["method"], str(status))
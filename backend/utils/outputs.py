@@ -0,0 +1,85 @@
+import os
+import shutil
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Iterator
+from fastapi.responses import FileResponse
+from backend.config import settings
+
+_last_purge = 0.0
+# Output directories still being written by an output_file() block
+_writing: set[str] = set()
+
+def new_output(filename: str) -> str:
+    """
+    Path for a generated document, OUTPUT_DIR/<token>/<filename>. It stays downloadable
+    (with Range) for OUTPUT_RETENTION_MINUTES from its creation, so it is meant for a
+    file written right away; use output_file() for one produced by longer work.
+    """
+    purge_outputs()
+    directory = os.path.join(settings.OUTPUT_DIR, uuid.uuid4().hex)
+    os.makedirs(directory)
+    return os.path.join(directory, filename)
+
+@contextmanager
+def output_file(filename: str) -> Iterator[str]:
+    """
+    new_output() for the length of a block; the output is discarded if the block fails.
+    It is not purged while the block runs, and its retention starts when the block ends.
+    """
+    path = new_output(filename)
+    directory = os.path.dirname(path)
+    _writing.add(directory)
+    try:
+        yield path
+    except BaseException:
+        discard_output(path)
+        raise
+    else:
+        os.utime(directory)
+    finally:
+        _writing.discard(directory)
+
+def output_path(token: str, filename: str) -> str | None:
+    """The file of a retained output, or None if it doesn't exist (or has expired)."""
+    if not token.isalnum() or os.path.basename(filename) != filename:
+        return None
+    path = os.path.join(settings.OUTPUT_DIR, token, filename)
+    return path if os.path.isfile(path) else None
+
+def file_response(path: str, media_type: str, headers: dict | None = None) -> FileResponse:
+    """
+    Streams a generated document from disk. Content-Length, ETag and Range requests
+    are handled by FileResponse; Content-Location points at the GET URL an
+    interrupted download can be resumed from.
+    """
+    token = os.path.basename(os.path.dirname(path))
+    filename = os.path.basename(path)
+    return FileResponse(path, media_type=media_type, filename=filename, headers={
+        "Content-Location": f"/api/downloads/{token}/{filename}",
+        **(headers or {}),
+    })
+
+def discard_output(path: str) -> None:
+    shutil.rmtree(os.path.dirname(path), ignore_errors=True)
+
+def purge_outputs(force: bool = False) -> None:
+    """Removes outputs past their retention. Runs at most once a minute unless forced."""
+    global _last_purge
+    now = time.time()
+    if not force and now - _last_purge < 60:
+        return
+    _last_purge = now
+    if not os.path.isdir(settings.OUTPUT_DIR):
+        return
+    cutoff = now - settings.OUTPUT_RETENTION_MINUTES * 60
+    for token in os.listdir(settings.OUTPUT_DIR):
+        directory = os.path.join(settings.OUTPUT_DIR, token)
+        if directory in _writing:
+            continue
+        try:
+            if os.path.getmtime(directory) < cutoff:
+                shutil.rmtree(directory, ignore_errors=True)
+        except OSError:
+            pass  # Removed concurrently
@@ -0,0 +1,158 @@
+import asyncio
+import json
+import mmap
+import os
+import shutil
+import tempfile
+from contextlib import asynccontextmanager, contextmanager
+from typing import AsyncIterator, Iterator
+from fastapi import HTTPException, UploadFile
+from backend.config import settings
+
+_COPY_CHUNK = 1024 * 1024
+
+class UploadTooLarge(HTTPException):
+    def __init__(self, max_bytes: int):
+        super().__init__(status_code=413, detail=f"File too large. Maximum size is {max_bytes // (1024 * 1024)}MB")
+
+class UploadLimitMiddleware:
+    """
+    Caps the request body size. A declared Content-Length over the limit is refused
+    right away; otherwise the bytes are counted as they arrive, so chunked uploads
+    are cut off at the limit too instead of being spooled to the end.
+    Plain ASGI rather than @app.middleware, so the 413 is a normal response.
+    `path_limits` raises (or lowers) the limit for paths under a prefix, e.g. batch uploads.
+    """
+
+    def __init__(self, app, max_bytes: int, path_limits: dict[str, int] | None = None):
+        self.app = app
+        self.max_bytes = max_bytes
+        self.path_limits = path_limits or {}
+
+    def _limit(self, path: str) -> int:
+        for prefix, max_bytes in self.path_limits.items():
+            if path == prefix or path.startswith(prefix.rstrip("/") + "/"):
+                return max_bytes
+        return self.max_bytes
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] not in ("POST", "PUT", "PATCH"):
+            await self.app(scope, receive, send)
+            return
+
+        max_bytes = self._limit(scope["path"])
+        headers = dict(scope["headers"])
+        declared = headers.get(b"content-length")
+        if declared is not None and declared.isdigit() and int(declared) > max_bytes:
+            await self._reject(send, max_bytes)
+            return
+
+        received = 0
+        response_started = False
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > max_bytes:
+                    # Raised inside the body parser, FastAPI turns it into the 413 response
+                    raise UploadTooLarge(max_bytes)
+            return message
+
+        async def tracked_send(message):
+            nonlocal response_started
+            if message["type"] == "http.response.start":
+                response_started = True
+            await send(message)
+
+        try:
+            await self.app(scope, limited_receive, tracked_send)
+        except UploadTooLarge:
+            # Body read outside a route (e.g. by another middleware)
+            if response_started:
+                raise
+            await self._reject(send, max_bytes)
+
+    async def _reject(self, send, max_bytes: int) -> None:
+        body = json.dumps({"detail": UploadTooLarge(max_bytes).detail}).encode("utf-8")
+        await send({
+            "type": "http.response.start",
+            "status": 413,
+            "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode()),
+                        (b"connection", b"close")],
+        })
+        await send({"type": "http.response.body", "body": body})
+
+def _suffix(file: UploadFile) -> str:
+    return os.path.splitext(file.filename or "")[1].lower()[:16]
+
+def _copy_upload(file: UploadFile, path: str) -> None:
+    # The multipart parser already spooled the part (to disk past 1 MB); copy it in chunks
+    file.file.seek(0)
+    with open(path, "wb") as out:
+        shutil.copyfileobj(file.file, out, _COPY_CHUNK)
+
+async def save_upload(file: UploadFile) -> str:
+    """
+    Writes an upload to its own file under UPLOAD_DIR and returns the path,
+    without reading it into memory. The caller removes the file (remove_upload).
+    """
+    os.makedirs(settings.UPLOAD_DIR, exist_ok=True)
+    fd, path = tempfile.mkstemp(suffix=_suffix(file), prefix="upload_", dir=settings.UPLOAD_DIR)
+    os.close(fd)
+    try:
+        await asyncio.to_thread(_copy_upload, file, path)
+    except BaseException:
+        remove_upload(path)
+        raise
+    return path
+
+def remove_upload(path: str) -> None:
+    try:
+        os.remove(path)
+    except OSError:
+        pass  # Already moved or removed
+
+@asynccontextmanager
+async def upload_path(file: UploadFile) -> AsyncIterator[str]:
+    """An upload as a file path for the length of the block (pdfium, pypdf, img2pdf, render workers)."""
+    path = await save_upload(file)
+    try:
+        yield path
+    finally:
+        remove_upload(path)
+
+@asynccontextmanager
+async def upload_paths(files: list[UploadFile]) -> AsyncIterator[list[str]]:
+    paths = []
+    try:
+        for file in files:
+            paths.append(await save_upload(file))
+        yield paths
+    finally:
+        for path in paths:
+            remove_upload(path)
+
+@contextmanager
+def upload_buffer(file: UploadFile) -> Iterator[memoryview]:
+    """
+    A read-only memory-mapped view of an upload, for decoders that want a buffer
+    (numpy/OpenCV). Consumers must not keep references past the block.
+    """
+    f = file.file
+    f.flush()
+    fileno = f.fileno()  # moves a part still spooled in memory to its temp file
+    if os.fstat(fileno).st_size == 0:
+        yield memoryview(b"")
+        return
+    with mmap.mmap(fileno, 0, access=mmap.ACCESS_READ) as mapped:
+        with memoryview(mapped) as view:
+            yield view
+
+def clear_upload_dir() -> None:
+    """Removes uploads left behind by a previous run."""
+    if not os.path.isdir(settings.UPLOAD_DIR):
+        return
+    for name in os.listdir(settings.UPLOAD_DIR):
+        remove_upload(os.path.join(settings.UPLOAD_DIR, name))